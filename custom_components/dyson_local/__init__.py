@@ -3,8 +3,10 @@
 import asyncio
 from datetime import timedelta
 from functools import partial
+import ipaddress
 import logging
-from typing import List, Optional
+import threading
+from typing import Any, List, Optional
 
 from libdyson import (
     Dyson360Eye,
@@ -16,50 +18,160 @@ from libdyson import (
     MessageType,
     get_device,
 )
-from libdyson.discovery import DysonDiscovery
-from libdyson.dyson_device import DysonDevice
+from libdyson.dyson_device import DysonDevice, DysonHeatingDevice
+from libdyson.dyson_pure_cool import DysonPureCoolBase
 from libdyson.exceptions import DysonException
+import voluptuous as vol
 
-from homeassistant.components.zeroconf import async_get_instance
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_HOST, EVENT_HOMEASSISTANT_STOP
+from homeassistant.const import CONF_HOST, CONF_NAME
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady
+import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
+from .commands import get_command_queue, install_command_queue
 from .const import (
+    CONF_AIR_QUALITY_CONTROL,
+    CONF_AIR_QUALITY_HIGH,
+    CONF_AIR_QUALITY_LOW,
+    CONF_AIR_QUALITY_MAX_SPEED,
+    CONF_AIR_QUALITY_MIN_SPEED,
     CONF_CREDENTIAL,
     CONF_DEVICE_TYPE,
+    CONF_HISTORY_DAYS,
+    CONF_HUMIDITY_SENSOR,
+    CONF_LONG_TERM_STATISTICS,
+    CONF_OPTIMISTIC,
+    CONF_ROLLING_STATISTICS,
+    CONF_SCAN_NETWORKS,
+    CONF_SCHEDULE,
     CONF_SERIAL,
+    CONF_TEMPERATURE_SENSOR,
+    CONTROLLER_AIR_QUALITY,
+    CONTROLLER_HUMIDITY,
+    CONTROLLER_THERMOSTAT,
+    DATA_CONTROLLER_STORE,
+    DATA_CONTROLLERS,
     DATA_COORDINATORS,
     DATA_DEVICES,
     DATA_DISCOVERY,
+    DATA_FILTER_FORECASTS,
+    DATA_FORECAST_STORE,
+    DATA_HISTORY,
+    DATA_LATENCY,
+    DATA_OPTIMISTIC,
+    DATA_OPTIONS,
+    DATA_PROBES,
+    DATA_SCANNER,
+    DATA_SCHEDULER,
+    DATA_SNAPSHOTS,
+    DATA_STATISTICS,
+    DEFAULT_HISTORY_DAYS,
     DOMAIN,
 )
+from .control import (
+    AIR_QUALITY_HIGH,
+    AIR_QUALITY_LOW,
+    DysonAirQualityController,
+    DysonControllerStore,
+    DysonHumidityController,
+    DysonThermostatController,
+)
+from .forecast import DysonFilterForecast, DysonForecastStore
+from .latency import DysonLatencyTracker
+from .optimistic import DysonOptimisticState
+from .scanner import MAX_SCAN_HOSTS, DysonSubnetScanner, async_get_scanner
+from .schedule import SCHEDULE_SCHEMA, DysonScheduler
+from .services import async_setup_services
+from .snapshot import DysonSnapshotStore
+from .statistics import DysonStatistics
 
 _LOGGER = logging.getLogger(__name__)
 
 ENVIRONMENTAL_DATA_UPDATE_INTERVAL = timedelta(seconds=30)
 
+# How long a session validated by the config flow waits for its entry.
+PROBE_HANDOVER_TIMEOUT = 60
+
+
+def _scan_network(value: str) -> str:
+    """Validate a network to scan for devices."""
+    try:
+        network = ipaddress.ip_network(cv.string(value), strict=False)
+    except ValueError as err:
+        raise vol.Invalid(f"Invalid network: {value}") from err
+    if network.num_addresses > MAX_SCAN_HOSTS:
+        raise vol.Invalid(f"Network {value} is larger than {MAX_SCAN_HOSTS} hosts")
+    return str(network)
+
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        # A bare "dyson_local:" is left as None.
+        DOMAIN: vol.Any(
+            None,
+            vol.Schema(
+                {
+                    vol.Optional(CONF_SCAN_NETWORKS, default=[]): vol.All(
+                        cv.ensure_list, [_scan_network]
+                    ),
+                }
+            ),
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
 
 async def async_setup(hass: HomeAssistant, config: dict) -> bool:
     """Set up Dyson integration."""
-    hass.data[DOMAIN] = {
-        DATA_DEVICES: {},
-        DATA_COORDINATORS: {},
-        DATA_DISCOVERY: None,
-    }
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    # A config flow may have started the shared discovery already.
+    domain_data.setdefault(DATA_DISCOVERY, None)
+    domain_data.setdefault(DATA_PROBES, {})
+    scan_networks = (config.get(DOMAIN) or {}).get(CONF_SCAN_NETWORKS)
+    if scan_networks:
+        domain_data[DATA_SCANNER] = DysonSubnetScanner(scan_networks)
+    domain_data[DATA_DEVICES] = {}
+    domain_data[DATA_COORDINATORS] = {}
+    domain_data[DATA_OPTIONS] = {}
+    domain_data[DATA_OPTIMISTIC] = {}
+    domain_data[DATA_LATENCY] = {}
+    domain_data[DATA_CONTROLLERS] = {}
+    domain_data[DATA_STATISTICS] = {}
+    domain_data[DATA_HISTORY] = {}
+    domain_data[DATA_FILTER_FORECASTS] = {}
+    domain_data[DATA_CONTROLLER_STORE] = DysonControllerStore(hass)
+    domain_data[DATA_FORECAST_STORE] = DysonForecastStore(hass)
+    domain_data[DATA_SNAPSHOTS] = DysonSnapshotStore(hass)
+    domain_data[DATA_SCHEDULER] = DysonScheduler(hass)
+    await async_setup_services(hass)
+    # Not imported with the module, as it pulls in the websocket API.
+    from .history import (  # pylint: disable=import-outside-toplevel
+        async_setup_websocket,
+    )
+
+    async_setup_websocket(hass)
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Dyson from a config entry."""
-    device = get_device(
-        entry.data[CONF_SERIAL],
-        entry.data[CONF_CREDENTIAL],
-        entry.data[CONF_DEVICE_TYPE],
-    )
+    probe = _async_take_probe(hass, entry)
+    if probe is not None:
+        device = probe
+    else:
+        device = get_device(
+            entry.data[CONF_SERIAL],
+            entry.data[CONF_CREDENTIAL],
+            entry.data[CONF_DEVICE_TYPE],
+        )
+
+    # Kept to tell what changed when the options are updated.
+    hass.data[DOMAIN][DATA_OPTIONS][entry.entry_id] = dict(entry.options)
 
     if not isinstance(device, Dyson360Eye) and not isinstance(device, Dyson360Heurist):
         # Set up coordinator
@@ -77,9 +189,44 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             update_method=async_update_data,
             update_interval=ENVIRONMENTAL_DATA_UPDATE_INTERVAL,
         )
+        _async_setup_commands(hass, entry, device)
+        await _async_setup_controllers(hass, entry, device)
+        _async_setup_schedule(hass, entry, device)
+        entry.async_on_unload(
+            partial(hass.data[DOMAIN][DATA_SCHEDULER].async_remove, entry.entry_id)
+        )
+        forecast_store = hass.data[DOMAIN][DATA_FORECAST_STORE]
+        await forecast_store.async_load()
+        forecast = DysonFilterForecast(hass, device, forecast_store)
+        forecast.async_start()
+        hass.data[DOMAIN][DATA_FILTER_FORECASTS][entry.entry_id] = forecast
+        entry.async_on_unload(
+            partial(_async_stop_data, hass, entry, DATA_FILTER_FORECASTS, forecast)
+        )
+        if entry.options.get(CONF_ROLLING_STATISTICS, False):
+            # The attributes change with every reading, all written to the
+            # recorder, so they are only there when asked for.
+            statistics = DysonStatistics(device)
+            statistics.async_start()
+            hass.data[DOMAIN][DATA_STATISTICS][entry.entry_id] = statistics
+            entry.async_on_unload(
+                partial(_async_stop_data, hass, entry, DATA_STATISTICS, statistics)
+            )
+        await _async_setup_history(hass, entry, device)
+        if entry.options.get(CONF_LONG_TERM_STATISTICS, False):
+            # Pulls in the recorder, only needed when the option is on.
+            from .long_term_statistics import (  # pylint: disable=import-outside-toplevel
+                DysonLongTermStatistics,
+            )
+
+            long_term = DysonLongTermStatistics(hass, device, entry.data[CONF_NAME])
+            long_term.async_start()
+            entry.async_on_unload(long_term.async_stop)
     else:
         coordinator = None
 
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+
     async def _async_forward_entry_setup():
         for component in _async_get_platforms(device):
             hass.async_create_task(
@@ -96,13 +243,21 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                     device.serial,
                     host,
                 )
-                return
+                return False
             raise ConfigEntryNotReady
         hass.data[DOMAIN][DATA_DEVICES][entry.entry_id] = device
         hass.data[DOMAIN][DATA_COORDINATORS][entry.entry_id] = coordinator
         asyncio.run_coroutine_threadsafe(
             _async_forward_entry_setup(), hass.loop
         ).result()
+        return True
+
+    if probe is not None:
+        # The config flow already connected, take over its session.
+        hass.data[DOMAIN][DATA_DEVICES][entry.entry_id] = device
+        hass.data[DOMAIN][DATA_COORDINATORS][entry.entry_id] = coordinator
+        await _async_forward_entry_setup()
+        return True
 
     host = entry.data.get(CONF_HOST)
     if host:
@@ -110,29 +265,64 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             partial(setup_entry, host, is_discovery=False)
         )
     else:
-        discovery = hass.data[DOMAIN][DATA_DISCOVERY]
-        if discovery is None:
-            discovery = DysonDiscovery()
-            hass.data[DOMAIN][DATA_DISCOVERY] = discovery
-            _LOGGER.debug("Starting dyson discovery")
-            discovery.start_discovery(await async_get_instance(hass))
-
-            def stop_discovery(_):
-                _LOGGER.debug("Stopping dyson discovery")
-                discovery.stop_discovery()
-
-            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop_discovery)
+        # Discovery pulls in zeroconf, so only load it when it is needed.
+        from .discovery import (  # pylint: disable=import-outside-toplevel
+            async_get_discovery,
+        )
 
+        lock = threading.Lock()
+        located = []
+        stopped = threading.Event()
+
+        def setup_entry_once(host: str) -> bool:
+            # Discovery and the subnet scan may both find the device. Only a
+            # host that connects counts, so a wrong one does not block the
+            # other.
+            with lock:
+                if located or stopped.is_set():
+                    return False
+                if not setup_entry(host):
+                    return False
+                located.append(host)
+                return True
+
+        discovery = await async_get_discovery(hass)
+
+        @callback
+        def _async_stop_locating() -> None:
+            # A host found once the entry is unloaded is not connected.
+            stopped.set()
+            discovery.unregister_device(device, setup_entry_once)
+
+        entry.async_on_unload(_async_stop_locating)
         await hass.async_add_executor_job(
-            discovery.register_device, device, setup_entry
+            discovery.register_device, device, setup_entry_once
         )
 
+        scanner = async_get_scanner(hass)
+        if scanner is not None:
+
+            async def _async_scan() -> None:
+                host = await scanner.async_locate(
+                    entry.data[CONF_SERIAL], entry.data[CONF_CREDENTIAL]
+                )
+                if host is not None and await hass.async_add_executor_job(
+                    setup_entry_once, host
+                ):
+                    discovery.unregister_device(device, setup_entry_once)
+
+            entry.async_on_unload(hass.async_create_task(_async_scan()).cancel)
+
     return True
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload Dyson local."""
-    device = hass.data[DOMAIN][DATA_DEVICES][entry.entry_id]
+    device = hass.data[DOMAIN][DATA_DEVICES].get(entry.entry_id)
+    if device is None:
+        # Still waiting to be located, nothing was connected or set up.
+        hass.data[DOMAIN][DATA_OPTIONS].pop(entry.entry_id, None)
+        return True
     ok = all(
         await asyncio.gather(
             *[
@@ -144,11 +334,212 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if ok:
         hass.data[DOMAIN][DATA_DEVICES].pop(entry.entry_id)
         hass.data[DOMAIN][DATA_COORDINATORS].pop(entry.entry_id)
+        hass.data[DOMAIN][DATA_OPTIONS].pop(entry.entry_id, None)
+        await _async_flush_commands(hass, device)
         await hass.async_add_executor_job(device.disconnect)
-        # TODO: stop discovery
     return ok
 
 
+@callback
+def _async_setup_commands(
+    hass: HomeAssistant, entry: ConfigEntry, device: DysonDevice
+) -> None:
+    """Route device commands through the queue and its listeners."""
+    # Coalesce bursts of commands, e.g. from dragging a slider.
+    queue = install_command_queue(hass, device)
+    latency = DysonLatencyTracker(device)
+    latency.start()
+    queue.add_publish_listener(latency.published)
+    hass.data[DOMAIN][DATA_LATENCY][entry.entry_id] = latency
+    optimistic = None
+    if entry.options.get(CONF_OPTIMISTIC):
+        # Registered before the entities so they see the overlay.
+        optimistic = DysonOptimisticState(hass, device)
+        optimistic.start()
+        queue.add_listener(optimistic.command)
+        hass.data[DOMAIN][DATA_OPTIMISTIC][entry.entry_id] = optimistic
+
+    @callback
+    def _async_stop_commands() -> None:
+        # Also run when setup is retried, which leaves the device behind.
+        if optimistic is not None:
+            hass.data[DOMAIN][DATA_OPTIMISTIC].pop(entry.entry_id, None)
+            optimistic.async_stop()
+            queue.remove_listener(optimistic.command)
+        hass.data[DOMAIN][DATA_LATENCY].pop(entry.entry_id, None)
+        latency.stop()
+        queue.remove_publish_listener(latency.published)
+        queue.async_stop()
+
+    entry.async_on_unload(_async_stop_commands)
+
+
+async def _async_flush_commands(hass: HomeAssistant, device: DysonDevice) -> None:
+    """Publish the pending commands before disconnecting."""
+    queue = get_command_queue(device)
+    if queue is None:
+        return
+    queue.async_stop()
+    await hass.async_add_executor_job(queue.flush)
+
+
+async def _async_setup_controllers(
+    hass: HomeAssistant, entry: ConfigEntry, device: DysonDevice
+) -> None:
+    """Start the controllers enabled in the entry options."""
+    store = hass.data[DOMAIN][DATA_CONTROLLER_STORE]
+    await store.async_load()
+    controllers = {}
+    if isinstance(device, DysonPureCoolBase) and entry.options.get(
+        CONF_AIR_QUALITY_CONTROL
+    ):
+        controllers[CONTROLLER_AIR_QUALITY] = DysonAirQualityController(
+            device,
+            entry.options.get(CONF_AIR_QUALITY_LOW, AIR_QUALITY_LOW),
+            entry.options.get(CONF_AIR_QUALITY_HIGH, AIR_QUALITY_HIGH),
+            entry.options.get(CONF_AIR_QUALITY_MIN_SPEED, 1),
+            entry.options.get(CONF_AIR_QUALITY_MAX_SPEED, 10),
+        )
+    if isinstance(device, DysonPureHumidifyCool) and entry.options.get(
+        CONF_HUMIDITY_SENSOR
+    ):
+        controllers[CONTROLLER_HUMIDITY] = DysonHumidityController(
+            hass, device, entry.options[CONF_HUMIDITY_SENSOR], store
+        )
+    if isinstance(device, DysonHeatingDevice) and entry.options.get(
+        CONF_TEMPERATURE_SENSOR
+    ):
+        controllers[CONTROLLER_THERMOSTAT] = DysonThermostatController(
+            hass, device, entry.options[CONF_TEMPERATURE_SENSOR], store
+        )
+    for controller in controllers.values():
+        controller.async_start()
+    hass.data[DOMAIN][DATA_CONTROLLERS][entry.entry_id] = controllers
+    entry.async_on_unload(partial(_async_unload_controllers, hass, entry))
+
+
+@callback
+def _async_setup_schedule(
+    hass: HomeAssistant, entry: ConfigEntry, device: DysonDevice
+) -> None:
+    """Hand the schedule of an entry to the scheduler."""
+    if not entry.options.get(CONF_SCHEDULE):
+        hass.data[DOMAIN][DATA_SCHEDULER].async_remove(entry.entry_id)
+        return
+    try:
+        schedule = SCHEDULE_SCHEMA(entry.options[CONF_SCHEDULE])
+    except vol.Invalid as err:
+        _LOGGER.error("Invalid schedule for %s: %s", device.serial, err)
+        return
+    hass.data[DOMAIN][DATA_SCHEDULER].async_set_schedule(
+        entry.entry_id, device, schedule
+    )
+
+
+@callback
+def _async_stop_data(
+    hass: HomeAssistant, entry: ConfigEntry, key: str, data: Any
+) -> None:
+    """Stop something kept per entry, also when setup is retried."""
+    hass.data[DOMAIN][key].pop(entry.entry_id, None)
+    data.async_stop()
+
+
+async def _async_setup_history(
+    hass: HomeAssistant, entry: ConfigEntry, device: DysonDevice
+) -> None:
+    """Open the history file of a device and start storing its readings."""
+    from .history import (  # pylint: disable=import-outside-toplevel
+        DysonHistory,
+        history_capacity,
+        history_path,
+    )
+
+    days = entry.options.get(CONF_HISTORY_DAYS, DEFAULT_HISTORY_DAYS)
+    history = DysonHistory(
+        device, history_path(hass, device.serial), history_capacity(days)
+    )
+    await hass.async_add_executor_job(history.open)
+    history.async_start()
+    hass.data[DOMAIN][DATA_HISTORY][entry.entry_id] = history
+
+    @callback
+    def _async_close_history() -> None:
+        _async_stop_data(hass, entry, DATA_HISTORY, history)
+        hass.async_add_executor_job(history.close)
+
+    entry.async_on_unload(_async_close_history)
+
+
+@callback
+def _async_unload_controllers(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Stop the controllers of an entry."""
+    controllers = hass.data[DOMAIN][DATA_CONTROLLERS].pop(entry.entry_id, {})
+    for controller in controllers.values():
+        controller.async_stop()
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry when its options change.
+
+    A change of the schedule alone is handed to the scheduler instead, as a
+    reload reconnects the device and drops the state counted while running.
+    """
+    options = hass.data[DOMAIN][DATA_OPTIONS].get(entry.entry_id)
+    device = hass.data[DOMAIN][DATA_DEVICES].get(entry.entry_id)
+    if (
+        options is not None
+        and device is not None
+        and _without_schedule(options) == _without_schedule(entry.options)
+    ):
+        _async_setup_schedule(hass, entry, device)
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+def _without_schedule(options: dict) -> dict:
+    return {key: value for key, value in options.items() if key != CONF_SCHEDULE}
+
+
+@callback
+def async_store_probe(hass: HomeAssistant, device: DysonDevice) -> None:
+    """Keep a device connected by the config flow for its entry to take over.
+
+    The session is disconnected if no entry claims it in time.
+    """
+    probes = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_PROBES, {})
+    old_probe = probes.pop(device.serial, None)
+    if old_probe is not None:
+        old_device, cancel_expiry = old_probe
+        cancel_expiry()
+        hass.async_add_executor_job(old_device.disconnect)
+
+    @callback
+    def _async_expire(_now) -> None:
+        if device.serial in probes and probes[device.serial][0] is device:
+            _LOGGER.debug("Disconnecting unclaimed session of %s", device.serial)
+            probes.pop(device.serial)
+            hass.async_add_executor_job(device.disconnect)
+
+    probes[device.serial] = (
+        device,
+        async_call_later(hass, PROBE_HANDOVER_TIMEOUT, _async_expire),
+    )
+
+
+@callback
+def _async_take_probe(hass: HomeAssistant, entry: ConfigEntry) -> Optional[DysonDevice]:
+    probe = hass.data[DOMAIN][DATA_PROBES].pop(entry.data[CONF_SERIAL], None)
+    if probe is None:
+        return None
+    device, cancel_expiry = probe
+    cancel_expiry()
+    if device.device_type != entry.data[CONF_DEVICE_TYPE] or not device.is_connected:
+        hass.async_add_executor_job(device.disconnect)
+        return None
+    return device
+
+
 @callback
 def _async_get_platforms(device: DysonDevice) -> List[str]:
     if isinstance(device, Dyson360Eye) or isinstance(device, Dyson360Heurist):
@@ -0,0 +1,105 @@
+"""Air quality index from the readings of Dyson purifiers."""
+
+from bisect import bisect_left
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+POLLUTANT_PM25 = "pm25"
+POLLUTANT_PM10 = "pm10"
+POLLUTANT_NO2 = "no2"
+POLLUTANT_HCHO = "hcho"
+
+# Bands of (highest reading, highest index), each starting just above the
+# previous one. PM2.5 and PM10 in µg/m³ follow the US EPA breakpoints.
+# NO2 is in the device's own units, tenths of the Dyson index, which the
+# Dyson app calls good up to 3, fair up to 6, poor up to 8 and very poor
+# above. Formaldehyde is in the device's units, µg/m³, with the WHO
+# guideline of 100 µg/m³ as the top of the moderate band.
+_BANDS = {
+    POLLUTANT_PM25: [
+        (12.0, 50),
+        (35.4, 100),
+        (55.4, 150),
+        (150.4, 200),
+        (250.4, 300),
+        (350.4, 400),
+        (500.4, 500),
+    ],
+    POLLUTANT_PM10: [
+        (54, 50),
+        (154, 100),
+        (254, 150),
+        (354, 200),
+        (424, 300),
+        (504, 400),
+        (604, 500),
+    ],
+    POLLUTANT_NO2: [(30, 50), (60, 100), (80, 150), (100, 200)],
+    POLLUTANT_HCHO: [(50, 50), (100, 100), (300, 150), (500, 200)],
+}
+
+# Resolution readings are truncated to before the lookup.
+_RESOLUTION = {
+    POLLUTANT_PM25: 0.1,
+    POLLUTANT_PM10: 1,
+    POLLUTANT_NO2: 1,
+    POLLUTANT_HCHO: 1,
+}
+
+
+class _Table(NamedTuple):
+    highs: List[float]
+    bands: List[Tuple[float, float, float]]
+
+
+def _build_table(pollutant: str) -> _Table:
+    """Precompute the start and slope of each band of a pollutant."""
+    step = _RESOLUTION[pollutant]
+    bands = []
+    low, index_low = 0.0, 0
+    for high, index_high in _BANDS[pollutant]:
+        slope = (index_high - index_low) / (high - low) if high > low else 0
+        bands.append((low, index_low, slope))
+        low, index_low = high + step, index_high + 1
+    return _Table([high for high, _ in _BANDS[pollutant]], bands)
+
+
+_TABLES = {pollutant: _build_table(pollutant) for pollutant in _BANDS}
+
+
+class AirQuality(NamedTuple):
+    """Air quality index, with the pollutant setting it and every sub-index."""
+
+    index: Optional[int]
+    dominant_pollutant: Optional[str]
+    sub_indices: Dict[str, int]
+
+
+def sub_index(pollutant: str, reading: float) -> int:
+    """Return the index of one pollutant reading."""
+    table = _TABLES[pollutant]
+    step = _RESOLUTION[pollutant]
+    reading = round(math.floor(round(reading / step, 6)) * step, 6)
+    band = bisect_left(table.highs, reading)
+    if band == len(table.bands):
+        # Off the scale, stay at its top.
+        return _BANDS[pollutant][-1][1]
+    low, index_low, slope = table.bands[band]
+    return round(index_low + slope * max(reading - low, 0))
+
+
+def air_quality(readings: Dict[str, Optional[float]]) -> AirQuality:
+    """Return the air quality from the readings, by pollutant.
+
+    Readings that are None or negative, while a sensor is off or warming
+    up, are left out. The index is the highest of the sub-indices.
+    """
+    sub_indices = {
+        pollutant: sub_index(pollutant, reading)
+        for pollutant, reading in readings.items()
+        if reading is not None and reading >= 0
+    }
+    if not sub_indices:
+        return AirQuality(None, None, {})
+    dominant = max(sub_indices, key=sub_indices.get)
+    return AirQuality(sub_indices[dominant], dominant, sub_indices)
@@ -0,0 +1,181 @@
+"""Bulk import of Dyson devices from a file."""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+from typing import List, Optional
+
+from libdyson import DEVICE_TYPE_NAMES
+from libdyson.dyson_device import DysonDevice
+
+from homeassistant.components.persistent_notification import async_create
+from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+
+from . import async_store_probe
+from .config_flow import CannotConnect, CannotFind, InvalidAuth, async_connect_device
+from .const import (
+    CONF_CREDENTIAL,
+    CONF_DEVICE_TYPE,
+    CONF_SERIAL,
+    DOMAIN,
+    SOURCE_BULK_IMPORT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PARALLEL = 8
+
+NOTIFICATION_ID = f"{DOMAIN}_import"
+
+RESULT_CREATED = "created"
+RESULT_ALREADY_CONFIGURED = "already_configured"
+RESULT_DUPLICATE = "duplicate"
+RESULT_INVALID_ROW = "invalid_row"
+RESULT_INVALID_DEVICE_TYPE = "invalid_device_type"
+RESULT_CANNOT_FIND = "cannot_find"
+RESULT_CANNOT_CONNECT = "cannot_connect"
+RESULT_INVALID_AUTH = "invalid_auth"
+
+
+class ImportResult:
+    """Result of importing a single device."""
+
+    def __init__(self, serial: Optional[str], data: Optional[dict] = None):
+        """Initialize the result."""
+        self.serial = serial
+        self.data = data
+        self.device: Optional[DysonDevice] = None
+        self.result: Optional[str] = None
+
+
+def read_device_file(path: str) -> List[dict]:
+    """Read device rows from a JSON or CSV file."""
+    with open(path, encoding="utf-8") as file:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            return list(csv.DictReader(file))
+        rows = json.load(file)
+    if isinstance(rows, dict):
+        rows = rows.get("devices")
+    if not isinstance(rows, list):
+        raise HomeAssistantError(f"{path} does not contain a list of devices")
+    return rows
+
+
+def _parse_row(row) -> ImportResult:
+    if not isinstance(row, dict):
+        result = ImportResult(None)
+        result.result = RESULT_INVALID_ROW
+        return result
+
+    row = {
+        key.strip(): str(value).strip()
+        for key, value in row.items()
+        if key is not None and value is not None
+    }
+    serial = row.get(CONF_SERIAL)
+    result = ImportResult(serial or None)
+    if not serial or not row.get(CONF_CREDENTIAL) or not row.get(CONF_DEVICE_TYPE):
+        result.result = RESULT_INVALID_ROW
+        return result
+
+    device_type = row[CONF_DEVICE_TYPE]
+    if device_type not in DEVICE_TYPE_NAMES:
+        result.result = RESULT_INVALID_DEVICE_TYPE
+        return result
+
+    result.data = {
+        CONF_SERIAL: serial,
+        CONF_CREDENTIAL: row[CONF_CREDENTIAL],
+        CONF_DEVICE_TYPE: device_type,
+        CONF_NAME: row.get(CONF_NAME) or DEVICE_TYPE_NAMES[device_type],
+        CONF_HOST: row.get(CONF_HOST) or None,
+    }
+    return result
+
+
+async def async_import_devices(
+    hass: HomeAssistant, path: str, parallel: int = DEFAULT_PARALLEL
+) -> List[ImportResult]:
+    """Validate the devices listed in a file and create their entries.
+
+    Devices are located and connected concurrently, at most `parallel` at a
+    time. Entries are only created once every device has been validated, and
+    each new entry takes over the session opened during validation.
+    """
+    if not hass.config.is_allowed_path(path):
+        raise HomeAssistantError(f"Access to {path} is not allowed")
+    rows = await hass.async_add_executor_job(read_device_file, path)
+
+    configured = {
+        entry.data.get(CONF_SERIAL)
+        for entry in hass.config_entries.async_entries(DOMAIN)
+    }
+    seen = set()
+    results = []
+    for row in rows:
+        result = _parse_row(row)
+        results.append(result)
+        if result.result is not None:
+            continue
+        if result.serial in configured:
+            result.result = RESULT_ALREADY_CONFIGURED
+        elif result.serial in seen:
+            result.result = RESULT_DUPLICATE
+        seen.add(result.serial)
+
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def _async_validate(result: ImportResult) -> None:
+        async with semaphore:
+            try:
+                result.device = await async_connect_device(
+                    hass,
+                    result.serial,
+                    result.data[CONF_CREDENTIAL],
+                    result.data[CONF_DEVICE_TYPE],
+                    result.data[CONF_HOST],
+                )
+            except CannotFind:
+                result.result = RESULT_CANNOT_FIND
+            except InvalidAuth:
+                result.result = RESULT_INVALID_AUTH
+            except CannotConnect:
+                result.result = RESULT_CANNOT_CONNECT
+
+    pending = [result for result in results if result.result is None]
+    await asyncio.gather(*[_async_validate(result) for result in pending])
+
+    for result in pending:
+        if result.device is None:
+            continue
+        async_store_probe(hass, result.device)
+        flow_result = await hass.config_entries.flow.async_init(
+            DOMAIN, context={"source": SOURCE_BULK_IMPORT}, data=result.data
+        )
+        result.result = flow_result.get("reason", RESULT_CREATED)
+
+    _async_notify(hass, path, results)
+    return results
+
+
+@callback
+def _async_notify(hass: HomeAssistant, path: str, results: List[ImportResult]) -> None:
+    created = sum(1 for result in results if result.result == RESULT_CREATED)
+    _LOGGER.info("Imported %d of %d Dyson devices from %s", created, len(results), path)
+    lines = [
+        f"Imported {created} of {len(results)} devices from `{path}`.",
+        "",
+        "| Serial | Result |",
+        "| --- | --- |",
+    ]
+    lines.extend(f"| {result.serial or '-'} | {result.result} |" for result in results)
+    async_create(
+        hass,
+        "\n".join(lines),
+        title="Dyson Local import",
+        notification_id=NOTIFICATION_ID,
+    )
@@ -1,9 +1,12 @@
 """Dyson climate platform."""
 
+from datetime import timedelta
 import logging
-from typing import List, Optional
+from typing import Any, List, Mapping, Optional
 
 from libdyson import DysonPureHotCoolLink
+from libdyson.dyson_device import DysonHeatingDevice
+import voluptuous as vol
 
 from custom_components.dyson_local.utils import environmental_property
 from homeassistant.components.climate import ClimateEntity
@@ -23,9 +26,13 @@ from homeassistant.components.climate.const import (
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import ATTR_TEMPERATURE, CONF_NAME, TEMP_CELSIUS
 from homeassistant.core import Callable, HomeAssistant
+from homeassistant.helpers import config_validation as cv, entity_platform
 
 from . import DysonEntity
-from .const import DATA_DEVICES, DOMAIN
+from .commands import DysonCommandBatch
+from .const import CONTROLLER_THERMOSTAT, DATA_CONTROLLERS, DATA_DEVICES, DOMAIN
+from .control import DysonThermostatController
+from .ramp import DysonRamp, ramp_values
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,6 +41,29 @@ FAN_MODES = [FAN_FOCUS, FAN_DIFFUSE]
 SUPPORT_FLAGS = SUPPORT_TARGET_TEMPERATURE
 SUPPORT_FLAGS_LINK = SUPPORT_FLAGS | SUPPORT_FAN_MODE
 
+ATTR_START_TEMPERATURE = "start_temperature"
+ATTR_DURATION = "duration"
+
+SERVICE_RAMP_TEMPERATURE = "ramp_temperature"
+SERVICE_CANCEL_TEMPERATURE_RAMP = "cancel_temperature_ramp"
+
+RAMP_TEMPERATURE_SCHEMA = {
+    vol.Required(ATTR_TEMPERATURE): vol.All(
+        vol.Coerce(float), vol.Range(min=1, max=37)
+    ),
+    vol.Required(ATTR_DURATION): cv.positive_time_period,
+    vol.Optional(ATTR_START_TEMPERATURE): vol.All(
+        vol.Coerce(float), vol.Range(min=1, max=37)
+    ),
+}
+
+RAMP_TEMPERATURE_STEP = 0.5
+
+# Manual commands on these fields take over from a temperature ramp.
+RAMP_TEMPERATURE_FIELDS = {"fpwr", "fmod", "hmod", "hmax"}
+# With a thermostat, heat target commands come from it instead.
+RAMP_THERMOSTAT_FIELDS = {"fpwr", "fmod"}
+
 
 async def async_setup_entry(
     hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities: Callable
@@ -41,16 +71,58 @@ async def async_setup_entry(
     """Set up Dyson climate from a config entry."""
     device = hass.data[DOMAIN][DATA_DEVICES][config_entry.entry_id]
     name = config_entry.data[CONF_NAME]
+    controller = (
+        hass.data[DOMAIN][DATA_CONTROLLERS]
+        .get(config_entry.entry_id, {})
+        .get(CONTROLLER_THERMOSTAT)
+    )
     if isinstance(device, DysonPureHotCoolLink):
-        entity = DysonPureHotCoolLinkEntity(device, name)
+        entity = DysonPureHotCoolLinkEntity(device, name, controller)
     else:  # DysonPureHotCool
-        entity = DysonPureHotCoolEntity(device, name)
+        entity = DysonPureHotCoolEntity(device, name, controller)
     async_add_entities([entity])
 
+    platform = entity_platform.current_platform.get()
+    platform.async_register_entity_service(
+        SERVICE_RAMP_TEMPERATURE, RAMP_TEMPERATURE_SCHEMA, "async_ramp_temperature"
+    )
+    platform.async_register_entity_service(
+        SERVICE_CANCEL_TEMPERATURE_RAMP, {}, "async_cancel_temperature_ramp"
+    )
+
 
 class DysonClimateEntity(DysonEntity, ClimateEntity):
     """Dyson climate entity base class."""
 
+    _ramp: Optional[DysonRamp] = None
+
+    def __init__(
+        self,
+        device: DysonHeatingDevice,
+        name: str,
+        thermostat: Optional[DysonThermostatController] = None,
+    ):
+        """Initialize the entity."""
+        super().__init__(device, name)
+        self._thermostat = thermostat
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        thermostat = self._thermostat
+        if thermostat is not None:
+            thermostat.add_listener(self.schedule_update_ha_state)
+            self.async_on_remove(
+                lambda: thermostat.remove_listener(self.schedule_update_ha_state)
+            )
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the decisions of the thermostat."""
+        if self._thermostat is None:
+            return None
+        return self._thermostat.as_dict()
+
     @property
     def hvac_mode(self) -> str:
         """Return hvac operation."""
@@ -89,6 +161,8 @@ class DysonClimateEntity(DysonEntity, ClimateEntity):
     @property
     def target_temperature(self) -> int:
         """Return the target temperature."""
+        if self._thermostat is not None:
+            return self._thermostat.target
         return self._device.heat_target - 273
 
     @environmental_property
@@ -99,6 +173,8 @@ class DysonClimateEntity(DysonEntity, ClimateEntity):
     @property
     def current_temperature(self) -> Optional[int]:
         """Return the current temperature."""
+        if self._thermostat is not None and self._thermostat.temperature is not None:
+            return self._thermostat.temperature
         temperature_kelvin = self._current_temperature_kelvin
         if isinstance(temperature_kelvin, str):
             return None
@@ -119,7 +195,7 @@ class DysonClimateEntity(DysonEntity, ClimateEntity):
         """Return the maximum temperature."""
         return 37
 
-    def set_temperature(self, **kwargs):
+    async def async_set_temperature(self, **kwargs):
         """Set new target temperature."""
         target_temp = kwargs.get(ATTR_TEMPERATURE)
         if target_temp is None:
@@ -129,19 +205,72 @@ class DysonClimateEntity(DysonEntity, ClimateEntity):
         # Limit the target temperature into acceptable range.
         target_temp = min(self.max_temp, target_temp)
         target_temp = max(self.min_temp, target_temp)
-        self._device.set_heat_target(target_temp + 273)
+        if self._thermostat is not None:
+            # Nothing else tells a ramp that the thermostat target changed.
+            await self.async_cancel_temperature_ramp()
+        self._set_heat_target(target_temp)
+
+    def _set_heat_target(self, target_temp: float) -> None:
+        if self._thermostat is not None:
+            # The thermostat only runs in heat mode, which setting the heat
+            # target on the device would have turned on.
+            with DysonCommandBatch(self._device):
+                self._device.enable_heat_mode()
+                self._thermostat.async_set_target(target_temp)
+        else:
+            self._device.set_heat_target(target_temp + 273)
+
+    async def async_ramp_temperature(
+        self,
+        temperature: float,
+        duration: timedelta,
+        start_temperature: Optional[float] = None,
+    ) -> None:
+        """Step the target temperature to a value over a duration."""
+        if start_temperature is None:
+            start_temperature = self.target_temperature
+        _LOGGER.debug(
+            "Ramp %s from %s to %s over %s",
+            self.name,
+            start_temperature,
+            temperature,
+            duration,
+        )
+        await self.async_cancel_temperature_ramp()
+        self._ramp = DysonRamp(
+            self.hass,
+            self._device,
+            ramp_values(start_temperature, temperature, RAMP_TEMPERATURE_STEP),
+            duration,
+            self._set_heat_target,
+            RAMP_TEMPERATURE_FIELDS
+            if self._thermostat is None
+            else RAMP_THERMOSTAT_FIELDS,
+        )
+        self._ramp.async_start()
+
+    async def async_cancel_temperature_ramp(self) -> None:
+        """Stop a running temperature ramp."""
+        if self._ramp is not None:
+            self._ramp.async_cancel()
+            self._ramp = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop a running temperature ramp when the entity is removed."""
+        await self.async_cancel_temperature_ramp()
 
-    def set_hvac_mode(self, hvac_mode: str):
+    async def async_set_hvac_mode(self, hvac_mode: str):
         """Set new hvac mode."""
         _LOGGER.debug("Set %s heat mode %s", self.name, hvac_mode)
-        if hvac_mode == HVAC_MODE_OFF:
-            self._device.turn_off()
-        elif not self._device.is_on:
-            self._device.turn_on()
-        if hvac_mode == HVAC_MODE_HEAT:
-            self._device.enable_heat_mode()
-        elif hvac_mode == HVAC_MODE_COOL:
-            self._device.disable_heat_mode()
+        with DysonCommandBatch(self._device):
+            if hvac_mode == HVAC_MODE_OFF:
+                self._device.turn_off()
+            elif not self._device.is_on:
+                self._device.turn_on()
+            if hvac_mode == HVAC_MODE_HEAT:
+                self._device.enable_heat_mode()
+            elif hvac_mode == HVAC_MODE_COOL:
+                self._device.disable_heat_mode()
 
 
 class DysonPureHotCoolLinkEntity(DysonClimateEntity):
@@ -164,7 +293,7 @@ class DysonPureHotCoolLinkEntity(DysonClimateEntity):
         """Return the list of supported features."""
         return SUPPORT_FLAGS_LINK
 
-    def set_fan_mode(self, fan_mode: str) -> None:
+    async def async_set_fan_mode(self, fan_mode: str) -> None:
         """Set fan mode of the device."""
         _LOGGER.debug("Set %s focus mode %s", self.name, fan_mode)
         if fan_mode == FAN_FOCUS:
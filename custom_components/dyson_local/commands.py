@@ -0,0 +1,246 @@
+"""Command batching and coalescing for Dyson devices."""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonException, DysonNotConnected
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+# Commands arriving within this long of the last publish are merged.
+COALESCE_WINDOW = 0.25
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class DysonCommandBatch:
+    """Merge the commands sent to a device into a single STATE-SET.
+
+    libdyson publishes one STATE-SET per method call. Inside the context,
+    fields set by those calls on the current thread are collected instead,
+    later values replacing earlier ones, and published together on exit.
+    Batches on the same device nest into the outermost one. On the event
+    loop, a batch must not span an await that can suspend.
+    """
+
+    def __init__(
+        self,
+        device: DysonDevice,
+        on_send: Optional[Callable[[Dict[str, str]], None]] = None,
+    ):
+        """Initialize the batch, optionally with a callback run before sending."""
+        self._device = device
+        self._on_send = on_send
+        self._data: Dict[str, str] = {}
+        self._outer = None
+
+    @property
+    def data(self) -> Dict[str, str]:
+        """Return the fields collected so far."""
+        return self._data
+
+    def __enter__(self) -> "DysonCommandBatch":
+        """Start collecting commands."""
+        _install_interceptor(self._device)
+        batches = _get_batches()
+        self._outer = batches.get(id(self._device))
+        if self._outer is None:
+            batches[id(self._device)] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Send the collected commands, unless the block raised."""
+        if self._outer is not None:
+            return
+        del _get_batches()[id(self._device)]
+        if exc_type is None and self._data:
+            if self._on_send is not None:
+                self._on_send(self._data)
+            self._device._set_configuration.send(**self._data)
+
+    def _collect(self, **kwargs) -> None:
+        if not self._device.is_connected:
+            raise DysonNotConnected
+        self._data.update(kwargs)
+
+
+def _get_batches() -> Dict[int, DysonCommandBatch]:
+    if not hasattr(_local, "batches"):
+        _local.batches = {}
+    return _local.batches
+
+
+class _Interceptor:
+    """Replacement for a device's _set_configuration that honours batches."""
+
+    def __init__(self, device: DysonDevice, send: Callable[..., None]):
+        self._device_id = id(device)
+        self.send = send
+
+    def __call__(self, **kwargs) -> None:
+        batch = _get_batches().get(self._device_id)
+        if batch is None:
+            self.send(**kwargs)
+        else:
+            batch._collect(**kwargs)
+
+
+def _install_interceptor(device: DysonDevice) -> _Interceptor:
+    with _install_lock:
+        interceptor = device.__dict__.get("_set_configuration")
+        if not isinstance(interceptor, _Interceptor):
+            interceptor = _Interceptor(device, device._set_configuration)
+            device._set_configuration = interceptor
+        return interceptor
+
+
+class DysonCommandQueue:
+    """Outbound STATE-SET queue of a device that coalesces bursts.
+
+    A command is published right away unless another one went out within
+    the coalescing window. Commands arriving inside the window are merged
+    into a single pending message, the last value of each field winning,
+    which is published once the window has passed. Pending fields are
+    always published before any later command, so ordering across fields
+    is kept.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: DysonDevice,
+        send: Callable[..., None],
+        window: float = COALESCE_WINDOW,
+    ):
+        """Initialize the queue."""
+        self._hass = hass
+        self._device = device
+        self._send = send
+        self._window = window
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._last_sent: Optional[float] = None
+        self._cancel_flush: Optional[Callable[[], None]] = None
+        self._stopped = False
+        self._listeners: List[Callable[[Dict[str, str]], None]] = []
+        self._publish_listeners: List[Callable[[Dict[str, str]], None]] = []
+        self.commands = 0
+        self.published = 0
+        self.merged = 0
+
+    def add_listener(self, listener: Callable[[Dict[str, str]], None]) -> None:
+        """Add a callback receiving the fields of every accepted command."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, str]], None]) -> None:
+        """Remove a command callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def add_publish_listener(self, listener: Callable[[Dict[str, str]], None]) -> None:
+        """Add a callback receiving the fields of every published message."""
+        self._publish_listeners.append(listener)
+
+    def remove_publish_listener(
+        self, listener: Callable[[Dict[str, str]], None]
+    ) -> None:
+        """Remove a publish callback."""
+        if listener in self._publish_listeners:
+            self._publish_listeners.remove(listener)
+
+    def __call__(self, **kwargs) -> None:
+        """Queue a command."""
+        if not self._device.is_connected:
+            raise DysonNotConnected
+        delay = None
+        with self._lock:
+            self.commands += 1
+            now = time.monotonic()
+            if self._pending:
+                self.merged += 1
+                self._pending.update(kwargs)
+            elif self._last_sent is None or now - self._last_sent >= self._window:
+                self._publish(kwargs, now)
+            else:
+                self._pending.update(kwargs)
+                delay = self._last_sent + self._window - now
+        if delay is not None:
+            self._hass.loop.call_soon_threadsafe(self._async_schedule_flush, delay)
+        for listener in list(self._listeners):
+            listener(kwargs)
+
+    def flush(self) -> None:
+        """Publish the pending message, if any."""
+        with self._lock:
+            if not self._pending:
+                return
+            data = self._pending
+            self._pending = {}
+            try:
+                self._publish(data, time.monotonic())
+            except DysonException as err:
+                _LOGGER.warning(
+                    "Failed to send %s to %s: %s", data, self._device.serial, err
+                )
+
+    @callback
+    def async_start(self) -> None:
+        """Let the flush timer run again after async_stop."""
+        self._stopped = False
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop the flush timer, leaving any pending message to flush()."""
+        # Commands still on their way from other threads set no new timer.
+        self._stopped = True
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+
+    def _publish(self, data: Dict[str, str], now: float) -> None:
+        self._last_sent = now
+        self.published += 1
+        # Before sending, so a fast echo cannot overtake the listeners.
+        for listener in list(self._publish_listeners):
+            listener(data)
+        self._send(**data)
+
+    @callback
+    def _async_schedule_flush(self, delay: float) -> None:
+        if self._stopped or self._cancel_flush is not None:
+            return
+
+        @callback
+        def _async_flush(_now) -> None:
+            self._cancel_flush = None
+            self._hass.async_add_executor_job(self.flush)
+
+        self._cancel_flush = async_call_later(self._hass, delay, _async_flush)
+
+
+def install_command_queue(
+    hass: HomeAssistant, device: DysonDevice
+) -> DysonCommandQueue:
+    """Route the commands of a device through a coalescing queue."""
+    interceptor = _install_interceptor(device)
+    if not isinstance(interceptor.send, DysonCommandQueue):
+        interceptor.send = DysonCommandQueue(hass, device, interceptor.send)
+    interceptor.send.async_start()
+    return interceptor.send
+
+
+def get_command_queue(device: DysonDevice) -> Optional[DysonCommandQueue]:
+    """Return the command queue of a device, if one is installed."""
+    interceptor = device.__dict__.get("_set_configuration")
+    if isinstance(interceptor, _Interceptor) and isinstance(
+        interceptor.send, DysonCommandQueue
+    ):
+        return interceptor.send
+    return None
@@ -1,12 +1,18 @@
 """Config flow for Dyson integration."""
 
+import asyncio
 import logging
-import threading
 from typing import Optional
 
-from libdyson import DEVICE_TYPE_NAMES, get_device, get_mqtt_info_from_wifi_info
+from libdyson import (
+    DEVICE_TYPE_NAMES,
+    DysonPureHumidifyCool,
+    get_device,
+    get_mqtt_info_from_wifi_info,
+)
 from libdyson.cloud import DysonDeviceInfo
-from libdyson.discovery import DysonDiscovery
+from libdyson.dyson_device import DysonDevice, DysonFanDevice, DysonHeatingDevice
+from libdyson.dyson_pure_cool import DysonPureCoolBase
 from libdyson.exceptions import (
     DysonException,
     DysonFailedToParseWifiInfo,
@@ -15,20 +21,48 @@ from libdyson.exceptions import (
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.components.zeroconf import async_get_instance
 from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.core import HomeAssistant, callback, split_entity_id, valid_entity_id
 from homeassistant.exceptions import HomeAssistantError
 
-from .const import CONF_CREDENTIAL, CONF_DEVICE_TYPE, CONF_SERIAL, DOMAIN
+from . import async_store_probe
+from .const import (
+    CONF_AIR_QUALITY_CONTROL,
+    CONF_AIR_QUALITY_HIGH,
+    CONF_AIR_QUALITY_LOW,
+    CONF_AIR_QUALITY_MAX_SPEED,
+    CONF_AIR_QUALITY_MIN_SPEED,
+    CONF_CREDENTIAL,
+    CONF_DEADBAND_ABSOLUTE,
+    CONF_DEADBAND_RELATIVE,
+    CONF_DEVICE_TYPE,
+    CONF_HEARTBEAT,
+    CONF_HISTORY_DAYS,
+    CONF_HUMIDITY_SENSOR,
+    CONF_LONG_TERM_STATISTICS,
+    CONF_OPTIMISTIC,
+    CONF_ROLLING_STATISTICS,
+    CONF_SERIAL,
+    CONF_TEMPERATURE_SENSOR,
+    DEFAULT_HISTORY_DAYS,
+    DOMAIN,
+)
+from .control import AIR_QUALITY_HIGH, AIR_QUALITY_LOW
+from .scanner import async_get_scanner
+from .utils import DEFAULT_HEARTBEAT
 
 _LOGGER = logging.getLogger(__name__)
 
 DISCOVERY_TIMEOUT = 10
+# libdyson waits up to 10 seconds each for CONNACK and the first state.
+CONNECT_TIMEOUT = 25
 
 CONF_METHOD = "method"
 CONF_SSID = "ssid"
 CONF_PASSWORD = "password"
 
+DEFAULT_HEARTBEAT_MINUTES = int(DEFAULT_HEARTBEAT.total_seconds() // 60)
+
 SETUP_METHODS = {
     "wifi": "Setup using WiFi information",
     "manual": "Setup manually",
@@ -45,6 +79,12 @@ class DysonLocalConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize the config flow."""
         self._device_info = None
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry):
+        """Get the options flow for this handler."""
+        return DysonLocalOptionsFlow(config_entry)
+
     async def async_step_user(self, info: Optional[dict] = None):
         """Handle step initialized by user."""
         if info is not None:
@@ -204,6 +244,12 @@ class DysonLocalConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self._device_info = info
         return await self.async_step_host()
 
+    async def async_step_bulk_import(self, info: dict):
+        """Handle a device validated by the import_devices service."""
+        await self.async_set_unique_id(info[CONF_SERIAL])
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(title=info[CONF_NAME], data=info)
+
     async def _async_get_entry_data(
         self,
         serial: str,
@@ -230,37 +276,188 @@ class DysonLocalConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         host: Optional[str] = None,
     ) -> None:
         """Try connect."""
-        device = get_device(serial, credential, device_type)
-
-        # Find device using discovery
-        if not host:
-            discovered = threading.Event()
-
-            def _callback(address: str) -> None:
-                _LOGGER.debug("Found device at %s", address)
-                nonlocal host
-                host = address
-                discovered.set()
-
-            discovery = DysonDiscovery()
-            discovery.register_device(device, _callback)
-            discovery.start_discovery(await async_get_instance(self.hass))
-            succeed = await self.hass.async_add_executor_job(
-                discovered.wait, DISCOVERY_TIMEOUT
+        device = await async_connect_device(
+            self.hass, serial, credential, device_type, host
+        )
+        # Hand the validated session over to the new config entry.
+        async_store_probe(self.hass, device)
+
+
+class DysonLocalOptionsFlow(config_entries.OptionsFlow):
+    """Dyson local options flow."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, info: Optional[dict] = None):
+        """Manage the options."""
+        errors = {}
+        if info is not None:
+            for key in (CONF_HUMIDITY_SENSOR, CONF_TEMPERATURE_SENSOR):
+                if info.get(key) and not _is_sensor(info[key]):
+                    errors[key] = "invalid_sensor"
+            if CONF_AIR_QUALITY_LOW in info and (
+                info[CONF_AIR_QUALITY_LOW] >= info[CONF_AIR_QUALITY_HIGH]
+                or info[CONF_AIR_QUALITY_MIN_SPEED] > info[CONF_AIR_QUALITY_MAX_SPEED]
+            ):
+                errors["base"] = "invalid_air_quality_range"
+            if not errors:
+                return self.async_create_entry(
+                    title="", data={**self.config_entry.options, **info}
+                )
+
+        options = {**self.config_entry.options, **(info or {})}
+        schema = {
+            vol.Optional(
+                CONF_OPTIMISTIC, default=options.get(CONF_OPTIMISTIC, False)
+            ): bool,
+        }
+        device = get_device(
+            self.config_entry.data[CONF_SERIAL],
+            self.config_entry.data[CONF_CREDENTIAL],
+            self.config_entry.data[CONF_DEVICE_TYPE],
+        )
+        if isinstance(device, DysonPureCoolBase):
+            schema.update(
+                {
+                    vol.Optional(
+                        CONF_AIR_QUALITY_CONTROL,
+                        default=options.get(CONF_AIR_QUALITY_CONTROL, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_AIR_QUALITY_LOW,
+                        default=options.get(CONF_AIR_QUALITY_LOW, AIR_QUALITY_LOW),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=999)),
+                    vol.Optional(
+                        CONF_AIR_QUALITY_HIGH,
+                        default=options.get(CONF_AIR_QUALITY_HIGH, AIR_QUALITY_HIGH),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=999)),
+                    vol.Optional(
+                        CONF_AIR_QUALITY_MIN_SPEED,
+                        default=options.get(CONF_AIR_QUALITY_MIN_SPEED, 1),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+                    vol.Optional(
+                        CONF_AIR_QUALITY_MAX_SPEED,
+                        default=options.get(CONF_AIR_QUALITY_MAX_SPEED, 10),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+                }
+            )
+        if isinstance(device, DysonFanDevice):
+            # Left at zero, every change of a reading is written.
+            schema.update(
+                {
+                    vol.Optional(
+                        CONF_DEADBAND_ABSOLUTE,
+                        default=options.get(CONF_DEADBAND_ABSOLUTE, 0),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1000)),
+                    vol.Optional(
+                        CONF_DEADBAND_RELATIVE,
+                        default=options.get(CONF_DEADBAND_RELATIVE, 0),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                    vol.Optional(
+                        CONF_HEARTBEAT,
+                        default=options.get(CONF_HEARTBEAT, DEFAULT_HEARTBEAT_MINUTES),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1440)),
+                    vol.Optional(
+                        CONF_LONG_TERM_STATISTICS,
+                        default=options.get(CONF_LONG_TERM_STATISTICS, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_ROLLING_STATISTICS,
+                        default=options.get(CONF_ROLLING_STATISTICS, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_HISTORY_DAYS,
+                        default=options.get(CONF_HISTORY_DAYS, DEFAULT_HISTORY_DAYS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3650)),
+                }
             )
-            discovery.stop_discovery()
-            if not succeed:
-                _LOGGER.debug("Discovery timed out")
-                raise CannotFind
-
-        # Try connect to the device
-        try:
-            device.connect(host)
-        except DysonInvalidCredential:
-            raise InvalidAuth
-        except DysonException as err:
-            _LOGGER.debug("Failed to connect to device: %s", err)
-            raise CannotConnect
+        if isinstance(device, DysonPureHumidifyCool):
+            # Left empty, the device uses its own humidity reading.
+            schema[
+                vol.Optional(
+                    CONF_HUMIDITY_SENSOR,
+                    default=options.get(CONF_HUMIDITY_SENSOR, ""),
+                )
+            ] = str
+        if isinstance(device, DysonHeatingDevice):
+            # Left empty, the device heats to its own temperature reading.
+            schema[
+                vol.Optional(
+                    CONF_TEMPERATURE_SENSOR,
+                    default=options.get(CONF_TEMPERATURE_SENSOR, ""),
+                )
+            ] = str
+        return self.async_show_form(
+            step_id="init", data_schema=vol.Schema(schema), errors=errors
+        )
+
+
+def _is_sensor(entity_id: str) -> bool:
+    return valid_entity_id(entity_id) and split_entity_id(entity_id)[0] == "sensor"
+
+
+async def async_connect_device(
+    hass: HomeAssistant,
+    serial: str,
+    credential: str,
+    device_type: str,
+    host: Optional[str] = None,
+) -> DysonDevice:
+    """Locate and connect to a device, returning the live session."""
+    device = get_device(serial, credential, device_type)
+
+    # Find device using discovery
+    if not host:
+        host = await _async_locate_host(hass, device, credential)
+        if host is None:
+            _LOGGER.debug("Discovery timed out")
+            raise CannotFind
+
+    # Try connect to the device off the event loop
+    try:
+        connect = hass.async_add_executor_job(device.connect, host)
+        await asyncio.wait_for(asyncio.shield(connect), CONNECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        _LOGGER.debug("Timed out connecting to device")
+
+        def _disconnect_late_session(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                hass.async_add_executor_job(device.disconnect)
+
+        connect.add_done_callback(_disconnect_late_session)
+        raise CannotConnect
+    except DysonInvalidCredential:
+        raise InvalidAuth
+    except DysonException as err:
+        _LOGGER.debug("Failed to connect to device: %s", err)
+        raise CannotConnect
+    return device
+
+
+async def _async_locate_host(
+    hass: HomeAssistant, device: DysonDevice, credential: str
+) -> Optional[str]:
+    """Race zeroconf discovery against the subnet scan, if one is configured."""
+    from .discovery import (  # pylint: disable=import-outside-toplevel
+        async_discover_host,
+    )
+
+    lookups = [async_discover_host(hass, device, DISCOVERY_TIMEOUT)]
+    scanner = async_get_scanner(hass)
+    if scanner is not None:
+        lookups.append(scanner.async_locate(device.serial, credential))
+    tasks = [hass.async_create_task(lookup) for lookup in lookups]
+    try:
+        for next_host in asyncio.as_completed(tasks):
+            host = await next_host
+            if host is not None:
+                return host
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 class CannotConnect(HomeAssistantError):
@@ -2,10 +2,54 @@
 
 DOMAIN = "dyson_local"
 
+# Config flow source of devices added by the import_devices service.
+SOURCE_BULK_IMPORT = "bulk_import"
+
 CONF_SERIAL = "serial"
 CONF_CREDENTIAL = "credential"
 CONF_DEVICE_TYPE = "device_type"
+CONF_SCAN_NETWORKS = "scan_networks"
+CONF_OPTIMISTIC = "optimistic"
+CONF_AIR_QUALITY_CONTROL = "air_quality_control"
+CONF_AIR_QUALITY_LOW = "air_quality_low"
+CONF_AIR_QUALITY_HIGH = "air_quality_high"
+CONF_AIR_QUALITY_MIN_SPEED = "air_quality_min_speed"
+CONF_AIR_QUALITY_MAX_SPEED = "air_quality_max_speed"
+CONF_HUMIDITY_SENSOR = "humidity_sensor"
+CONF_TEMPERATURE_SENSOR = "temperature_sensor"
+CONF_SCHEDULE = "schedule"
+CONF_DEADBAND_ABSOLUTE = "deadband_absolute"
+CONF_DEADBAND_RELATIVE = "deadband_relative"
+CONF_HEARTBEAT = "heartbeat"
+CONF_LONG_TERM_STATISTICS = "long_term_statistics"
+CONF_ROLLING_STATISTICS = "rolling_statistics"
+CONF_HISTORY_DAYS = "history_days"
 
 DATA_DEVICES = "devices"
 DATA_DISCOVERY = "discovery"
 DATA_COORDINATORS = "coordinators"
+DATA_PROBES = "probes"
+DATA_SCANNER = "scanner"
+DATA_OPTIMISTIC = "optimistic"
+DATA_LATENCY = "latency"
+DATA_SNAPSHOTS = "snapshots"
+DATA_CONTROLLERS = "controllers"
+DATA_CONTROLLER_STORE = "controller_store"
+DATA_SCHEDULER = "scheduler"
+DATA_STATISTICS = "statistics"
+DATA_HISTORY = "history"
+DATA_FILTER_FORECASTS = "filter_forecasts"
+DATA_FORECAST_STORE = "forecast_store"
+DATA_OPTIONS = "options"
+
+# File formats the history is exported to.
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMATS = [FORMAT_CSV, FORMAT_PARQUET]
+
+# Days of readings the history keeps unless set otherwise.
+DEFAULT_HISTORY_DAYS = 90
+
+CONTROLLER_AIR_QUALITY = "air_quality"
+CONTROLLER_HUMIDITY = "humidity"
+CONTROLLER_THERMOSTAT = "thermostat"
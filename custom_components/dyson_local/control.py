@@ -0,0 +1,640 @@
+"""Closed-loop controllers run by the integration."""
+
+from datetime import datetime, timedelta
+import logging
+import math
+import threading
+import time
+from typing import Callable, List, Optional
+
+from libdyson import DysonPureHumidifyCool, MessageType
+from libdyson.dyson_device import DysonHeatingDevice
+from libdyson.dyson_pure_cool import DysonPureCoolBase
+from libdyson.exceptions import DysonException
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+)
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .commands import DysonCommandBatch
+from .const import CONTROLLER_HUMIDITY, CONTROLLER_THERMOSTAT, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.controllers"
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+ACTION_INACTIVE = "inactive"
+ACTION_NO_DATA = "no_data"
+ACTION_HOLD = "hold"
+ACTION_INCREASE = "increase"
+ACTION_DECREASE = "decrease"
+ACTION_RATE_LIMITED = "rate_limited"
+
+# PM2.5 band in µg/m³ mapped onto the speed range by default.
+AIR_QUALITY_LOW = 10
+AIR_QUALITY_HIGH = 50
+# VOC band in the raw device units, 10 per step of the Dyson index.
+VOC_LOW = 30
+VOC_HIGH = 90
+# Least time between two speed changes, and most speeds changed at once.
+SPEED_CHANGE_INTERVAL = 60
+MAX_SPEED_STEP = 2
+
+ACTION_HUMIDIFY = "humidify"
+ACTION_IDLE = "idle"
+ACTION_WAITING = "waiting"
+
+# Humidity in % either side of the target before humidification switches.
+HUMIDITY_HYSTERESIS = 2
+# Least time humidification stays on or off once switched.
+HUMIDITY_MIN_RUN_TIME = timedelta(minutes=5)
+HUMIDITY_DEFAULT_TARGET = 50
+# The device is told to humidify all the way while the controller runs it.
+HUMIDITY_MAX = 70
+
+# Heat target in °C per °C of error, and per °C·h of accumulated error.
+THERMOSTAT_KP = 2.0
+THERMOSTAT_KI = 1.0
+# Furthest the heat target goes from the target, and its resolution.
+THERMOSTAT_MAX_OFFSET = 5.0
+THERMOSTAT_STEP = 0.5
+# Least time between two heat target changes.
+THERMOSTAT_INTERVAL = timedelta(minutes=2)
+# Longest gap between readings counted into the integral.
+THERMOSTAT_MAX_GAP = timedelta(minutes=10)
+THERMOSTAT_DEFAULT_TARGET = 20.0
+THERMOSTAT_MIN_TEMP = 1
+THERMOSTAT_MAX_TEMP = 37
+
+
+class DysonControllerStore:
+    """Persisted state of the controllers, by device serial and kind."""
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the store."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data: Optional[dict] = None
+
+    async def async_load(self) -> None:
+        """Load the stored state, once."""
+        if self._data is None:
+            self._data = await self._store.async_load() or {}
+
+    def get(self, serial: str, kind: str) -> dict:
+        """Return the stored state of a controller."""
+        return self._data.get(serial, {}).get(kind, {})
+
+    @callback
+    def async_set(self, serial: str, kind: str, state: dict) -> None:
+        """Store the state of a controller."""
+        self._data.setdefault(serial, {})[kind] = state
+        self._store.async_delay_save(lambda: self._data, SAVE_DELAY)
+
+
+class DysonAirQualityController:
+    """Drive the fan speed from the air quality readings of the device.
+
+    Each environmental message maps PM2.5 and VOC onto the speed range,
+    the worse of the two deciding. The speed goes up as soon as a reading
+    asks for it, and only comes down once the reading is half a speed step
+    below the band of the current speed. Changes are at most MAX_SPEED_STEP
+    speeds and SPEED_CHANGE_INTERVAL apart. The controller leaves the fan
+    alone while it is off or in auto mode.
+    """
+
+    def __init__(
+        self,
+        device: DysonPureCoolBase,
+        low: float = AIR_QUALITY_LOW,
+        high: float = AIR_QUALITY_HIGH,
+        min_speed: int = 1,
+        max_speed: int = 10,
+        interval: float = SPEED_CHANGE_INTERVAL,
+    ):
+        """Initialize the controller."""
+        self._device = device
+        self._low = low
+        self._high = high
+        self._min_speed = min_speed
+        self._max_speed = max_speed
+        self._interval = interval
+        steps = max(max_speed - min_speed, 1)
+        # Half a speed step of each reading, for the hysteresis.
+        self._pm25_margin = (high - low) / steps / 2
+        self._voc_margin = (VOC_HIGH - VOC_LOW) / steps / 2
+        self._lock = threading.Lock()
+        self._last_change: Optional[float] = None
+        self._listeners: List[Callable[[], None]] = []
+        self.pm25: Optional[int] = None
+        self.voc: Optional[int] = None
+        self.speed: Optional[int] = None
+        self.action = ACTION_INACTIVE
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the environmental readings."""
+        self._device.add_message_listener(self._on_message)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the environmental readings."""
+        self._device.remove_message_listener(self._on_message)
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Add a callback run after every decision."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        """Remove a decision callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def as_dict(self) -> dict:
+        """Return the last decision."""
+        return {
+            "air_quality_control_pm25": self.pm25,
+            "air_quality_control_voc": self.voc,
+            "air_quality_control_speed": self.speed,
+            "air_quality_control_action": self.action,
+        }
+
+    def demand(self, pm25: Optional[int], voc: Optional[int]) -> int:
+        """Return the speed asked for by the readings."""
+        speeds = [self._min_speed]
+        if pm25 is not None:
+            speeds.append(self._speed_for(pm25, self._low, self._high))
+        if voc is not None:
+            speeds.append(self._speed_for(voc, VOC_LOW, VOC_HIGH))
+        return max(speeds)
+
+    def _speed_for(self, value: float, low: float, high: float) -> int:
+        if value <= low:
+            return self._min_speed
+        if value >= high:
+            return self._max_speed
+        fraction = (value - low) / (high - low)
+        return self._min_speed + math.ceil(
+            fraction * (self._max_speed - self._min_speed)
+        )
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.ENVIRONMENTAL:
+            return
+        with self._lock:
+            self._evaluate()
+        for listener in list(self._listeners):
+            listener()
+
+    def _evaluate(self) -> None:
+        self.pm25 = _reading(self._device.particulate_matter_2_5)
+        self.voc = _reading(self._device.volatile_organic_compounds)
+        if not self._device.is_on or self._device.auto_mode:
+            self.speed = None
+            self.action = ACTION_INACTIVE
+            return
+        if self.pm25 is None and self.voc is None:
+            self.speed = None
+            self.action = ACTION_NO_DATA
+            return
+
+        current = self._device.speed or self._min_speed
+        target = self.demand(self.pm25, self.voc)
+        if target < current:
+            # Hold the current speed until the readings are clearly lower.
+            target = min(
+                current,
+                self.demand(
+                    None if self.pm25 is None else self.pm25 + self._pm25_margin,
+                    None if self.voc is None else self.voc + self._voc_margin,
+                ),
+            )
+        self.speed = target
+        if target == current:
+            self.action = ACTION_HOLD
+            return
+
+        now = time.monotonic()
+        if self._last_change is not None and now - self._last_change < self._interval:
+            self.action = ACTION_RATE_LIMITED
+            return
+        speed = current + max(min(target - current, MAX_SPEED_STEP), -MAX_SPEED_STEP)
+        _LOGGER.debug(
+            "Air quality of %s is PM2.5 %s, VOC %s, changing speed %s to %s",
+            self._device.serial,
+            self.pm25,
+            self.voc,
+            current,
+            speed,
+        )
+        try:
+            self._device.set_speed(speed)
+        except DysonException as err:
+            _LOGGER.warning("Failed to set speed of %s: %s", self._device.serial, err)
+            return
+        self._last_change = now
+        self.action = ACTION_INCREASE if speed > current else ACTION_DECREASE
+
+
+def _reading(value) -> Optional[int]:
+    """Return a sensor reading, or None while the sensor is off or warming up."""
+    if isinstance(value, int) and value >= 0:
+        return value
+    return None
+
+
+class DysonHumidityController:
+    """Switch humidification from an external humidity sensor.
+
+    Runs on each state change of the sensor. Humidification is turned on,
+    with the device target at its maximum so the device's own reading
+    does not stop it, once the room is HUMIDITY_HYSTERESIS below the target,
+    and turned off once it is as much above. Either stays for at least
+    HUMIDITY_MIN_RUN_TIME; a switch held back by it is retried when the
+    time is up. It also runs when the device powers on or off or
+    humidification is switched. Turning the controller off leaves
+    humidification alone until it is turned on again. The target and
+    whether it is on are kept in the controller store.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: DysonPureHumidifyCool,
+        sensor: str,
+        store: DysonControllerStore,
+        min_run_time: timedelta = HUMIDITY_MIN_RUN_TIME,
+    ):
+        """Initialize the controller."""
+        self._hass = hass
+        self._device = device
+        self._sensor = sensor
+        self._store = store
+        self._min_run_time = min_run_time
+        self._last_switch: Optional[datetime] = None
+        self._cancel_tracking: Optional[Callable[[], None]] = None
+        self._cancel_retry: Optional[Callable[[], None]] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._device_state: Optional[tuple] = None
+        self.target = HUMIDITY_DEFAULT_TARGET
+        self.enabled = True
+        self.humidity: Optional[float] = None
+        self.action = ACTION_INACTIVE
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the sensor and the device."""
+        state = self._store.get(self._device.serial, CONTROLLER_HUMIDITY)
+        self.target = state.get("target", HUMIDITY_DEFAULT_TARGET)
+        self.enabled = state.get("enabled", True)
+        self._device_state = (self._device.is_on, self._device.humidification)
+        self._cancel_tracking = async_track_state_change_event(
+            self._hass, [self._sensor], self._async_sensor_changed
+        )
+        self._device.add_message_listener(self._on_message)
+        self._async_evaluate()
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the sensor and the device."""
+        if self._cancel_tracking is not None:
+            self._cancel_tracking()
+            self._cancel_tracking = None
+        self._device.remove_message_listener(self._on_message)
+        self._async_cancel_retry()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Add a callback run after every decision."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        """Remove a decision callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def as_dict(self) -> dict:
+        """Return the last decision."""
+        return {
+            "humidity_control_sensor": self._sensor,
+            "humidity_control_humidity": self.humidity,
+            "humidity_control_action": self.action,
+        }
+
+    @callback
+    def async_set_target(self, target: int) -> None:
+        """Change the target humidity."""
+        self.target = target
+        self._async_save()
+        self._async_evaluate()
+
+    @callback
+    def async_set_enabled(self, enabled: bool) -> None:
+        """Turn the controller on or off."""
+        self.enabled = enabled
+        # The user asked for it, so the minimum run time does not apply.
+        self._last_switch = None
+        self._async_save()
+        self._async_evaluate()
+
+    @callback
+    def _async_save(self) -> None:
+        self._store.async_set(
+            self._device.serial,
+            CONTROLLER_HUMIDITY,
+            {"target": self.target, "enabled": self.enabled},
+        )
+
+    @callback
+    def _async_sensor_changed(self, _event: Event) -> None:
+        self._async_evaluate()
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type == MessageType.STATE:
+            self._hass.loop.call_soon_threadsafe(self._async_device_changed)
+
+    @callback
+    def _async_device_changed(self) -> None:
+        state = (self._device.is_on, self._device.humidification)
+        if state == self._device_state:
+            return
+        if self._device_state is not None and state[1] != self._device_state[1]:
+            # A switch from the device itself holds for the minimum run time
+            # as well, so the controller does not undo it straight away.
+            self._last_switch = dt_util.utcnow()
+        self._device_state = state
+        self._async_evaluate()
+
+    @callback
+    def _async_cancel_retry(self) -> None:
+        if self._cancel_retry is not None:
+            self._cancel_retry()
+            self._cancel_retry = None
+
+    @callback
+    def _async_retry(self, _now: datetime) -> None:
+        self._cancel_retry = None
+        self._async_evaluate()
+
+    @callback
+    def _async_evaluate(self) -> None:
+        self._async_cancel_retry()
+        self.humidity = _state_value(self._hass, self._sensor)
+        self._decide()
+        for listener in list(self._listeners):
+            listener()
+
+    def _decide(self) -> None:
+        if self.humidity is None:
+            self.action = ACTION_NO_DATA
+            return
+        if not self.enabled or not self._device.is_connected or not self._device.is_on:
+            self.action = ACTION_INACTIVE
+            return
+
+        humidifying = self._device.humidification
+        if self.humidity < self.target - HUMIDITY_HYSTERESIS:
+            turn_on = True
+        elif self.humidity > self.target + HUMIDITY_HYSTERESIS:
+            turn_on = False
+        else:
+            self.action = ACTION_HUMIDIFY if humidifying else ACTION_IDLE
+            return
+        if turn_on == humidifying and (
+            not turn_on or self._device.target_humidity == HUMIDITY_MAX
+        ):
+            self.action = ACTION_HUMIDIFY if humidifying else ACTION_IDLE
+            return
+
+        now = dt_util.utcnow()
+        if turn_on != humidifying and self._last_switch is not None:
+            allowed = self._last_switch + self._min_run_time
+            if now < allowed:
+                self.action = ACTION_WAITING
+                self._cancel_retry = async_track_point_in_utc_time(
+                    self._hass, self._async_retry, allowed
+                )
+                return
+
+        _LOGGER.debug(
+            "Humidity of %s is %s%%, target %s%%, turning humidification %s",
+            self._device.serial,
+            self.humidity,
+            self.target,
+            "on" if turn_on else "off",
+        )
+        try:
+            with DysonCommandBatch(self._device):
+                if turn_on:
+                    self._device.set_target_humidity(HUMIDITY_MAX)
+                    self._device.enable_humidification()
+                else:
+                    self._device.disable_humidification()
+        except DysonException as err:
+            _LOGGER.warning(
+                "Failed to switch humidification of %s: %s", self._device.serial, err
+            )
+            return
+        if turn_on != humidifying:
+            self._last_switch = now
+        self.action = ACTION_HUMIDIFY if turn_on else ACTION_IDLE
+
+
+class DysonThermostatController:
+    """Drive the heat target from an external temperature sensor.
+
+    The device heats until its own reading, taken next to the heater,
+    reaches the heat target. A PI controller on the error between the
+    target and the sensor moves the heat target, within
+    THERMOSTAT_MAX_OFFSET of the target, so the room settles on the target
+    instead. It runs on each sensor or device state change while the device
+    is on and heating. Heat target changes are rounded to THERMOSTAT_STEP
+    and at least THERMOSTAT_INTERVAL apart; a change held back is retried
+    when the time is up. The target and integral are kept in the controller
+    store.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: DysonHeatingDevice,
+        sensor: str,
+        store: DysonControllerStore,
+        interval: timedelta = THERMOSTAT_INTERVAL,
+    ):
+        """Initialize the controller."""
+        self._hass = hass
+        self._device = device
+        self._sensor = sensor
+        self._store = store
+        self._interval = interval
+        self._integral = 0.0
+        self._last_update: Optional[datetime] = None
+        self._last_change: Optional[datetime] = None
+        self._cancel_tracking: Optional[Callable[[], None]] = None
+        self._cancel_retry: Optional[Callable[[], None]] = None
+        self._listeners: List[Callable[[], None]] = []
+        self.target = THERMOSTAT_DEFAULT_TARGET
+        self.temperature: Optional[float] = None
+        self.heat_target: Optional[float] = None
+        self.action = ACTION_INACTIVE
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the sensor and the device."""
+        state = self._store.get(self._device.serial, CONTROLLER_THERMOSTAT)
+        self.target = state.get("target", THERMOSTAT_DEFAULT_TARGET)
+        self._integral = state.get("integral", 0.0)
+        self._cancel_tracking = async_track_state_change_event(
+            self._hass, [self._sensor], self._async_sensor_changed
+        )
+        self._device.add_message_listener(self._on_message)
+        self._async_evaluate()
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the sensor and the device."""
+        if self._cancel_tracking is not None:
+            self._cancel_tracking()
+            self._cancel_tracking = None
+        self._device.remove_message_listener(self._on_message)
+        self._async_cancel_retry()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Add a callback run after every decision."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        """Remove a decision callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def as_dict(self) -> dict:
+        """Return the last decision."""
+        return {
+            "thermostat_sensor": self._sensor,
+            "thermostat_temperature": self.temperature,
+            "thermostat_heat_target": self.heat_target,
+            "thermostat_action": self.action,
+        }
+
+    @callback
+    def async_set_target(self, target: float) -> None:
+        """Change the target temperature, starting the integral afresh."""
+        self.target = target
+        self._integral = 0.0
+        self._last_change = None
+        self._async_save()
+        self._async_evaluate()
+
+    def output(self, error: float, integral: float) -> float:
+        """Return the heat target in °C for an error and integral."""
+        offset = THERMOSTAT_KP * error + THERMOSTAT_KI * integral
+        offset = max(min(offset, THERMOSTAT_MAX_OFFSET), -THERMOSTAT_MAX_OFFSET)
+        heat_target = round((self.target + offset) / THERMOSTAT_STEP) * THERMOSTAT_STEP
+        return max(min(heat_target, THERMOSTAT_MAX_TEMP), THERMOSTAT_MIN_TEMP)
+
+    @callback
+    def _async_save(self) -> None:
+        self._store.async_set(
+            self._device.serial,
+            CONTROLLER_THERMOSTAT,
+            {"target": self.target, "integral": round(self._integral, 4)},
+        )
+
+    @callback
+    def _async_sensor_changed(self, _event: Event) -> None:
+        self._async_evaluate()
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type == MessageType.STATE:
+            self._hass.loop.call_soon_threadsafe(self._async_evaluate)
+
+    @callback
+    def _async_cancel_retry(self) -> None:
+        if self._cancel_retry is not None:
+            self._cancel_retry()
+            self._cancel_retry = None
+
+    @callback
+    def _async_retry(self, _now: datetime) -> None:
+        self._cancel_retry = None
+        self._async_evaluate()
+
+    @callback
+    def _async_evaluate(self) -> None:
+        self._async_cancel_retry()
+        self.temperature = _state_value(self._hass, self._sensor)
+        self._decide()
+        for listener in list(self._listeners):
+            listener()
+
+    def _decide(self) -> None:
+        if self.temperature is None:
+            self.action = ACTION_NO_DATA
+            self._last_update = None
+            return
+        device = self._device
+        if not device.is_connected or not device.is_on or not device.heat_mode_is_on:
+            self.action = ACTION_INACTIVE
+            self._last_update = None
+            return
+
+        now = dt_util.utcnow()
+        error = self.target - self.temperature
+        if self._last_update is not None:
+            gap = min(now - self._last_update, THERMOSTAT_MAX_GAP)
+            integral = self._integral + error * gap / timedelta(hours=1)
+            # Only wind up while the heat target is not already at a limit.
+            if abs(THERMOSTAT_KI * integral) <= THERMOSTAT_MAX_OFFSET or abs(
+                integral
+            ) < abs(self._integral):
+                self._integral = integral
+                self._async_save()
+        self._last_update = now
+
+        self.heat_target = self.output(error, self._integral)
+        current = device.heat_target - 273
+        if abs(self.heat_target - current) < THERMOSTAT_STEP:
+            self.action = ACTION_HOLD
+            return
+        if self._last_change is not None:
+            allowed = self._last_change + self._interval
+            if now < allowed:
+                self.action = ACTION_RATE_LIMITED
+                self._cancel_retry = async_track_point_in_utc_time(
+                    self._hass, self._async_retry, allowed
+                )
+                return
+
+        _LOGGER.debug(
+            "Temperature of %s is %s°C, target %s°C, changing heat target %s to %s",
+            device.serial,
+            self.temperature,
+            self.target,
+            current,
+            self.heat_target,
+        )
+        try:
+            device.set_heat_target(self.heat_target + 273)
+        except DysonException as err:
+            _LOGGER.warning("Failed to set heat target of %s: %s", device.serial, err)
+            return
+        self._last_change = now
+        self.action = ACTION_INCREASE if self.heat_target > current else ACTION_DECREASE
+
+
+def _state_value(hass: HomeAssistant, entity_id: str) -> Optional[float]:
+    """Return the numeric state of an entity, or None if it has none."""
+    state = hass.states.get(entity_id)
+    if state is None or state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+        return None
+    try:
+        return float(state.state)
+    except ValueError:
+        return None
@@ -0,0 +1,53 @@
+"""Diagnostics support for Dyson Local."""
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .commands import get_command_queue
+from .const import (
+    CONF_CREDENTIAL,
+    DATA_CONTROLLERS,
+    DATA_DEVICES,
+    DATA_LATENCY,
+    DATA_OPTIMISTIC,
+    DOMAIN,
+)
+
+REDACTED = "**REDACTED**"
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return diagnostics for a config entry."""
+    diagnostics = {
+        "entry": {**entry.data, CONF_CREDENTIAL: REDACTED},
+        "options": dict(entry.options),
+    }
+    device = hass.data[DOMAIN][DATA_DEVICES].get(entry.entry_id)
+    if device is None:
+        return diagnostics
+
+    diagnostics["connected"] = device.is_connected
+    queue = get_command_queue(device)
+    if queue is not None:
+        diagnostics["commands"] = {
+            "received": queue.commands,
+            "published": queue.published,
+            "merged": queue.merged,
+        }
+    latency = hass.data[DOMAIN][DATA_LATENCY].get(entry.entry_id)
+    if latency is not None:
+        diagnostics["latency"] = latency.as_dict()
+    optimistic = hass.data[DOMAIN][DATA_OPTIMISTIC].get(entry.entry_id)
+    if optimistic is not None:
+        diagnostics["optimistic"] = {
+            "confirmed": optimistic.confirmed,
+            "rolled_back": optimistic.rolled_back,
+        }
+    controllers = hass.data[DOMAIN][DATA_CONTROLLERS].get(entry.entry_id)
+    if controllers:
+        diagnostics["controllers"] = {
+            kind: controller.as_dict() for kind, controller in controllers.items()
+        }
+    return diagnostics
@@ -0,0 +1,120 @@
+"""Zeroconf discovery for Dyson Local.
+
+This module is only imported when a device without a static host has to be
+located, so zeroconf is never loaded for setups that configure every host.
+"""
+
+import asyncio
+import logging
+import socket
+from typing import Callable, Optional
+
+from libdyson.discovery import TYPE_DYSON_360_EYE, DysonDiscovery
+from libdyson.dyson_device import DysonDevice
+from zeroconf import ServiceInfo
+
+from homeassistant.components.zeroconf import async_get_instance
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_DISCOVERY, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DysonDiscoveryIndex(DysonDiscovery):
+    """Shared discovery that remembers every device it has seen.
+
+    libdyson hands a discovered address to a single registered callback and
+    then forgets it. Config flows and entry setup share one instance, so the
+    address is kept for whoever asks next and several callbacks can wait for
+    the same serial.
+    """
+
+    def register_device(
+        self, device: DysonDevice, callback: Callable[[str], None]
+    ) -> None:
+        """Register a device, calling back at once if it is already known."""
+        with self._lock:
+            address = self._discovered.get(device.serial)
+            if address is None:
+                self._registered.setdefault(device.serial, []).append(callback)
+                return
+        callback(address)
+
+    def unregister_device(
+        self, device: DysonDevice, callback: Callable[[str], None]
+    ) -> None:
+        """Remove a callback that is still waiting for a device."""
+        with self._lock:
+            callbacks = self._registered.get(device.serial, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def get_address(self, serial: str) -> Optional[str]:
+        """Return the last discovered address of a device."""
+        with self._lock:
+            return self._discovered.get(serial)
+
+    def device_discovered(self, info: ServiceInfo) -> None:
+        """Call when a device is discovered."""
+        if info.type == TYPE_DYSON_360_EYE:
+            serial = (info.name.split(".")[0]).split("-", 1)[1]
+        else:  # TYPE_DYSON_FAN
+            serial = (info.name.split(".")[0]).split("_")[1]
+        address = socket.inet_ntoa(info.addresses[0])
+        with self._lock:
+            self._discovered[serial] = address
+            callbacks = self._registered.pop(serial, [])
+        for device_callback in callbacks:
+            device_callback(address)
+
+
+async def async_get_discovery(hass: HomeAssistant) -> DysonDiscoveryIndex:
+    """Return the shared discovery instance, starting it on first use."""
+    # Config flows can run before the integration itself is set up.
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    discovery = domain_data.get(DATA_DISCOVERY)
+    if discovery is None:
+        discovery = DysonDiscoveryIndex()
+        domain_data[DATA_DISCOVERY] = discovery
+        _LOGGER.debug("Starting dyson discovery")
+        discovery.start_discovery(await async_get_instance(hass))
+
+        def stop_discovery(_):
+            _LOGGER.debug("Stopping dyson discovery")
+            discovery.stop_discovery()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop_discovery)
+    return discovery
+
+
+async def async_discover_host(
+    hass: HomeAssistant, device: DysonDevice, timeout: float
+) -> Optional[str]:
+    """Wait for a device to be discovered and return its address.
+
+    Returns right away if the shared discovery has already seen the device,
+    and None if it does not show up within the timeout.
+    """
+    discovery = await async_get_discovery(hass)
+    future = hass.loop.create_future()
+
+    @callback
+    def _async_set_address(address: str) -> None:
+        if not future.done():
+            future.set_result(address)
+
+    def _callback(address: str) -> None:
+        _LOGGER.debug("Found device %s at %s", device.serial, address)
+        hass.loop.call_soon_threadsafe(_async_set_address, address)
+
+    discovery.register_device(device, _callback)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        # Also covers the lookup being cancelled once the device is found
+        # by other means.
+        discovery.unregister_device(device, _callback)
@@ -0,0 +1,199 @@
+"""Export of the environmental history of Dyson fans to a file."""
+
+import contextlib
+import csv
+import logging
+import os
+import time
+from typing import List, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, FORMAT_CSV, FORMAT_PARQUET
+from .history import DysonHistory, Row
+from .statistics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_EXPORT_PROGRESS = f"{DOMAIN}_export_progress"
+EVENT_HISTORY_EXPORTED = f"{DOMAIN}_history_exported"
+EVENT_EXPORT_FAILED = f"{DOMAIN}_export_failed"
+
+# Seconds between progress events.
+PROGRESS_INTERVAL = 5
+
+# Rows buffered into each Parquet row group.
+ROW_GROUP_SIZE = 64 * 1024
+
+COLUMN_TIME = "time"
+
+
+class _CsvWriter:
+    """Write rows to a CSV file as they come."""
+
+    def __init__(self, path: str):
+        """Open the file and write the header."""
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([COLUMN_TIME, *METRICS])
+
+    def write(self, rows: List[Row]) -> None:
+        """Write a batch of rows."""
+        self._writer.writerows(
+            [dt_util.utc_from_timestamp(row[0]).isoformat(), *row[1:]] for row in rows
+        )
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Write rows to a Parquet file, a row group at a time."""
+
+    def __init__(self, path: str):
+        """Open the file."""
+        try:
+            # Optional, only needed for this format.
+            import pyarrow  # pylint: disable=import-outside-toplevel
+            import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+        except ImportError as err:
+            raise HomeAssistantError("Exporting to Parquet needs pyarrow") from err
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [(COLUMN_TIME, pyarrow.timestamp("s", tz="UTC"))]
+            + [(metric, pyarrow.float32()) for metric in METRICS]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self._rows: List[Row] = []
+
+    def write(self, rows: List[Row]) -> None:
+        """Buffer a batch of rows, writing a row group once there are enough."""
+        self._rows.extend(rows)
+        if len(self._rows) >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        """Write the rows left and close the file."""
+        try:
+            self._flush()
+        finally:
+            self._writer.close()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        columns = list(zip(*self._rows))
+        self._writer.write_table(
+            self._pyarrow.Table.from_arrays(
+                [
+                    self._pyarrow.array(column, type=field.type)
+                    for column, field in zip(columns, self._schema)
+                ],
+                schema=self._schema,
+            )
+        )
+        self._rows = []
+
+
+_WRITERS = {
+    FORMAT_CSV: _CsvWriter,
+    FORMAT_PARQUET: _ParquetWriter,
+}
+
+
+async def async_export_history(
+    hass: HomeAssistant,
+    history: DysonHistory,
+    path: str,
+    start: float,
+    end: float,
+    file_format: str = FORMAT_CSV,
+) -> dict:
+    """Stream the history of a device over a time range to a file.
+
+    Records are read and written a batch at a time in the executor, so the
+    range is never held in memory as a whole. Progress is reported in an
+    event every few seconds, against the records in the range counted up
+    front, and the totals in one once done. A failed export removes the
+    partial file and is reported in an event of its own.
+    """
+    if not hass.config.is_allowed_path(path):
+        raise HomeAssistantError(f"Access to {path} is not allowed")
+    writer = await hass.async_add_executor_job(_WRITERS[file_format], path)
+
+    def _copy_batch(position: Optional[int]) -> tuple:
+        rows, position = history.read(start, end, position)
+        writer.write(rows)
+        return len(rows), position
+
+    total = await hass.async_add_executor_job(history.count, start, end)
+    started = time.monotonic()
+    reported = started
+    records = 0
+    position = None
+    try:
+        while True:
+            count, position = await hass.async_add_executor_job(_copy_batch, position)
+            records += count
+            if position is None:
+                await hass.async_add_executor_job(writer.close)
+                break
+            now = time.monotonic()
+            if now - reported >= PROGRESS_INTERVAL:
+                reported = now
+                hass.bus.async_fire(
+                    EVENT_EXPORT_PROGRESS,
+                    {
+                        "serial": history.serial,
+                        "file": path,
+                        "total": total,
+                        # Records may have come in since the count.
+                        "percent": round(100 * records / max(total, records)),
+                        **_throughput(records, now - started),
+                    },
+                )
+    except Exception as err:
+        await hass.async_add_executor_job(_discard, writer, path)
+        hass.bus.async_fire(
+            EVENT_EXPORT_FAILED,
+            {
+                "serial": history.serial,
+                "file": path,
+                "records": records,
+                "error": str(err),
+            },
+        )
+        raise
+
+    report = {
+        "serial": history.serial,
+        "file": path,
+        "format": file_format,
+        "bytes": await hass.async_add_executor_job(os.path.getsize, path),
+        **_throughput(records, time.monotonic() - started),
+    }
+    _LOGGER.debug("Exported history of %s: %s", history.serial, report)
+    hass.bus.async_fire(EVENT_HISTORY_EXPORTED, report)
+    return report
+
+
+def _discard(writer, path: str) -> None:
+    """Close a failed export as far as it goes and remove what it wrote."""
+    try:
+        writer.close()
+    except Exception as err:  # pylint: disable=broad-except
+        # The error that failed the export is the one reported.
+        _LOGGER.debug("Failed to close export %s: %s", path, err)
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+def _throughput(records: int, elapsed: float) -> dict:
+    return {
+        "records": records,
+        "wall_time_ms": round(elapsed * 1000),
+        "records_per_second": round(records / elapsed) if elapsed > 0 else None,
+    }
@@ -1,10 +1,12 @@
 """Fan platform for dyson."""
 
+from datetime import timedelta
 import logging
 import math
 from typing import Any, Callable, List, Mapping, Optional
 
 from libdyson import DysonPureCool, DysonPureCoolLink, MessageType
+from libdyson.dyson_device import DysonDevice
 import voluptuous as vol
 
 from homeassistant.components.fan import (
@@ -28,16 +30,24 @@ from homeassistant.util.percentage import (
 )
 
 from . import DOMAIN, DysonEntity
-from .const import DATA_DEVICES
+from .commands import DysonCommandBatch
+from .const import CONTROLLER_AIR_QUALITY, DATA_CONTROLLERS, DATA_DEVICES
+from .control import DysonAirQualityController
+from .ramp import DysonRamp, ramp_values
 
 _LOGGER = logging.getLogger(__name__)
 
 ATTR_ANGLE_LOW = "angle_low"
 ATTR_ANGLE_HIGH = "angle_high"
 ATTR_TIMER = "timer"
+ATTR_SPEED = "speed"
+ATTR_START_SPEED = "start_speed"
+ATTR_DURATION = "duration"
 
 SERVICE_SET_ANGLE = "set_angle"
 SERVICE_SET_TIMER = "set_timer"
+SERVICE_RAMP_SPEED = "ramp_speed"
+SERVICE_CANCEL_SPEED_RAMP = "cancel_speed_ramp"
 
 SET_ANGLE_SCHEMA = {
     vol.Required(ATTR_ANGLE_LOW): cv.positive_int,
@@ -48,6 +58,15 @@ SET_TIMER_SCHEMA = {
     vol.Required(ATTR_TIMER): cv.positive_int,
 }
 
+RAMP_SPEED_SCHEMA = {
+    vol.Required(ATTR_SPEED): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+    vol.Required(ATTR_DURATION): cv.positive_time_period,
+    vol.Optional(ATTR_START_SPEED): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+}
+
+# Manual commands on these fields take over from a speed ramp.
+RAMP_SPEED_FIELDS = {"fpwr", "fmod", "fnsp", "auto"}
+
 PRESET_MODE_AUTO = "Auto"
 
 SUPPORTED_PRESET_MODES = [PRESET_MODE_AUTO]
@@ -63,29 +82,69 @@ async def async_setup_entry(
     """Set up Dyson fan from a config entry."""
     device = hass.data[DOMAIN][DATA_DEVICES][config_entry.entry_id]
     name = config_entry.data[CONF_NAME]
+    controller = (
+        hass.data[DOMAIN][DATA_CONTROLLERS]
+        .get(config_entry.entry_id, {})
+        .get(CONTROLLER_AIR_QUALITY)
+    )
     if isinstance(device, DysonPureCoolLink):
         entity = DysonPureCoolLinkEntity(device, name)
     elif isinstance(device, DysonPureCool):
-        entity = DysonPureCoolEntity(device, name)
+        entity = DysonPureCoolEntity(device, name, controller)
     else:  # DysonPureHumidityCool
-        entity = DysonPureHumidifyCoolEntity(device, name)
+        entity = DysonPureHumidifyCoolEntity(device, name, controller)
     async_add_entities([entity])
 
     platform = entity_platform.current_platform.get()
     platform.async_register_entity_service(
-        SERVICE_SET_TIMER, SET_TIMER_SCHEMA, "set_timer"
+        SERVICE_SET_TIMER, SET_TIMER_SCHEMA, "async_set_timer"
+    )
+    platform.async_register_entity_service(
+        SERVICE_RAMP_SPEED, RAMP_SPEED_SCHEMA, "async_ramp_speed"
+    )
+    platform.async_register_entity_service(
+        SERVICE_CANCEL_SPEED_RAMP, {}, "async_cancel_speed_ramp"
     )
     if isinstance(device, DysonPureCool):
         platform.async_register_entity_service(
-            SERVICE_SET_ANGLE, SET_ANGLE_SCHEMA, "set_angle"
+            SERVICE_SET_ANGLE, SET_ANGLE_SCHEMA, "async_set_angle"
         )
 
 
 class DysonFanEntity(DysonEntity, FanEntity):
     """Dyson fan entity base class."""
 
+    _ramp: Optional[DysonRamp] = None
+
     _MESSAGE_TYPE = MessageType.STATE
 
+    def __init__(
+        self,
+        device: DysonDevice,
+        name: str,
+        air_quality_controller: Optional[DysonAirQualityController] = None,
+    ):
+        """Initialize the entity."""
+        super().__init__(device, name)
+        self._air_quality_controller = air_quality_controller
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        controller = self._air_quality_controller
+        if controller is not None:
+            controller.add_listener(self.schedule_update_ha_state)
+            self.async_on_remove(
+                lambda: controller.remove_listener(self.schedule_update_ha_state)
+            )
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the decisions of the air quality controller."""
+        if self._air_quality_controller is None:
+            return None
+        return self._air_quality_controller.as_dict()
+
     @property
     def is_on(self) -> bool:
         """Return if the fan is on."""
@@ -110,15 +169,22 @@ class DysonFanEntity(DysonEntity, FanEntity):
             return 0
         return ranged_value_to_percentage(SPEED_RANGE, int(self._device.speed))
 
-    def set_percentage(self, percentage: int) -> None:
+    async def async_set_percentage(self, percentage: int) -> None:
         """Set the speed percentage of the fan."""
+        self._set_percentage(percentage)
+
+    def _set_percentage(self, percentage: int) -> None:
         if percentage == 0:
             self._device.turn_off()
             return
 
         dyson_speed = math.ceil(percentage_to_ranged_value(SPEED_RANGE, percentage))
-        self._device.set_speed(dyson_speed)
-        self._device.disable_auto_mode()
+        self._set_speed(dyson_speed)
+
+    def _set_speed(self, speed: int) -> None:
+        with DysonCommandBatch(self._device):
+            self._device.set_speed(int(speed))
+            self._device.disable_auto_mode()
 
     @property
     def preset_modes(self) -> List[str]:
@@ -132,8 +198,11 @@ class DysonFanEntity(DysonEntity, FanEntity):
             return PRESET_MODE_AUTO
         return None
 
-    def set_preset_mode(self, preset_mode: str) -> None:
+    async def async_set_preset_mode(self, preset_mode: str) -> None:
         """Configure the preset mode."""
+        self._set_preset_mode(preset_mode)
+
+    def _set_preset_mode(self, preset_mode: str) -> None:
         if preset_mode == PRESET_MODE_AUTO:
             self._device.enable_auto_mode()
         else:
@@ -149,7 +218,7 @@ class DysonFanEntity(DysonEntity, FanEntity):
         """Flag supported features."""
         return COMMON_FEATURES
 
-    def turn_on(
+    async def async_turn_on(
         self,
         percentage: Optional[int] = None,
         preset_mode: Optional[str] = None,
@@ -157,19 +226,22 @@ class DysonFanEntity(DysonEntity, FanEntity):
     ) -> None:
         """Turn on the fan."""
         _LOGGER.debug("Turn on fan %s with percentage %s", self.name, percentage)
-        if preset_mode:
-            self.set_preset_mode(preset_mode)
-        if percentage:
-            self.set_percentage(percentage)
+        # Send everything as a single message instead of one per call. The
+        # batch must not span an await, so only the sync helpers are used.
+        with DysonCommandBatch(self._device):
+            if preset_mode:
+                self._set_preset_mode(preset_mode)
+            if percentage:
+                self._set_percentage(percentage)
 
-        self._device.turn_on()
+            self._device.turn_on()
 
-    def turn_off(self, **kwargs) -> None:
+    async def async_turn_off(self, **kwargs) -> None:
         """Turn off the fan."""
         _LOGGER.debug("Turn off fan %s", self.name)
         return self._device.turn_off()
 
-    def oscillate(self, oscillating: bool) -> None:
+    async def async_oscillate(self, oscillating: bool) -> None:
         """Turn on/of oscillation."""
         _LOGGER.debug("Turn oscillation %s for device %s", oscillating, self.name)
         if oscillating:
@@ -177,13 +249,49 @@ class DysonFanEntity(DysonEntity, FanEntity):
         else:
             self._device.disable_oscillation()
 
-    def set_timer(self, timer: int) -> None:
+    async def async_set_timer(self, timer: int) -> None:
         """Set sleep timer."""
         if timer == 0:
             self._device.disable_sleep_timer()
         else:
             self._device.set_sleep_timer(timer)
 
+    async def async_ramp_speed(
+        self, speed: int, duration: timedelta, start_speed: Optional[int] = None
+    ) -> None:
+        """Step the fan speed to a target over a duration."""
+        if start_speed is None:
+            start_speed = SPEED_RANGE[0]
+            if self._device.is_on and not self._device.auto_mode:
+                start_speed = self._device.speed or start_speed
+        _LOGGER.debug(
+            "Ramp %s from speed %s to %s over %s",
+            self.name,
+            start_speed,
+            speed,
+            duration,
+        )
+        await self.async_cancel_speed_ramp()
+        self._ramp = DysonRamp(
+            self.hass,
+            self._device,
+            ramp_values(start_speed, speed, 1),
+            duration,
+            self._set_speed,
+            RAMP_SPEED_FIELDS,
+        )
+        self._ramp.async_start()
+
+    async def async_cancel_speed_ramp(self) -> None:
+        """Stop a running speed ramp."""
+        if self._ramp is not None:
+            self._ramp.async_cancel()
+            self._ramp = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop a running speed ramp when the entity is removed."""
+        await self.async_cancel_speed_ramp()
+
 
 class DysonPureCoolLinkEntity(DysonFanEntity):
     """Dyson Pure Cool Link entity."""
@@ -205,7 +313,7 @@ class DysonPureCoolEntity(DysonFanEntity):
         else:
             return DIRECTION_REVERSE
 
-    def set_direction(self, direction: str) -> None:
+    async def async_set_direction(self, direction: str) -> None:
         """Configure the airflow direction."""
         if direction == DIRECTION_FORWARD:
             self._device.enable_front_airflow()
@@ -228,11 +336,12 @@ class DysonPureCoolEntity(DysonFanEntity):
     def extra_state_attributes(self) -> Mapping[str, Any]:
         """Return fan-specific state attributes."""
         return {
+            **(super().extra_state_attributes or {}),
             ATTR_ANGLE_LOW: self.angle_low,
             ATTR_ANGLE_HIGH: self.angle_high,
         }
 
-    def set_angle(self, angle_low: int, angle_high: int) -> None:
+    async def async_set_angle(self, angle_low: int, angle_high: int) -> None:
         """Set oscillation angle."""
         _LOGGER.debug(
             "set low %s and high angle %s for device %s",
@@ -259,7 +368,7 @@ class DysonPureHumidifyCoolEntity(DysonFanEntity):
         else:
             return DIRECTION_REVERSE
 
-    def set_direction(self, direction: str) -> None:
+    async def async_set_direction(self, direction: str) -> None:
         """Configure the airflow direction."""
         if direction == DIRECTION_FORWARD:
             self._device.enable_front_airflow()
@@ -0,0 +1,265 @@
+"""Forecast of when the filters of Dyson fans need replacing."""
+
+from datetime import datetime, timedelta
+import logging
+from typing import Callable, Dict, List, Optional
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonFanDevice
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.filter_forecasts"
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+# Filters forecast, by the device property their life is read from.
+FILTER_LIFE = "filter_life"
+FILTER_HEPA = "hepa_filter_life"
+FILTER_CARBON = "carbon_filter_life"
+FILTERS = [FILTER_LIFE, FILTER_HEPA, FILTER_CARBON]
+
+# Gaps between messages longer than this, such as the device being offline,
+# are left out of the usage.
+MAX_GAP = timedelta(minutes=10)
+
+
+class FilterLifeModel:
+    """Least squares fit of the filter life against the running hours.
+
+    Observations are added one at a time with Welford's updates of the
+    means and co-moments, so the fit takes constant memory and stays
+    stable however many there are.
+    """
+
+    def __init__(self, data: Optional[dict] = None):
+        """Initialize the model, from stored state if given."""
+        data = data or {}
+        self.count: int = data.get("count", 0)
+        self.mean_usage: float = data.get("mean_usage", 0.0)
+        self.mean_life: float = data.get("mean_life", 0.0)
+        self.usage_moment: float = data.get("usage_moment", 0.0)
+        self.co_moment: float = data.get("co_moment", 0.0)
+
+    def add(self, usage: float, life: float) -> None:
+        """Add the filter life seen after some hours of running."""
+        self.count += 1
+        usage_delta = usage - self.mean_usage
+        self.mean_usage += usage_delta / self.count
+        self.mean_life += (life - self.mean_life) / self.count
+        self.usage_moment += usage_delta * (usage - self.mean_usage)
+        self.co_moment += usage_delta * (life - self.mean_life)
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Return the filter life used by each running hour."""
+        if self.count < 2 or self.usage_moment <= 0:
+            return None
+        slope = self.co_moment / self.usage_moment
+        return -slope if slope < 0 else None
+
+    def as_dict(self) -> dict:
+        """Return the state to store."""
+        return {
+            "count": self.count,
+            "mean_usage": self.mean_usage,
+            "mean_life": self.mean_life,
+            "usage_moment": self.usage_moment,
+            "co_moment": self.co_moment,
+        }
+
+
+class DysonForecastStore:
+    """Persisted state of the filter forecasts, by device serial."""
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the store."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data: Optional[dict] = None
+
+    async def async_load(self) -> None:
+        """Load the stored state, once."""
+        if self._data is None:
+            self._data = await self._store.async_load() or {}
+
+    def get(self, serial: str) -> dict:
+        """Return the stored state of the forecast of a device."""
+        return self._data.get(serial, {})
+
+    @callback
+    def async_set(self, serial: str, state: dict) -> None:
+        """Store the state of the forecast of a device."""
+        self._data[serial] = state
+        self._store.async_delay_save(lambda: self._data, SAVE_DELAY)
+
+
+class DysonFilterForecast:
+    """Predict the replacement date of each filter of a device.
+
+    The running hours and the hours followed are counted from the messages
+    of the device. Each time the life of a filter goes down, it is added to
+    the fit of that filter against the running hours, and the replacement
+    date is worked out from the rate of the fit and the share of the time
+    the device runs. The first reading of a filter only sets where it
+    stands, as it may be anywhere within a step of its life, and a life
+    going up means the filter was replaced and starts the fit over. The
+    state is kept in the forecast store across restarts.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, device: DysonFanDevice, store: DysonForecastStore
+    ):
+        """Initialize the forecast."""
+        self._hass = hass
+        self._device = device
+        self._store = store
+        self._listeners: List[Callable[[], None]] = []
+        self._last_update: Optional[datetime] = None
+        self._was_on = False
+        # On the class, as the properties fail before the first state.
+        self._names = [name for name in FILTERS if hasattr(type(device), name)]
+        state = store.get(device.serial)
+        self.running_hours: float = state.get("running_hours", 0.0)
+        self.followed_hours: float = state.get("followed_hours", 0.0)
+        self._filters: Dict[str, dict] = {
+            name: {
+                "life": data.get("life"),
+                "model": FilterLifeModel(data.get("model")),
+                "replacement": (
+                    None
+                    if data.get("replacement") is None
+                    else dt_util.parse_datetime(data["replacement"])
+                ),
+            }
+            for name, data in state.get("filters", {}).items()
+        }
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the device."""
+        self._device.add_message_listener(self._on_message)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the device, storing the usage counted."""
+        self._device.remove_message_listener(self._on_message)
+        if self._last_update is not None:
+            self._async_count_usage(dt_util.utcnow())
+            self._async_save()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Add a callback run when a forecast changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        """Remove a callback added with add_listener."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @property
+    def usage_per_day(self) -> Optional[float]:
+        """Return the hours the device runs in a day, on average."""
+        if self.followed_hours <= 0:
+            return None
+        return 24 * self.running_hours / self.followed_hours
+
+    def replacement(self, name: str) -> Optional[datetime]:
+        """Return when a filter is expected to run out."""
+        return self._filters.get(name, {}).get("replacement")
+
+    def rate(self, name: str) -> Optional[float]:
+        """Return the life of a filter used by each running hour."""
+        if name not in self._filters:
+            return None
+        return self._filters[name]["model"].rate
+
+    def _on_message(self, message_type: MessageType) -> None:
+        self._hass.loop.call_soon_threadsafe(self._async_update, message_type)
+
+    @callback
+    def _async_update(self, message_type: MessageType) -> None:
+        now = dt_util.utcnow()
+        self._async_count_usage(now)
+        self._was_on = self._device.is_on
+        if message_type != MessageType.STATE:
+            return
+        changed = False
+        for name in self._names:
+            life = getattr(self._device, name)
+            if life is not None:
+                changed |= self._async_add_life(name, life, now)
+        if changed:
+            self._async_save()
+            for listener in self._listeners:
+                listener()
+
+    @callback
+    def _async_count_usage(self, now: datetime) -> None:
+        if self._last_update is not None:
+            gap = now - self._last_update
+            if timedelta(0) < gap <= MAX_GAP:
+                hours = gap.total_seconds() / 3600
+                self.followed_hours += hours
+                if self._was_on:
+                    self.running_hours += hours
+        self._last_update = now
+
+    @callback
+    def _async_add_life(self, name: str, life: int, now: datetime) -> bool:
+        """Add a filter life reading, returning whether it changed."""
+        state = self._filters.get(name)
+        if state is not None and state["life"] == life:
+            return False
+        if state is None or life > state["life"]:
+            # Seen for the first time, or replaced.
+            self._filters[name] = {
+                "life": life,
+                "model": FilterLifeModel(),
+                "replacement": None,
+            }
+            return True
+        state["life"] = life
+        model = state["model"]
+        model.add(self.running_hours, life)
+        rate = model.rate
+        usage = self.usage_per_day
+        if rate is None or not usage:
+            state["replacement"] = None
+        else:
+            state["replacement"] = now + timedelta(days=life / rate / usage)
+        _LOGGER.debug(
+            "%s of %s down to %s, replacement expected %s",
+            name,
+            self._device.serial,
+            life,
+            state["replacement"],
+        )
+        return True
+
+    @callback
+    def _async_save(self) -> None:
+        self._store.async_set(
+            self._device.serial,
+            {
+                "running_hours": self.running_hours,
+                "followed_hours": self.followed_hours,
+                "filters": {
+                    name: {
+                        "life": state["life"],
+                        "model": state["model"].as_dict(),
+                        "replacement": (
+                            None
+                            if state["replacement"] is None
+                            else state["replacement"].isoformat()
+                        ),
+                    }
+                    for name, state in self._filters.items()
+                },
+            },
+        )
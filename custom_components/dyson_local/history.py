@@ -0,0 +1,320 @@
+"""Compact history of the environmental readings of Dyson fans."""
+
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonFanDevice
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import dt as dt_util
+
+from .const import DATA_HISTORY, DEFAULT_HISTORY_DAYS, DOMAIN
+from .statistics import METRICS
+
+# Seconds a record stands for. Readings are thinned to one per interval, so
+# the file covers the retention however often the device reports.
+INTERVAL = 30
+
+# Records sent in each message of a streamed range.
+BATCH_SIZE = 1000
+
+ATTR_START_TIME = "start_time"
+ATTR_END_TIME = "end_time"
+
+_MAGIC = b"DYSH"
+_VERSION = 1
+# Magic, version, number of metrics, capacity and records ever written.
+_HEADER = struct.Struct("<4sHHIQ")
+# Whole seconds since the epoch and a half precision float for each metric.
+_RECORD = struct.Struct("<I" + "e" * len(METRICS))
+_TIMESTAMP = struct.Struct("<I")
+# Largest half precision float.
+_MAX_VALUE = 65504.0
+
+Row = List[Optional[float]]
+
+
+def history_capacity(days: int) -> int:
+    """Return the records held to keep readings for a number of days.
+
+    At 14 bytes a record, a day takes about 40 kB, and the default 90 days
+    about 3.6 MB for each device.
+    """
+    return days * 24 * 60 * 60 // INTERVAL
+
+
+CAPACITY = history_capacity(DEFAULT_HISTORY_DAYS)
+
+
+def history_path(hass: HomeAssistant, serial: str) -> str:
+    """Return the path of the history file of a device."""
+    return hass.config.path(STORAGE_DIR, f"{DOMAIN}.history", f"{serial}.bin")
+
+
+class DysonHistory:
+    """Append-only ring file of the environmental readings of a device.
+
+    The first environmental message of every INTERVAL is stored as a
+    fixed-width record of its time and each metric, NaN where the device
+    has no reading. The file is memory-mapped and holds a fixed number of
+    records, overwriting the oldest, so it never grows. A file of another
+    capacity is rewritten with its latest records. Records are numbered by
+    the count of records ever written, kept in the header, and a range is
+    found by bisecting the records still held by time.
+    """
+
+    def __init__(self, device: DysonFanDevice, path: str, capacity: int = CAPACITY):
+        """Initialize the history."""
+        self._device = device
+        self._path = path
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._total = 0
+        self._interval: Optional[int] = None
+        # On the class, as the properties fail before the first reading.
+        self._attributes = [
+            attribute if hasattr(type(device), attribute) else None
+            for attribute in METRICS.values()
+        ]
+
+    @property
+    def serial(self) -> str:
+        """Return the serial of the device."""
+        return self._device.serial
+
+    def open(self) -> None:
+        """Open the file, starting it over if it does not match."""
+        size = _HEADER.size + self._capacity * _RECORD.size
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        mode = "r+b" if os.path.exists(self._path) else "w+b"
+        self._file = open(self._path, mode)
+        header = self._file.read(_HEADER.size)
+        total: Optional[int] = None
+        kept: List[bytes] = []
+        if len(header) == _HEADER.size:
+            magic, version, metrics, capacity, total = _HEADER.unpack(header)
+            if (magic, version, metrics) != (
+                _MAGIC,
+                _VERSION,
+                len(METRICS),
+            ) or os.path.getsize(self._path) != _HEADER.size + capacity * _RECORD.size:
+                total = None
+            elif capacity != self._capacity:
+                first = max(total - min(capacity, self._capacity), 0)
+                for position in range(first, total):
+                    self._file.seek(_HEADER.size + position % capacity * _RECORD.size)
+                    kept.append(self._file.read(_RECORD.size))
+                total = None
+        if total is None:
+            self._file.truncate(0)
+            self._file.truncate(size)
+            self._file.seek(_HEADER.size)
+            self._file.write(b"".join(kept))
+            self._file.flush()
+            total = len(kept)
+        with self._lock:
+            self._map = mmap.mmap(self._file.fileno(), size)
+            self._total = total
+            self._write_header()
+            if total:
+                self._interval = self._timestamp(total - 1) // INTERVAL
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self._file = None
+
+    @callback
+    def async_start(self) -> None:
+        """Start storing the environmental readings."""
+        self._device.add_message_listener(self._on_message)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop storing the environmental readings."""
+        self._device.remove_message_listener(self._on_message)
+
+    def append(self, timestamp: float, values: List[float]) -> None:
+        """Append a record, overwriting the oldest one once full."""
+        with self._lock:
+            if self._map is None:
+                return
+            timestamp = int(timestamp)
+            if self._total:
+                # Keep the records in order if the clock goes back.
+                timestamp = max(timestamp, self._timestamp(self._total - 1))
+            _RECORD.pack_into(self._map, self._offset(self._total), timestamp, *values)
+            self._total += 1
+            self._write_header()
+
+    def read(
+        self, start: float, end: float, after: Optional[int] = None
+    ) -> Tuple[List[Row], Optional[int]]:
+        """Return a batch of records from start to end and where to go on.
+
+        The first batch is found by time, and each following one goes on
+        from the position returned with the one before, which is None once
+        the range is done. Missing readings are None.
+        """
+        rows = []
+        with self._lock:
+            if self._map is None:
+                return rows, None
+            first = max(self._total - self._capacity, 0)
+            position = self._find(first, start) if after is None else max(after, first)
+            while position < self._total and len(rows) < BATCH_SIZE:
+                record = _RECORD.unpack_from(self._map, self._offset(position))
+                if record[0] > end:
+                    return rows, None
+                rows.append(
+                    [record[0]]
+                    + [None if math.isnan(value) else value for value in record[1:]]
+                )
+                position += 1
+        return rows, position if position < self._total else None
+
+    def count(self, start: float, end: float) -> int:
+        """Return the number of records held from start to end."""
+        with self._lock:
+            if self._map is None:
+                return 0
+            first = self._find(max(self._total - self._capacity, 0), start)
+            return self._find(first, end, after=True) - first
+
+    def _find(self, low: int, timestamp: float, after: bool = False) -> int:
+        """Return the first position at, or if after past, a time."""
+        high = self._total
+        while low < high:
+            middle = (low + high) // 2
+            found = self._timestamp(middle)
+            if found < timestamp or (after and found == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _offset(self, position: int) -> int:
+        return _HEADER.size + position % self._capacity * _RECORD.size
+
+    def _timestamp(self, position: int) -> int:
+        return _TIMESTAMP.unpack_from(self._map, self._offset(position))[0]
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(
+            self._map, 0, _MAGIC, _VERSION, len(METRICS), self._capacity, self._total
+        )
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.ENVIRONMENTAL:
+            return
+        now = time.time()
+        interval = int(now // INTERVAL)
+        if interval == self._interval:
+            return
+        self._interval = interval
+        values = []
+        for attribute in self._attributes:
+            value = None if attribute is None else getattr(self._device, attribute)
+            # Off, initializing and failed sensors have no reading.
+            if not isinstance(value, (int, float)) or value < 0:
+                value = math.nan
+            else:
+                value = min(value, _MAX_VALUE)
+            values.append(value)
+        self.append(now, values)
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant) -> None:
+    """Register the websocket command streaming a device history."""
+    websocket_api.async_register_command(hass, websocket_history)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/history",
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_START_TIME): cv.datetime,
+        vol.Optional(ATTR_END_TIME): cv.datetime,
+    }
+)
+@websocket_api.async_response
+async def websocket_history(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict
+) -> None:
+    """Stream the stored readings of a device over a time range.
+
+    The command is answered at once, then the records follow in events of
+    up to a batch each, the last one marked as done. Unsubscribing stops
+    the stream.
+    """
+    history = async_get_history(hass, msg[ATTR_DEVICE_ID])
+    if history is None:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, "Device has no history"
+        )
+        return
+    start = dt_util.as_timestamp(msg[ATTR_START_TIME])
+    end = dt_util.as_timestamp(msg[ATTR_END_TIME]) if ATTR_END_TIME in msg else math.inf
+
+    cancelled = False
+
+    @callback
+    def _async_cancel() -> None:
+        nonlocal cancelled
+        cancelled = True
+
+    connection.subscriptions[msg["id"]] = _async_cancel
+    connection.send_result(msg["id"])
+    position = None
+    while not cancelled:
+        rows, position = await hass.async_add_executor_job(
+            history.read, start, end, position
+        )
+        connection.send_message(
+            websocket_api.event_message(
+                msg["id"],
+                {"metrics": list(METRICS), "records": rows, "done": position is None},
+            )
+        )
+        if position is None:
+            break
+    connection.subscriptions.pop(msg["id"], None)
+
+
+@callback
+def async_get_history(hass: HomeAssistant, device_id: str) -> Optional[DysonHistory]:
+    """Return the history of a device by its device registry id."""
+    entry = dr.async_get(hass).async_get(device_id)
+    if entry is None:
+        return None
+    serial = next(
+        (value for domain, value in entry.identifiers if domain == DOMAIN), None
+    )
+    return next(
+        (
+            history
+            for history in hass.data[DOMAIN][DATA_HISTORY].values()
+            if history.serial == serial
+        ),
+        None,
+    )
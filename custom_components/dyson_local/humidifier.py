@@ -1,8 +1,8 @@
 """Humidifier platform for Dyson."""
 
-from typing import Callable, Optional
+from typing import Any, Callable, Mapping, Optional
 
-from libdyson import MessageType
+from libdyson import DysonPureHumidifyCool, MessageType
 
 from homeassistant.components.humidifier import (
     DEVICE_CLASS_HUMIDIFIER,
@@ -15,7 +15,9 @@ from homeassistant.const import CONF_NAME
 from homeassistant.core import HomeAssistant
 
 from . import DysonEntity
-from .const import DATA_DEVICES, DOMAIN
+from .commands import DysonCommandBatch
+from .const import CONTROLLER_HUMIDITY, DATA_CONTROLLERS, DATA_DEVICES, DOMAIN
+from .control import DysonHumidityController
 
 AVAILABLE_MODES = [MODE_NORMAL, MODE_AUTO]
 
@@ -28,7 +30,12 @@ async def async_setup_entry(
     """Set up Dyson humidifier from a config entry."""
     device = hass.data[DOMAIN][DATA_DEVICES][config_entry.entry_id]
     name = config_entry.data[CONF_NAME]
-    async_add_entities([DysonHumidifierEntity(device, name)])
+    controller = (
+        hass.data[DOMAIN][DATA_CONTROLLERS]
+        .get(config_entry.entry_id, {})
+        .get(CONTROLLER_HUMIDITY)
+    )
+    async_add_entities([DysonHumidifierEntity(device, name, controller)])
 
 
 class DysonHumidifierEntity(DysonEntity, HumidifierEntity):
@@ -42,14 +49,45 @@ class DysonHumidifierEntity(DysonEntity, HumidifierEntity):
     _attr_min_humidity = 30
     _attr_supported_features = SUPPORT_MODES
 
+    def __init__(
+        self,
+        device: DysonPureHumidifyCool,
+        name: str,
+        controller: Optional[DysonHumidityController] = None,
+    ):
+        """Initialize the entity."""
+        super().__init__(device, name)
+        self._controller = controller
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        controller = self._controller
+        if controller is not None:
+            controller.add_listener(self.schedule_update_ha_state)
+            self.async_on_remove(
+                lambda: controller.remove_listener(self.schedule_update_ha_state)
+            )
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the decisions of the humidity controller."""
+        if self._controller is None:
+            return None
+        return self._controller.as_dict()
+
     @property
     def is_on(self) -> bool:
-        """Return if humidification is on."""
+        """Return if humidification, or the humidity controller, is on."""
+        if self._controller is not None:
+            return self._controller.enabled
         return self._device.humidification
 
     @property
     def target_humidity(self) -> Optional[int]:
         """Return the target."""
+        if self._controller is not None:
+            return self._controller.target
         if self._device.humidification_auto_mode:
             return None
 
@@ -60,21 +98,33 @@ class DysonHumidifierEntity(DysonEntity, HumidifierEntity):
         """Return current mode."""
         return MODE_AUTO if self._device.humidification_auto_mode else MODE_NORMAL
 
-    def turn_on(self, **kwargs) -> None:
+    async def async_turn_on(self, **kwargs) -> None:
         """Turn on humidification."""
+        if self._controller is not None:
+            self._controller.async_set_enabled(True)
+            return
         self._device.enable_humidification()
 
-    def turn_off(self, **kwargs) -> None:
+    async def async_turn_off(self, **kwargs) -> None:
         """Turn off humidification."""
+        if self._controller is not None:
+            self._controller.async_set_enabled(False)
         self._device.disable_humidification()
 
-    def set_humidity(self, humidity: int) -> None:
+    async def async_set_humidity(self, humidity: int) -> None:
         """Set target humidity."""
-        self._device.set_target_humidity(humidity)
-        self.set_mode(MODE_NORMAL)
-
-    def set_mode(self, mode: str) -> None:
+        if self._controller is not None:
+            self._controller.async_set_target(humidity)
+            return
+        with DysonCommandBatch(self._device):
+            self._device.set_target_humidity(humidity)
+            self._set_mode(MODE_NORMAL)
+
+    async def async_set_mode(self, mode: str) -> None:
         """Set humidification mode."""
+        self._set_mode(mode)
+
+    def _set_mode(self, mode: str) -> None:
         if mode == MODE_AUTO:
             self._device.enable_humidification_auto_mode()
         elif mode == MODE_NORMAL:
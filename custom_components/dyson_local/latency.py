@@ -0,0 +1,174 @@
+"""Command acknowledgement latency tracking for Dyson devices."""
+
+from collections import deque
+import logging
+import math
+import threading
+import time
+from typing import Deque, Dict, List, Optional
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonDevice
+
+from .optimistic import OptimisticStatus
+
+_LOGGER = logging.getLogger(__name__)
+
+# Commands not confirmed within this many seconds count as timed out.
+ACK_TIMEOUT = 10
+
+# Number of recent latencies kept for the percentiles.
+LATENCY_SAMPLES = 500
+
+# Upper bounds of the histogram buckets, in milliseconds.
+HISTOGRAM_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _Command:
+    """A published command waiting to be confirmed."""
+
+    def __init__(self, fields: Dict[str, str], sent_at: float):
+        self.fields = fields
+        self.sent_at = sent_at
+
+
+class DysonLatencyTracker:
+    """Match published commands to the state messages that confirm them.
+
+    A command is confirmed by the first state message in which every field
+    it set has the commanded value. Fields overwritten by a later command
+    are no longer waited for, and commands left with no fields are counted
+    as superseded rather than timed out.
+    """
+
+    def __init__(self, device: DysonDevice, timeout: float = ACK_TIMEOUT):
+        """Initialize the tracker."""
+        self._device = device
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._outstanding: List[_Command] = []
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.confirmed = 0
+        self.timeouts = 0
+        self.superseded = 0
+
+    def start(self) -> None:
+        """Start following the device state.
+
+        Must be called before optimistic state starts following the device,
+        so state messages are seen before commanded values are overlaid.
+        """
+        self._device.add_message_listener(self._on_message)
+
+    def stop(self) -> None:
+        """Stop following the device state."""
+        self._device.remove_message_listener(self._on_message)
+
+    def published(self, fields: Dict[str, str]) -> None:
+        """Record a command published to the device."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            status = getattr(self._device, "_status", None)
+            if not isinstance(status, dict):
+                return
+            fields = {
+                field: value for field, value in fields.items() if field in status
+            }
+            if not fields:
+                return
+            for command in self._outstanding:
+                for field in fields:
+                    command.fields.pop(field, None)
+            self.superseded += sum(
+                1 for command in self._outstanding if not command.fields
+            )
+            self._outstanding = [
+                command for command in self._outstanding if command.fields
+            ]
+            self._outstanding.append(_Command(fields, now))
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.STATE:
+            return
+        status = getattr(self._device, "_status", None)
+        if not isinstance(status, dict) or isinstance(status, OptimisticStatus):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            outstanding = []
+            for command in self._outstanding:
+                if all(
+                    field in status
+                    and self._device._get_field_value(status, field) == value
+                    for field, value in command.fields.items()
+                ):
+                    self._record((now - command.sent_at) * 1000)
+                else:
+                    outstanding.append(command)
+            self._outstanding = outstanding
+
+    def _record(self, latency_ms: float) -> None:
+        self.confirmed += 1
+        self._latencies.append(latency_ms)
+        for index, bound in enumerate(HISTOGRAM_BUCKETS):
+            if latency_ms <= bound:
+                self._histogram[index] += 1
+                return
+        self._histogram[-1] += 1
+
+    def _expire(self, now: float) -> None:
+        expired = [
+            command
+            for command in self._outstanding
+            if now - command.sent_at > self._timeout
+        ]
+        if not expired:
+            return
+        for command in expired:
+            _LOGGER.debug(
+                "Device %s did not confirm %s within %ss",
+                self._device.serial,
+                command.fields,
+                self._timeout,
+            )
+        self.timeouts += len(expired)
+        self._outstanding = [
+            command for command in self._outstanding if command not in expired
+        ]
+
+    def as_dict(self) -> dict:
+        """Return the latency statistics."""
+        with self._lock:
+            self._expire(time.monotonic())
+            latencies = sorted(self._latencies)
+            histogram = {
+                f"<={bound}": count
+                for bound, count in zip(HISTOGRAM_BUCKETS, self._histogram)
+            }
+            histogram[f">{HISTOGRAM_BUCKETS[-1]}"] = self._histogram[-1]
+            return {
+                "confirmed": self.confirmed,
+                "timeouts": self.timeouts,
+                "superseded": self.superseded,
+                "outstanding": len(self._outstanding),
+                "p50_ms": _percentile(latencies, 50),
+                "p95_ms": _percentile(latencies, 95),
+                "p99_ms": _percentile(latencies, 99),
+                "max_ms": _round(latencies[-1]) if latencies else None,
+                "histogram_ms": histogram,
+            }
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    rank = max(math.ceil(percentile / 100 * len(values)), 1)
+    return _round(values[rank - 1])
+
+
+def _round(value: float) -> float:
+    return round(value, 1)
@@ -0,0 +1,196 @@
+"""Hourly long-term statistics of the environmental readings of Dyson fans."""
+
+from datetime import datetime
+import logging
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonFanDevice
+
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import (
+    CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
+    PERCENTAGE,
+    TEMP_CELSIUS,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_utc_time_change
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Metric(NamedTuple):
+    attribute: str
+    name: str
+    unit: str
+    offset: float = 0
+
+
+# Metrics pushed, with the device property each one is read from and what
+# to add to the reading to match the sensor state.
+METRICS = {
+    "pm25": _Metric(
+        "particulate_matter_2_5", "PM 2.5", CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
+    ),
+    "pm10": _Metric(
+        "particulate_matter_10", "PM 10", CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
+    ),
+    "voc": _Metric(
+        "volatile_organic_compounds",
+        "Volatile Organic Compounds",
+        CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
+    ),
+    "no2": _Metric(
+        "nitrogen_dioxide", "Nitrogen Dioxide", CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
+    ),
+    "hcho": _Metric(
+        "formaldehyde", "Formaldehyde", CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
+    ),
+    "humidity": _Metric("humidity", "Humidity", PERCENTAGE),
+    "temperature": _Metric("temperature", "Temperature", TEMP_CELSIUS, -273.15),
+}
+
+# Past the hour, to give readings taken just before it time to come in.
+FLUSH_SECOND = 5
+
+
+class _Hour:
+    """Running count, sum, minimum and maximum of an hour of readings."""
+
+    def __init__(self):
+        """Initialize the hour."""
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def add(self, value: float) -> None:
+        """Add a reading."""
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+def _hour_start(now: datetime) -> datetime:
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+class DysonLongTermStatistics:
+    """Hourly mean, minimum and maximum of the readings of a device.
+
+    Readings are added to the running aggregates of their hour as they
+    arrive, so nothing is kept but a handful of numbers per metric. Once an
+    hour is over, on the first reading of a later one or on the timer just
+    past the hour if the device went quiet, its aggregates are imported as
+    external statistics, without going through recorded states.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: DysonFanDevice, name: str):
+        """Initialize the statistics."""
+        self._hass = hass
+        self._device = device
+        self._name = name
+        self._lock = threading.Lock()
+        self._start: Optional[datetime] = None
+        self._hours: Dict[str, _Hour] = {}
+        # On the class, as the properties fail before the first reading.
+        self._metrics = [
+            metric
+            for metric, spec in METRICS.items()
+            if hasattr(type(device), spec.attribute)
+        ]
+        self._remove_timer: Optional[Callable] = None
+
+    def statistic_id(self, metric: str) -> str:
+        """Return the external statistic id of a metric."""
+        return f"{DOMAIN}:{slugify(self._device.serial)}_{metric}"
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the environmental readings."""
+        self._device.add_message_listener(self._on_message)
+        self._remove_timer = async_track_utc_time_change(
+            self._hass, self._async_on_time, minute=0, second=FLUSH_SECOND
+        )
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the readings, dropping the hour in progress."""
+        self._device.remove_message_listener(self._on_message)
+        if self._remove_timer is not None:
+            self._remove_timer()
+            self._remove_timer = None
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.ENVIRONMENTAL:
+            return
+        start = _hour_start(dt_util.utcnow())
+        readings = []
+        for metric in self._metrics:
+            value = getattr(self._device, METRICS[metric].attribute)
+            # Off, initializing and failed sensors have no reading.
+            if isinstance(value, (int, float)) and value >= 0:
+                readings.append((metric, value + METRICS[metric].offset))
+        with self._lock:
+            completed = self._take_completed(start)
+            if self._start is None:
+                self._start = start
+            for metric, value in readings:
+                self._hours.setdefault(metric, _Hour()).add(value)
+        if completed is not None:
+            self._hass.loop.call_soon_threadsafe(self._async_import, *completed)
+
+    @callback
+    def _async_on_time(self, now: datetime) -> None:
+        with self._lock:
+            completed = self._take_completed(_hour_start(now))
+        if completed is not None:
+            self._async_import(*completed)
+
+    def _take_completed(
+        self, start: datetime
+    ) -> Optional[Tuple[datetime, Dict[str, _Hour]]]:
+        """Hand over the hour in progress if it started before a time."""
+        if self._start is None or self._start >= start:
+            return None
+        completed = (self._start, self._hours)
+        self._start = None
+        self._hours = {}
+        return completed
+
+    @callback
+    def _async_import(self, start: datetime, hours: Dict[str, _Hour]) -> None:
+        if "recorder" not in self._hass.config.components:
+            return
+        for metric, hour in hours.items():
+            spec = METRICS[metric]
+            async_add_external_statistics(
+                self._hass,
+                {
+                    "has_mean": True,
+                    "has_sum": False,
+                    "name": f"{self._name} {spec.name}",
+                    "source": DOMAIN,
+                    "statistic_id": self.statistic_id(metric),
+                    "unit_of_measurement": spec.unit,
+                },
+                [
+                    {
+                        "start": start,
+                        "mean": hour.total / hour.count,
+                        "min": hour.minimum,
+                        "max": hour.maximum,
+                    }
+                ],
+            )
+        _LOGGER.debug(
+            "Imported statistics of %s for the hour from %s: %s",
+            self._device.serial,
+            start,
+            list(hours),
+        )
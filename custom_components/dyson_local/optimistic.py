@@ -0,0 +1,160 @@
+"""Optimistic state for Dyson devices."""
+
+from datetime import datetime, timedelta
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonDevice
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# How long a commanded value is shown without the device confirming it.
+OPTIMISTIC_TIMEOUT = timedelta(seconds=5)
+
+# The sleep timer counts down, so its echo rarely matches the command.
+EXCLUDED_FIELDS = {"sltm"}
+
+
+class OptimisticStatus(dict):
+    """Device status with commanded values overlaid."""
+
+
+class DysonOptimisticState:
+    """Show commanded values before the device echoes them.
+
+    Commanded fields are overlaid on the device status and entities are
+    notified straight away. Each state message from the device replaces the
+    underlying status; fields it confirms are dropped from the overlay, the
+    rest stay until they time out and are rolled back to the reported value.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: DysonDevice,
+        timeout: timedelta = OPTIMISTIC_TIMEOUT,
+    ):
+        """Initialize the optimistic state."""
+        self._hass = hass
+        self._device = device
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, datetime]] = {}
+        self._reported: Optional[dict] = None
+        self._overlay: Optional[dict] = None
+        self._cancel_check: Optional[Callable[[], None]] = None
+        self.confirmed = 0
+        self.rolled_back = 0
+
+    def start(self) -> None:
+        """Start following the device state."""
+        self._device.add_message_listener(self._on_message)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the device state."""
+        self._device.remove_message_listener(self._on_message)
+        if self._cancel_check is not None:
+            self._cancel_check()
+            self._cancel_check = None
+
+    def command(self, fields: Dict[str, str]) -> None:
+        """Overlay the fields of a command sent to the device."""
+        with self._lock:
+            status = self._device._status
+            if status is None:
+                return
+            if status is not self._overlay:
+                self._reported = status
+            deadline = dt_util.utcnow() + self._timeout
+            fields = {
+                field: value
+                for field, value in fields.items()
+                if field in self._reported and field not in EXCLUDED_FIELDS
+            }
+            if not fields:
+                return
+            for field, value in fields.items():
+                self._pending[field] = (value, deadline)
+            self._apply()
+        self._hass.loop.call_soon_threadsafe(self._async_schedule_check)
+        self._notify()
+
+    def _apply(self) -> None:
+        self._overlay = OptimisticStatus(
+            self._reported,
+            **{field: value for field, (value, _) in self._pending.items()},
+        )
+        self._device._status = self._overlay
+
+    def _notify(self) -> None:
+        for listener in list(self._device._callbacks):
+            if listener != self._on_message:
+                listener(MessageType.STATE)
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.STATE:
+            return
+        with self._lock:
+            status = self._device._status
+            if status is self._overlay or not self._pending:
+                return
+            self._reported = status
+            for field, (value, _) in list(self._pending.items()):
+                if (
+                    field in status
+                    and self._device._get_field_value(status, field) == value
+                ):
+                    del self._pending[field]
+                    self.confirmed += 1
+            if self._pending:
+                # Entities are notified after this listener, so they see
+                # the overlay again.
+                self._apply()
+            else:
+                self._overlay = None
+
+    @callback
+    def _async_schedule_check(self) -> None:
+        if self._cancel_check is not None:
+            return
+        with self._lock:
+            deadlines = [deadline for _, deadline in self._pending.values()]
+        if deadlines:
+            self._cancel_check = async_track_point_in_utc_time(
+                self._hass, self._async_check, min(deadlines)
+            )
+
+    @callback
+    def _async_check(self, now: datetime) -> None:
+        self._cancel_check = None
+        with self._lock:
+            expired = [
+                field
+                for field, (_, deadline) in self._pending.items()
+                if deadline <= now
+            ]
+            for field in expired:
+                del self._pending[field]
+            if expired:
+                _LOGGER.debug(
+                    "Device %s did not confirm %s, rolling back",
+                    self._device.serial,
+                    expired,
+                )
+                self.rolled_back += len(expired)
+                if self._pending:
+                    self._apply()
+                else:
+                    if self._device._status is self._overlay:
+                        self._device._status = self._reported
+                    self._overlay = None
+        if expired:
+            self._notify()
+        self._async_schedule_check()
@@ -0,0 +1,128 @@
+"""Gradual changes of a device setting over time."""
+
+from datetime import datetime, timedelta
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonException
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .commands import get_command_queue
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def ramp_values(start: float, end: float, step: float) -> List[float]:
+    """Return the values from start to end, both included, step apart."""
+    count = math.ceil(round(abs(end - start) / step, 6))
+    direction = 1 if end >= start else -1
+    return [
+        start + direction * min(index * step, abs(end - start))
+        for index in range(count + 1)
+    ]
+
+
+class DysonRamp:
+    """Step a device setting through a series of values.
+
+    The values are spread evenly over the duration, each one scheduled from
+    the start time so the timing does not drift, with a single timer pending
+    at any time. Steps go through the command queue of the device like any
+    other command. A command from anywhere else that touches one of the
+    fields of the ramp takes over and cancels it.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: DysonDevice,
+        values: List[float],
+        duration: timedelta,
+        apply: Callable[[float], None],
+        fields: Iterable[str],
+    ):
+        """Initialize the ramp."""
+        self._hass = hass
+        self._device = device
+        self._values = values
+        self._duration = duration
+        self._apply = apply
+        self._fields = set(fields)
+        self._start: Optional[datetime] = None
+        self._index = 0
+        self._cancel_timer: Optional[Callable[[], None]] = None
+        self._stepping_thread: Optional[int] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Return whether the ramp has steps left."""
+        return self._start is not None
+
+    @property
+    def target(self) -> float:
+        """Return the final value of the ramp."""
+        return self._values[-1]
+
+    @callback
+    def async_start(self) -> None:
+        """Apply the first value and schedule the rest."""
+        queue = get_command_queue(self._device)
+        if queue is not None:
+            queue.add_listener(self._on_command)
+        self._start = dt_util.utcnow()
+        self._async_step(self._start)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Stop the ramp, leaving the setting at its current value."""
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+            self._cancel_timer = None
+        queue = get_command_queue(self._device)
+        if queue is not None:
+            queue.remove_listener(self._on_command)
+        self._start = None
+
+    @callback
+    def _async_step(self, _now: datetime) -> None:
+        self._cancel_timer = None
+        if self._start is None:
+            return
+        value = self._values[self._index]
+        self._stepping_thread = threading.get_ident()
+        try:
+            self._apply(value)
+        except DysonException as err:
+            _LOGGER.warning(
+                "Stopping ramp of %s at %s: %s", self._device.serial, value, err
+            )
+            self.async_cancel()
+            return
+        finally:
+            self._stepping_thread = None
+        self._index += 1
+        if self._index == len(self._values):
+            _LOGGER.debug("Ramp of %s reached %s", self._device.serial, value)
+            self.async_cancel()
+            return
+        steps = len(self._values) - 1
+        self._cancel_timer = async_track_point_in_utc_time(
+            self._hass,
+            self._async_step,
+            self._start + self._duration * self._index / steps,
+        )
+
+    def _on_command(self, fields: Dict[str, str]) -> None:
+        if threading.get_ident() == self._stepping_thread:
+            return
+        if self._fields.intersection(fields):
+            _LOGGER.debug(
+                "Command %s takes over the ramp of %s", fields, self._device.serial
+            )
+            self._hass.loop.call_soon_threadsafe(self.async_cancel)
@@ -0,0 +1,235 @@
+"""Subnet scan for Dyson devices that zeroconf cannot see."""
+
+import asyncio
+import ipaddress
+import logging
+import secrets
+import struct
+import time
+from typing import Dict, List, Optional, Set
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_SCANNER, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+MQTT_PORT = 1883
+
+# Enough concurrent probes to cover a /24 in a single round.
+SCAN_PARALLEL = 256
+PROBE_TIMEOUT = 1.0
+HANDSHAKE_PARALLEL = 16
+HANDSHAKE_TIMEOUT = 3.0
+# How long a sweep result is reused before hosts are probed again.
+OPEN_HOSTS_TTL = 300
+
+MAX_SCAN_HOSTS = 4096
+
+CONNACK_ACCEPTED = 0
+
+
+def get_network_hosts(network: str) -> List[str]:
+    """Return the host addresses of a network."""
+    network = ipaddress.ip_network(network, strict=False)
+    return [str(host) for host in network.hosts()] or [str(network.network_address)]
+
+
+def _mqtt_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def _mqtt_connect_packet(client_id: str, username: str, password: str) -> bytes:
+    """Build an MQTT 3.1 CONNECT packet, as used by libdyson."""
+    payload = (
+        _mqtt_string("MQIsdp")
+        # Protocol level 3, username + password + clean session, 60s keepalive
+        + bytes([3, 0xC2])
+        + struct.pack("!H", 60)
+        + _mqtt_string(client_id)
+        + _mqtt_string(username)
+        + _mqtt_string(password)
+    )
+    length = len(payload)
+    header = bytearray([0x10])
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(header) + payload
+
+
+async def async_probe_port(host: str, port: int, timeout: float) -> bool:
+    """Return whether a TCP port accepts connections."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def async_mqtt_handshake(
+    host: str, port: int, username: str, password: str, timeout: float
+) -> Optional[int]:
+    """Try to log in to an MQTT server and return the CONNACK return code.
+
+    Returns None if the host does not answer like an MQTT server.
+    """
+
+    async def _async_handshake() -> Optional[int]:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            client_id = f"ha-dyson-{secrets.token_hex(4)}"
+            writer.write(_mqtt_connect_packet(client_id, username, password))
+            await writer.drain()
+            connack = await reader.readexactly(4)
+            if connack[:2] != b"\x20\x02":
+                return None
+            if connack[3] == CONNACK_ACCEPTED:
+                writer.write(b"\xe0\x00")  # DISCONNECT
+            return connack[3]
+        finally:
+            writer.close()
+
+    try:
+        return await asyncio.wait_for(_async_handshake(), timeout)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+
+
+class DysonSubnetScanner:
+    """Locate devices by probing the Dyson MQTT port across networks.
+
+    A sweep finds every host with the port open. Hosts are then matched to a
+    serial by logging in with the device credential, and the mapping is
+    cached so later lookups only confirm the known address.
+    """
+
+    def __init__(
+        self,
+        networks: List[str],
+        port: int = MQTT_PORT,
+        probe_timeout: float = PROBE_TIMEOUT,
+        handshake_timeout: float = HANDSHAKE_TIMEOUT,
+    ):
+        """Initialize the scanner."""
+        self._hosts = [
+            host for network in networks for host in get_network_hosts(network)
+        ]
+        self._port = port
+        self._probe_timeout = probe_timeout
+        self._handshake_timeout = handshake_timeout
+        self._addresses: Dict[str, str] = {}
+        # Hosts that accept any credential are MQTT brokers, not devices.
+        self._brokers: Set[str] = set()
+        self._open_hosts: Optional[List[str]] = None
+        self._scanned_at = 0.0
+        self._sweep: Optional[asyncio.Future] = None
+
+    def get_address(self, serial: str) -> Optional[str]:
+        """Return the cached address of a device."""
+        return self._addresses.get(serial)
+
+    async def async_locate(self, serial: str, credential: str) -> Optional[str]:
+        """Return the address of a device, or None if it cannot be found."""
+        host = self._addresses.get(serial)
+        if host is not None:
+            if await self._async_login(host, serial, credential):
+                return host
+            _LOGGER.debug("Device %s is no longer at %s", serial, host)
+            self._addresses.pop(serial, None)
+
+        scanned_at = self._scanned_at
+        host = await self._async_match(
+            await self._async_get_open_hosts(OPEN_HOSTS_TTL), serial, credential
+        )
+        if host is None and self._scanned_at == scanned_at:
+            # The cached sweep may predate the device joining the network.
+            host = await self._async_match(
+                await self._async_get_open_hosts(0), serial, credential
+            )
+        if host is not None:
+            _LOGGER.debug("Found device %s at %s by scanning", serial, host)
+            self._addresses[serial] = host
+        return host
+
+    async def _async_get_open_hosts(self, max_age: float) -> List[str]:
+        if (
+            self._open_hosts is not None
+            and time.monotonic() - self._scanned_at < max_age
+        ):
+            return self._open_hosts
+        # Lookups that arrive during a sweep share it.
+        if self._sweep is None or self._sweep.done():
+            self._sweep = asyncio.ensure_future(self._async_sweep())
+        return await asyncio.shield(self._sweep)
+
+    async def _async_sweep(self) -> List[str]:
+        semaphore = asyncio.Semaphore(SCAN_PARALLEL)
+
+        async def _async_probe(host: str) -> bool:
+            async with semaphore:
+                return await async_probe_port(host, self._port, self._probe_timeout)
+
+        start = time.monotonic()
+        results = await asyncio.gather(*[_async_probe(host) for host in self._hosts])
+        self._open_hosts = [
+            host for host, is_open in zip(self._hosts, results) if is_open
+        ]
+        self._scanned_at = time.monotonic()
+        _LOGGER.debug(
+            "Scanned %d hosts in %.1fs, port %d open on %s",
+            len(self._hosts),
+            self._scanned_at - start,
+            self._port,
+            self._open_hosts,
+        )
+        return self._open_hosts
+
+    async def _async_match(
+        self, hosts: List[str], serial: str, credential: str
+    ) -> Optional[str]:
+        claimed = set(self._addresses.values()) | self._brokers
+        candidates = [host for host in hosts if host not in claimed]
+        if not candidates:
+            return None
+        semaphore = asyncio.Semaphore(HANDSHAKE_PARALLEL)
+
+        async def _async_try(host: str) -> Optional[str]:
+            async with semaphore:
+                if await self._async_login(host, serial, credential):
+                    return host
+            return None
+
+        tasks = [asyncio.ensure_future(_async_try(host)) for host in candidates]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                host = await next_result
+                if host is None:
+                    continue
+                if await self._async_login(host, serial, secrets.token_hex(16)):
+                    _LOGGER.debug("Ignoring MQTT broker at %s", host)
+                    self._brokers.add(host)
+                    continue
+                return host
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _async_login(self, host: str, serial: str, credential: str) -> bool:
+        return (
+            await async_mqtt_handshake(
+                host, self._port, serial, credential, self._handshake_timeout
+            )
+            == CONNACK_ACCEPTED
+        )
+
+
+@callback
+def async_get_scanner(hass: HomeAssistant) -> Optional[DysonSubnetScanner]:
+    """Return the subnet scanner if scan networks are configured."""
+    return hass.data.get(DOMAIN, {}).get(DATA_SCANNER)
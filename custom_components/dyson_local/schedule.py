@@ -0,0 +1,182 @@
+"""Time-of-day schedules of device settings."""
+
+from datetime import datetime, time, timedelta
+import heapq
+import itertools
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from libdyson.dyson_device import DysonDevice
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .settings import SETTINGS, SETTINGS_SCHEMA, async_apply_settings_to_devices
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_TIME = "time"
+
+EVENT_SCHEDULE_APPLIED = f"{DOMAIN}_schedule_applied"
+
+SCHEDULE_ENTRY_SCHEMA = vol.All(
+    vol.Schema({vol.Required(ATTR_TIME): cv.time, **SETTINGS_SCHEMA}),
+    cv.has_at_least_one_key(*SETTINGS),
+)
+
+SCHEDULE_SCHEMA = vol.All(cv.ensure_list, [SCHEDULE_ENTRY_SCHEMA])
+
+
+def schedule_to_options(schedule: List[dict]) -> List[dict]:
+    """Return a validated schedule in the form kept in the entry options."""
+    return [
+        {**entry, ATTR_TIME: entry[ATTR_TIME].isoformat()}
+        for entry in sorted(schedule, key=lambda entry: entry[ATTR_TIME])
+    ]
+
+
+def next_occurrence(now: datetime, at: time) -> datetime:
+    """Return the first UTC time after now that is at the local time of day."""
+    local_now = dt_util.as_local(now)
+    day = local_now.date()
+    while True:
+        when = dt_util.as_utc(
+            datetime.combine(day, at, tzinfo=dt_util.DEFAULT_TIME_ZONE)
+        )
+        if when > now:
+            return when
+        day += timedelta(days=1)
+
+
+class _Due(NamedTuple):
+    when: datetime
+    order: int
+    key: str
+    generation: int
+    index: int
+
+
+class DysonScheduler:
+    """Run the schedules of all devices from a single timer.
+
+    The next occurrence of every schedule entry is kept in a heap, and the
+    one timer is set for the head only. When it fires, every entry due by
+    then is applied in one fan-out, each device getting all of its due
+    settings in a single message, and pushed back for the next day.
+    Replacing or removing a schedule leaves its old entries in the heap,
+    skipped by their generation when they come up.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._heap: List[_Due] = []
+        self._order = itertools.count()
+        self._schedules: Dict[str, List[dict]] = {}
+        self._devices: Dict[str, DysonDevice] = {}
+        self._generations: Dict[str, int] = {}
+        self._cancel_timer: Optional[Callable[[], None]] = None
+        self._timer_at: Optional[datetime] = None
+
+    @property
+    def next_run(self) -> Optional[datetime]:
+        """Return when the timer fires next."""
+        return self._timer_at
+
+    @callback
+    def async_set_schedule(
+        self, key: str, device: DysonDevice, schedule: List[dict]
+    ) -> None:
+        """Replace the schedule of a device."""
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        self._schedules[key] = schedule
+        self._devices[key] = device
+        now = dt_util.utcnow()
+        for index in range(len(schedule)):
+            self._async_push(key, generation, index, now)
+        self._async_update_timer()
+
+    @callback
+    def async_remove(self, key: str) -> None:
+        """Remove the schedule of a device."""
+        if self._schedules.pop(key, None) is None:
+            return
+        self._devices.pop(key)
+        self._generations[key] += 1
+        self._async_update_timer()
+
+    @callback
+    def _async_push(self, key: str, generation: int, index: int, now: datetime) -> None:
+        at = self._schedules[key][index][ATTR_TIME]
+        heapq.heappush(
+            self._heap,
+            _Due(next_occurrence(now, at), next(self._order), key, generation, index),
+        )
+
+    def _is_current(self, due: _Due) -> bool:
+        return self._generations.get(due.key) == due.generation
+
+    @callback
+    def _async_update_timer(self) -> None:
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+        when = self._heap[0].when if self._heap else None
+        if when == self._timer_at:
+            return
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+            self._cancel_timer = None
+        self._timer_at = when
+        if when is not None:
+            self._cancel_timer = async_track_point_in_utc_time(
+                self._hass, self._async_run, when
+            )
+
+    @callback
+    def _async_run(self, now: datetime) -> None:
+        self._cancel_timer = None
+        self._timer_at = None
+        settings: Dict[str, dict] = {}
+        while self._heap and self._heap[0].when <= now:
+            due = heapq.heappop(self._heap)
+            if not self._is_current(due):
+                continue
+            entry = self._schedules[due.key][due.index]
+            # Entries of a device due together are merged, later ones winning.
+            settings.setdefault(due.key, {}).update(
+                {
+                    setting: value
+                    for setting, value in entry.items()
+                    if setting in SETTINGS
+                }
+            )
+            self._async_push(due.key, due.generation, due.index, now)
+        self._async_update_timer()
+        if settings:
+            devices = {key: self._devices[key] for key in settings}
+            self._hass.async_create_task(self._async_apply(devices, settings))
+
+    async def _async_apply(
+        self, devices: Dict[str, DysonDevice], settings: Dict[str, dict]
+    ) -> None:
+        report = await async_apply_settings_to_devices(self._hass, devices, settings)
+        _LOGGER.debug(
+            "Applied scheduled settings to %s devices in %sms",
+            len(devices),
+            report["wall_time_ms"],
+        )
+        self._hass.bus.async_fire(
+            EVENT_SCHEDULE_APPLIED,
+            {
+                "results": {
+                    devices[key].serial: result
+                    for key, result in report["results"].items()
+                },
+                "wall_time_ms": report["wall_time_ms"],
+            },
+        )
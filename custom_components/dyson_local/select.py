@@ -88,7 +88,7 @@ class DysonAirQualitySelect(DysonEntity, SelectEntity):
         """Return the current selected option."""
         return AIR_QUALITY_TARGET_ENUM_TO_STR[self._device.air_quality_target]
 
-    def select_option(self, option: str) -> None:
+    async def async_select_option(self, option: str) -> None:
         """Configure the new selected option."""
         self._device.set_air_quality_target(AIR_QUALITY_TARGET_STR_TO_ENUM[option])
 
@@ -115,7 +115,7 @@ class DysonOscillationModeSelect(DysonEntity, SelectEntity):
         """Return the current selected option."""
         return OSCILLATION_MODE_ENUM_TO_STR[self._device.oscillation_mode]
 
-    def select_option(self, option: str) -> None:
+    async def async_select_option(self, option: str) -> None:
         """Configure the new selected option."""
         self._device.enable_oscillation(OSCILLATION_MODE_STR_TO_ENUM[option])
 
@@ -142,7 +142,7 @@ class DysonWaterHardnessSelect(DysonEntity, SelectEntity):
         """Configure the new selected option."""
         return WATER_HARDNESS_ENUM_TO_STR[self._device.water_hardness]
 
-    def select_option(self, option: str) -> None:
+    async def async_select_option(self, option: str) -> None:
         """Configure the new selected option."""
         self._device.set_water_hardness(WATER_HARDNESS_STR_TO_ENUM[option])
 
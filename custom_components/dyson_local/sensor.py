@@ -1,6 +1,8 @@
 """Sensor platform for dyson."""
 
-from typing import Callable, Union
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Mapping, Optional, Union
 
 from libdyson import (
     Dyson360Eye,
@@ -20,17 +22,39 @@ from homeassistant.const import (
     PERCENTAGE,
     TEMP_CELSIUS,
     TIME_HOURS,
+    TIME_MINUTES,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
 )
+from homeassistant.util import dt as dt_util
 
 from . import DysonEntity
-from .const import DATA_COORDINATORS, DATA_DEVICES, DOMAIN
-from .utils import environmental_property
+from .aqi import (
+    POLLUTANT_HCHO,
+    POLLUTANT_NO2,
+    POLLUTANT_PM10,
+    POLLUTANT_PM25,
+    AirQuality,
+    air_quality,
+)
+from .const import (
+    CONF_DEADBAND_ABSOLUTE,
+    CONF_DEADBAND_RELATIVE,
+    CONF_HEARTBEAT,
+    DATA_COORDINATORS,
+    DATA_DEVICES,
+    DATA_FILTER_FORECASTS,
+    DATA_STATISTICS,
+    DOMAIN,
+)
+from .forecast import FILTER_CARBON, FILTER_HEPA, FILTER_LIFE, DysonFilterForecast
+from .sleep_timer import DysonSleepTimer
+from .statistics import DysonStatistics
+from .utils import DEFAULT_HEARTBEAT, DeadbandFilter, environmental_property
 
 
 async def async_setup_entry(
@@ -43,40 +67,62 @@ async def async_setup_entry(
         entities = [DysonBatterySensor(device, name)]
     else:
         coordinator = hass.data[DOMAIN][DATA_COORDINATORS][config_entry.entry_id]
+        statistics = hass.data[DOMAIN][DATA_STATISTICS].get(config_entry.entry_id)
+        forecast = hass.data[DOMAIN][DATA_FILTER_FORECASTS][config_entry.entry_id]
         entities = [
             DysonHumiditySensor(coordinator, device, name),
             DysonTemperatureSensor(coordinator, device, name),
-            DysonVOCSensor(coordinator, device, name),
+            DysonVOCSensor(coordinator, device, name, statistics),
+            DysonSleepTimerSensor(device, name),
         ]
         if isinstance(device, DysonPureCoolLink):
             entities.extend(
                 [
                     DysonFilterLifeSensor(device, name),
+                    DysonFilterReplacementSensor(device, name, forecast),
                     DysonParticulatesSensor(coordinator, device, name),
                 ]
             )
         else:  # DysonPureCool or DysonPureHumidifyCool
             entities.extend(
                 [
-                    DysonPM25Sensor(coordinator, device, name),
-                    DysonPM10Sensor(coordinator, device, name),
-                    DysonNO2Sensor(coordinator, device, name),
+                    DysonPM25Sensor(coordinator, device, name, statistics),
+                    DysonPM10Sensor(coordinator, device, name, statistics),
+                    DysonNO2Sensor(coordinator, device, name, statistics),
+                    DysonAQISensor(coordinator, device, name),
                 ]
             )
             if device.carbon_filter_life is None:
-                entities.append(DysonCombinedFilterLifeSensor(device, name))
+                entities.extend(
+                    [
+                        DysonCombinedFilterLifeSensor(device, name),
+                        DysonCombinedFilterReplacementSensor(device, name, forecast),
+                    ]
+                )
             else:
                 entities.extend(
                     [
                         DysonCarbonFilterLifeSensor(device, name),
                         DysonHEPAFilterLifeSensor(device, name),
+                        DysonCarbonFilterReplacementSensor(device, name, forecast),
+                        DysonHEPAFilterReplacementSensor(device, name, forecast),
                     ]
                 )
         if isinstance(device, DysonPureHumidifyCool) or isinstance(
             device, DysonPurifierHumidifyCoolFormaldehyde):
             entities.append(DysonNextDeepCleanSensor(device, name))
         if isinstance(device, DysonPurifierHumidifyCoolFormaldehyde):
-            entities.append(DysonHCHOSensor(coordinator, device, name))
+            entities.append(DysonHCHOSensor(coordinator, device, name, statistics))
+        absolute = config_entry.options.get(CONF_DEADBAND_ABSOLUTE, 0)
+        relative = config_entry.options.get(CONF_DEADBAND_RELATIVE, 0)
+        if absolute or relative:
+            heartbeat = config_entry.options.get(CONF_HEARTBEAT)
+            heartbeat = (
+                DEFAULT_HEARTBEAT if heartbeat is None else timedelta(minutes=heartbeat)
+            )
+            for entity in entities:
+                if isinstance(entity, DysonSensorEnvironmental) and entity._DEADBAND:
+                    entity.deadband = DeadbandFilter(absolute, relative, heartbeat)
     async_add_entities(entities)
 
 
@@ -106,13 +152,51 @@ class DysonSensorEnvironmental(CoordinatorEntity, DysonSensor):
     """Dyson environmental sensor."""
 
     _MESSAGE_TYPE = MessageType.ENVIRONMENTAL
+    _STATISTIC: Optional[str] = None
+    # Whether the deadband in the options applies, only to concentrations.
+    _DEADBAND = False
+
+    # Left unset, every reading is written.
+    deadband: Optional[DeadbandFilter] = None
 
     def __init__(
-        self, coordinator: DataUpdateCoordinator, device: DysonDevice, name: str
+        self,
+        coordinator: DataUpdateCoordinator,
+        device: DysonDevice,
+        name: str,
+        statistics: Optional[DysonStatistics] = None,
     ):
         """Initialize the environmental sensor."""
         CoordinatorEntity.__init__(self, coordinator)
         DysonSensor.__init__(self, device, name)
+        self._statistics = statistics
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if self.deadband is None:
+            super()._on_message(message_type)
+        elif message_type == self._MESSAGE_TYPE:
+            self.hass.loop.call_soon_threadsafe(self._async_write_significant)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if self.deadband is None:
+            super()._handle_coordinator_update()
+        else:
+            self._async_write_significant()
+
+    @callback
+    def _async_write_significant(self) -> None:
+        # Going unavailable and back counts as a change of the reading.
+        value = self.state if self.available else None
+        if self.deadband.should_write(value, dt_util.utcnow()):
+            self.async_write_ha_state()
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the rolling-window aggregates of the reading."""
+        if self._statistics is None or self._STATISTIC is None:
+            return None
+        return self._statistics.as_dict(self._STATISTIC)
 
 
 class DysonBatterySensor(DysonSensor):
@@ -189,6 +273,73 @@ class DysonCombinedFilterLifeSensor(DysonSensor):
         return self._device.hepa_filter_life
 
 
+class DysonFilterReplacementSensor(DysonSensor):
+    """Dyson filter replacement forecast sensor for Pure Cool Link."""
+
+    _SENSOR_TYPE = "filter_replacement"
+    _SENSOR_NAME = "Filter Replacement"
+    _FILTER = FILTER_LIFE
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:calendar-clock"
+
+    def __init__(self, device: DysonDevice, name: str, forecast: DysonFilterForecast):
+        """Initialize the sensor."""
+        super().__init__(device, name)
+        self._forecast = forecast
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        self._forecast.add_listener(self.async_write_ha_state)
+        self.async_on_remove(
+            partial(self._forecast.remove_listener, self.async_write_ha_state)
+        )
+
+    def _on_message(self, message_type: MessageType) -> None:
+        # Only written when the filter life changes the forecast.
+        pass
+
+    @property
+    def native_value(self) -> Optional[datetime]:
+        """Return when the filter is expected to run out."""
+        return self._forecast.replacement(self._FILTER)
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the depletion rate and usage the forecast is based on."""
+        rate = self._forecast.rate(self._FILTER)
+        usage = self._forecast.usage_per_day
+        return {
+            "depletion_per_running_hour": None if rate is None else round(rate, 4),
+            "running_hours_per_day": None if usage is None else round(usage, 1),
+        }
+
+
+class DysonCarbonFilterReplacementSensor(DysonFilterReplacementSensor):
+    """Dyson carbon filter replacement forecast sensor for Pure Cool."""
+
+    _SENSOR_TYPE = "carbon_filter_replacement"
+    _SENSOR_NAME = "Carbon Filter Replacement"
+    _FILTER = FILTER_CARBON
+
+
+class DysonHEPAFilterReplacementSensor(DysonFilterReplacementSensor):
+    """Dyson HEPA filter replacement forecast sensor for Pure Cool."""
+
+    _SENSOR_TYPE = "hepa_filter_replacement"
+    _SENSOR_NAME = "HEPA Filter Replacement"
+    _FILTER = FILTER_HEPA
+
+
+class DysonCombinedFilterReplacementSensor(DysonFilterReplacementSensor):
+    """Dyson combined filter replacement forecast sensor for Pure Cool."""
+
+    _SENSOR_TYPE = "combined_filter_replacement"
+    _SENSOR_NAME = "Filter Replacement"
+    _FILTER = FILTER_HEPA
+
+
 class DysonNextDeepCleanSensor(DysonSensor):
     """Sensor of time until next deep clean (in hours) for Dyson Pure Humidify+Cool."""
 
@@ -204,6 +355,42 @@ class DysonNextDeepCleanSensor(DysonSensor):
         return self._device.time_until_next_clean
 
 
+class DysonSleepTimerSensor(DysonSensor):
+    """Dyson sleep timer sensor (in minutes), counted down locally."""
+
+    _SENSOR_TYPE = "sleep_timer"
+    _SENSOR_NAME = "Sleep Timer"
+    _attr_icon = "mdi:timer-outline"
+    _attr_native_unit_of_measurement = TIME_MINUTES
+
+    _timer: Optional[DysonSleepTimer] = None
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        self._timer = DysonSleepTimer(self.hass, self._device)
+        self._timer.add_listener(self.async_write_ha_state)
+        self._timer.async_start()
+        self.async_on_remove(self._timer.async_stop)
+
+    def _on_message(self, message_type: MessageType) -> None:
+        # The countdown updates the state, at most once a minute.
+        pass
+
+    @property
+    def state(self) -> int:
+        """Return the state of the sensor."""
+        if self._timer is None:
+            return 0
+        return self._timer.remaining
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return when the device turns off."""
+        off_time = None if self._timer is None else self._timer.off_time
+        return {"off_time": None if off_time is None else off_time.isoformat()}
+
+
 class DysonHumiditySensor(DysonSensorEnvironmental):
     """Dyson humidity sensor."""
 
@@ -253,6 +440,8 @@ class DysonPM25Sensor(DysonSensorEnvironmental):
 
     _SENSOR_TYPE = "pm25"
     _SENSOR_NAME = "PM 2.5"
+    _DEADBAND = True
+    _STATISTIC = "pm25"
     _attr_device_class = SensorDeviceClass.PM25
     _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
     _attr_state_class = SensorStateClass.MEASUREMENT
@@ -268,6 +457,8 @@ class DysonPM10Sensor(DysonSensorEnvironmental):
 
     _SENSOR_TYPE = "pm10"
     _SENSOR_NAME = "PM 10"
+    _DEADBAND = True
+    _STATISTIC = "pm10"
     _attr_device_class = SensorDeviceClass.PM10
     _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
     _attr_state_class = SensorStateClass.MEASUREMENT
@@ -283,6 +474,7 @@ class DysonParticulatesSensor(DysonSensorEnvironmental):
 
     _SENSOR_TYPE = "pm1"
     _SENSOR_NAME = "Particulates"
+    _DEADBAND = True
     _attr_device_class = SensorDeviceClass.PM1
     _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
     _attr_state_class = SensorStateClass.MEASUREMENT
@@ -298,6 +490,8 @@ class DysonVOCSensor(DysonSensorEnvironmental):
 
     _SENSOR_TYPE = "voc"
     _SENSOR_NAME = "Volatile Organic Compounds"
+    _DEADBAND = True
+    _STATISTIC = "voc"
     _attr_device_class = SensorDeviceClass.VOLATILE_ORGANIC_COMPOUNDS
     _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
     _attr_state_class = SensorStateClass.MEASUREMENT
@@ -313,6 +507,8 @@ class DysonNO2Sensor(DysonSensorEnvironmental):
 
     _SENSOR_TYPE = "no2"
     _SENSOR_NAME = "Nitrogen Dioxide"
+    _DEADBAND = True
+    _STATISTIC = "no2"
     _attr_device_class = SensorDeviceClass.NITROGEN_DIOXIDE
     _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
     _attr_state_class = SensorStateClass.MEASUREMENT
@@ -323,11 +519,61 @@ class DysonNO2Sensor(DysonSensorEnvironmental):
         return self._device.nitrogen_dioxide
 
     
+class DysonAQISensor(DysonSensorEnvironmental):
+    """Dyson air quality index sensor, computed from the pollutant readings."""
+
+    _SENSOR_TYPE = "aqi"
+    _SENSOR_NAME = "Air Quality Index"
+    _attr_device_class = SensorDeviceClass.AQI
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    _air_quality = AirQuality(None, None, {})
+
+    async def async_added_to_hass(self) -> None:
+        """Call when entity is added to hass."""
+        await super().async_added_to_hass()
+        self._air_quality = air_quality(self._readings())
+
+    def _on_message(self, message_type: MessageType) -> None:
+        # Worked out once per reading, not on every state write.
+        if message_type == MessageType.ENVIRONMENTAL:
+            self._air_quality = air_quality(self._readings())
+        super()._on_message(message_type)
+
+    def _readings(self) -> dict:
+        readings = {
+            POLLUTANT_PM25: self._device.particulate_matter_2_5,
+            POLLUTANT_PM10: self._device.particulate_matter_10,
+            POLLUTANT_NO2: self._device.nitrogen_dioxide,
+        }
+        if isinstance(self._device, DysonPurifierHumidifyCoolFormaldehyde):
+            readings[POLLUTANT_HCHO] = self._device.formaldehyde
+        return readings
+
+    @property
+    def state(self) -> Optional[int]:
+        """Return the state of the sensor."""
+        return self._air_quality.index
+
+    @property
+    def extra_state_attributes(self) -> Optional[Mapping[str, Any]]:
+        """Return the pollutant setting the index, and each sub-index."""
+        return {
+            "dominant_pollutant": self._air_quality.dominant_pollutant,
+            **{
+                f"{pollutant}_index": index
+                for pollutant, index in self._air_quality.sub_indices.items()
+            },
+        }
+
+
 class DysonHCHOSensor(DysonSensorEnvironmental):
     """Dyson sensor for Formaldehyde."""
 
     _SENSOR_TYPE = "hcho"
     _SENSOR_NAME = "Formaldehyde"
+    _DEADBAND = True
+    _STATISTIC = "hcho"
     _attr_device_class = SensorDeviceClass.VOLATILE_ORGANIC_COMPOUNDS
     _attr_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
 
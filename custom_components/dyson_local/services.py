@@ -0,0 +1,294 @@
+"""Integration-wide services for Dyson Local."""
+
+import logging
+import math
+from typing import Dict, List, Optional
+
+from libdyson.dyson_device import DysonDevice, DysonFanDevice
+import voluptuous as vol
+
+from homeassistant.const import ATTR_DEVICE_ID, ATTR_NAME
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_SCHEDULE,
+    DATA_DEVICES,
+    DATA_SNAPSHOTS,
+    DOMAIN,
+    FORMAT_CSV,
+    FORMATS,
+)
+from .schedule import SCHEDULE_SCHEMA, schedule_to_options
+from .settings import (
+    SETTINGS,
+    SETTINGS_SCHEMA,
+    async_apply_settings_to_devices,
+    read_settings,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_FILE = "file"
+ATTR_MAX_PARALLEL = "max_parallel"
+ATTR_TIMEOUT = "timeout"
+ATTR_SCHEDULE = "schedule"
+ATTR_START_TIME = "start_time"
+ATTR_END_TIME = "end_time"
+ATTR_FORMAT = "format"
+
+SERVICE_IMPORT_DEVICES = "import_devices"
+SERVICE_APPLY_SETTINGS = "apply_settings"
+SERVICE_SNAPSHOT = "snapshot"
+SERVICE_RESTORE = "restore"
+SERVICE_SET_SCHEDULE = "set_schedule"
+SERVICE_EXPORT_HISTORY = "export_history"
+
+EVENT_SETTINGS_APPLIED = f"{DOMAIN}_settings_applied"
+EVENT_SNAPSHOT_RESTORED = f"{DOMAIN}_snapshot_restored"
+
+IMPORT_DEVICES_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_FILE): cv.string,
+        vol.Optional(ATTR_MAX_PARALLEL): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=64)
+        ),
+    }
+)
+
+APPLY_SETTINGS_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional(ATTR_TIMEOUT, default=10): vol.All(
+                vol.Coerce(float), vol.Range(min=0.1, max=60)
+            ),
+            **SETTINGS_SCHEMA,
+        }
+    ),
+    cv.has_at_least_one_key(*SETTINGS),
+)
+
+SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_NAME): cv.string,
+        vol.Required(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+RESTORE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_NAME): cv.string,
+        vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_TIMEOUT, default=10): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=60)
+        ),
+    }
+)
+
+SET_SCHEDULE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_SCHEDULE): SCHEDULE_SCHEMA,
+    }
+)
+
+EXPORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_FILE): cv.string,
+        vol.Required(ATTR_START_TIME): cv.datetime,
+        vol.Optional(ATTR_END_TIME): cv.datetime,
+        vol.Optional(ATTR_FORMAT, default=FORMAT_CSV): vol.In(FORMATS),
+    }
+)
+
+
+@callback
+def async_get_devices(
+    hass: HomeAssistant, device_ids: List[str]
+) -> Dict[str, Optional[DysonDevice]]:
+    """Return the set up Dyson device of each device registry id."""
+    device_registry = dr.async_get(hass)
+    devices = {
+        device.serial: device for device in hass.data[DOMAIN][DATA_DEVICES].values()
+    }
+    result = {}
+    for device_id in device_ids:
+        entry = device_registry.async_get(device_id)
+        serial = None
+        if entry is not None:
+            serial = next(
+                (value for domain, value in entry.identifiers if domain == DOMAIN),
+                None,
+            )
+        result[device_id] = devices.get(serial)
+    return result
+
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration services."""
+
+    async def _async_import_devices(call: ServiceCall) -> None:
+        # Only needed by the service, so keep it out of integration start up.
+        from .bulk_import import (  # pylint: disable=import-outside-toplevel
+            DEFAULT_PARALLEL,
+            async_import_devices,
+        )
+
+        await async_import_devices(
+            hass,
+            call.data[ATTR_FILE],
+            call.data.get(ATTR_MAX_PARALLEL, DEFAULT_PARALLEL),
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_IMPORT_DEVICES,
+        _async_import_devices,
+        schema=IMPORT_DEVICES_SCHEMA,
+    )
+
+    async def _async_apply_settings(call: ServiceCall) -> None:
+        settings = {
+            setting: call.data[setting] for setting in SETTINGS if setting in call.data
+        }
+        devices = async_get_devices(hass, call.data[ATTR_DEVICE_ID])
+        report = await async_apply_settings_to_devices(
+            hass,
+            devices,
+            {device_id: settings for device_id in devices},
+            call.data[ATTR_TIMEOUT],
+        )
+        _LOGGER.debug(
+            "Applied %s in %sms: %s", settings, report["wall_time_ms"], report
+        )
+        hass.bus.async_fire(EVENT_SETTINGS_APPLIED, {"settings": settings, **report})
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_APPLY_SETTINGS,
+        _async_apply_settings,
+        schema=APPLY_SETTINGS_SCHEMA,
+    )
+
+    async def _async_snapshot(call: ServiceCall) -> None:
+        settings = {}
+        for device_id, device in async_get_devices(
+            hass, call.data[ATTR_DEVICE_ID]
+        ).items():
+            if not isinstance(device, DysonFanDevice) or not device.is_connected:
+                _LOGGER.warning(
+                    "Device %s is not a connected fan, leaving it out of snapshot %s",
+                    device_id,
+                    call.data[ATTR_NAME],
+                )
+                continue
+            settings[device.serial] = read_settings(device)
+        await hass.data[DOMAIN][DATA_SNAPSHOTS].async_save(
+            call.data[ATTR_NAME], settings
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SNAPSHOT,
+        _async_snapshot,
+        schema=SNAPSHOT_SCHEMA,
+    )
+
+    async def _async_restore(call: ServiceCall) -> None:
+        name = call.data[ATTR_NAME]
+        snapshot = await hass.data[DOMAIN][DATA_SNAPSHOTS].async_get(name)
+        if snapshot is None:
+            _LOGGER.error("There is no snapshot named %s", name)
+            return
+        serials = set(snapshot)
+        if ATTR_DEVICE_ID in call.data:
+            serials &= {
+                device.serial
+                for device in async_get_devices(
+                    hass, call.data[ATTR_DEVICE_ID]
+                ).values()
+                if device is not None
+            }
+        devices = {
+            device.serial: device
+            for device in hass.data[DOMAIN][DATA_DEVICES].values()
+            if device.serial in serials
+        }
+        report = await async_apply_settings_to_devices(
+            hass,
+            {serial: devices.get(serial) for serial in sorted(serials)},
+            snapshot,
+            call.data[ATTR_TIMEOUT],
+        )
+        _LOGGER.debug("Restored snapshot %s in %sms", name, report["wall_time_ms"])
+        hass.bus.async_fire(EVENT_SNAPSHOT_RESTORED, {ATTR_NAME: name, **report})
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESTORE,
+        _async_restore,
+        schema=RESTORE_SCHEMA,
+    )
+
+    async def _async_set_schedule(call: ServiceCall) -> None:
+        device_id = call.data[ATTR_DEVICE_ID]
+        device = async_get_devices(hass, [device_id]).get(device_id)
+        if not isinstance(device, DysonFanDevice):
+            _LOGGER.error("Device %s is not a set up Dyson fan", device_id)
+            return
+        entry_id = next(
+            entry_id
+            for entry_id, entry_device in hass.data[DOMAIN][DATA_DEVICES].items()
+            if entry_device is device
+        )
+        entry = hass.config_entries.async_get_entry(entry_id)
+        # The options update listener hands the new schedule to the scheduler,
+        # without reloading the entry.
+        hass.config_entries.async_update_entry(
+            entry,
+            options={
+                **entry.options,
+                CONF_SCHEDULE: schedule_to_options(call.data[ATTR_SCHEDULE]),
+            },
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_SCHEDULE,
+        _async_set_schedule,
+        schema=SET_SCHEDULE_SCHEMA,
+    )
+
+    async def _async_export_history(call: ServiceCall) -> None:
+        # The history pulls in the websocket API, keep it out of start up.
+        from .export import (  # pylint: disable=import-outside-toplevel
+            async_export_history,
+        )
+        from .history import (  # pylint: disable=import-outside-toplevel
+            async_get_history,
+        )
+
+        device_id = call.data[ATTR_DEVICE_ID]
+        history = async_get_history(hass, device_id)
+        if history is None:
+            _LOGGER.error("Device %s is not a set up Dyson fan", device_id)
+            return
+        end = call.data.get(ATTR_END_TIME)
+        await async_export_history(
+            hass,
+            history,
+            call.data[ATTR_FILE],
+            dt_util.as_timestamp(call.data[ATTR_START_TIME]),
+            math.inf if end is None else dt_util.as_timestamp(end),
+            call.data[ATTR_FORMAT],
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_HISTORY,
+        _async_export_history,
+        schema=EXPORT_HISTORY_SCHEMA,
+    )
@@ -0,0 +1,359 @@
+"""Device-independent settings applied to Dyson fans in one message."""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from libdyson import MessageType
+from libdyson.const import AirQualityTarget, HumidifyOscillationMode, WaterHardness
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonException, DysonNotConnected
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
+
+from .commands import DysonCommandBatch
+from .optimistic import OptimisticStatus
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_POWER = "power"
+ATTR_AUTO_MODE = "auto_mode"
+ATTR_SPEED = "speed"
+ATTR_OSCILLATION = "oscillation"
+ATTR_OSCILLATION_ANGLES = "oscillation_angles"
+ATTR_OSCILLATION_MODE = "oscillation_mode"
+ATTR_NIGHT_MODE = "night_mode"
+ATTR_CONTINUOUS_MONITORING = "continuous_monitoring"
+ATTR_FRONT_AIRFLOW = "front_airflow"
+ATTR_FOCUS_MODE = "focus_mode"
+ATTR_AIR_QUALITY_TARGET = "air_quality_target"
+ATTR_HEAT_MODE = "heat_mode"
+ATTR_HEAT_TARGET = "heat_target"
+ATTR_HUMIDIFICATION = "humidification"
+ATTR_TARGET_HUMIDITY = "target_humidity"
+ATTR_HUMIDIFICATION_AUTO_MODE = "humidification_auto_mode"
+ATTR_WATER_HARDNESS = "water_hardness"
+ATTR_SLEEP_TIMER = "sleep_timer"
+
+_ANGLE = vol.All(vol.Coerce(int), vol.Range(min=5, max=355))
+
+# Applied in this order, so a setting that implies another one (a speed
+# selecting manual mode on Link devices, a heat target enabling heat mode)
+# comes first and an explicit value wins. Continuous monitoring goes first
+# as libdyson resends the current power or fan mode with it. The oscillation
+# angles and mode come after oscillation, as libdyson resends the current
+# ones with it, and turn it on, so turning oscillation off is applied last
+# along with turning the power off.
+SETTINGS_SCHEMA = {
+    vol.Optional(ATTR_CONTINUOUS_MONITORING): cv.boolean,
+    vol.Optional(ATTR_POWER): cv.boolean,
+    vol.Optional(ATTR_SPEED): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+    vol.Optional(ATTR_AUTO_MODE): cv.boolean,
+    vol.Optional(ATTR_OSCILLATION): cv.boolean,
+    vol.Optional(ATTR_OSCILLATION_ANGLES): vol.ExactSequence([_ANGLE, _ANGLE]),
+    vol.Optional(ATTR_OSCILLATION_MODE): vol.In(
+        [mode.name.lower() for mode in HumidifyOscillationMode]
+    ),
+    vol.Optional(ATTR_NIGHT_MODE): cv.boolean,
+    vol.Optional(ATTR_FRONT_AIRFLOW): cv.boolean,
+    vol.Optional(ATTR_FOCUS_MODE): cv.boolean,
+    vol.Optional(ATTR_AIR_QUALITY_TARGET): vol.In(
+        [target.name.lower() for target in AirQualityTarget]
+    ),
+    vol.Optional(ATTR_HEAT_TARGET): vol.All(
+        vol.Coerce(float), vol.Range(min=1, max=37)
+    ),
+    vol.Optional(ATTR_HEAT_MODE): cv.boolean,
+    vol.Optional(ATTR_TARGET_HUMIDITY): vol.All(
+        vol.Coerce(int), vol.Range(min=30, max=70)
+    ),
+    vol.Optional(ATTR_HUMIDIFICATION_AUTO_MODE): cv.boolean,
+    vol.Optional(ATTR_HUMIDIFICATION): cv.boolean,
+    vol.Optional(ATTR_WATER_HARDNESS): vol.In(
+        [hardness.name.lower() for hardness in WaterHardness]
+    ),
+    vol.Optional(ATTR_SLEEP_TIMER): vol.All(vol.Coerce(int), vol.Range(min=0, max=540)),
+}
+
+SETTINGS = [str(key) for key in SETTINGS_SCHEMA]
+
+RESULT_ACKED = "acked"
+RESULT_UNCHANGED = "unchanged"
+RESULT_TIMEOUT = "timeout"
+RESULT_NOT_FOUND = "not_found"
+RESULT_NOT_CONNECTED = "not_connected"
+RESULT_UNSUPPORTED = "unsupported"
+RESULT_FAILED = "failed"
+
+ACK_TIMEOUT = 10
+
+
+def _toggle(enable: str, disable: str) -> Tuple[Tuple[str, ...], Callable]:
+    def _apply(device: DysonDevice, value: bool) -> None:
+        getattr(device, enable if value else disable)()
+
+    return (enable, disable), _apply
+
+
+def _set(method: str, convert: Callable = int) -> Tuple[Tuple[str, ...], Callable]:
+    def _apply(device: DysonDevice, value) -> None:
+        getattr(device, method)(convert(value))
+
+    return (method,), _apply
+
+
+def _set_enum(method: str, enum: type) -> Tuple[Tuple[str, ...], Callable]:
+    def _apply(device: DysonDevice, value: str) -> None:
+        getattr(device, method)(enum[value.upper()])
+
+    return (method,), _apply
+
+
+def _set_oscillation_angles(device: DysonDevice, value: list) -> None:
+    device.enable_oscillation(*value)
+
+
+def _set_oscillation_mode(device: DysonDevice, value: str) -> None:
+    device.enable_oscillation(HumidifyOscillationMode[value.upper()])
+
+
+def _set_sleep_timer(device: DysonDevice, value: int) -> None:
+    if value:
+        device.set_sleep_timer(value)
+    else:
+        device.disable_sleep_timer()
+
+
+_SETTERS = {
+    ATTR_POWER: _toggle("turn_on", "turn_off"),
+    ATTR_AUTO_MODE: _toggle("enable_auto_mode", "disable_auto_mode"),
+    ATTR_SPEED: _set("set_speed"),
+    ATTR_OSCILLATION: _toggle("enable_oscillation", "disable_oscillation"),
+    # Told apart from the other enable_oscillation by what they read back.
+    ATTR_OSCILLATION_ANGLES: (
+        ("enable_oscillation", "oscillation_angle_low", "oscillation_angle_high"),
+        _set_oscillation_angles,
+    ),
+    ATTR_OSCILLATION_MODE: (
+        ("enable_oscillation", "oscillation_mode"),
+        _set_oscillation_mode,
+    ),
+    ATTR_NIGHT_MODE: _toggle("enable_night_mode", "disable_night_mode"),
+    ATTR_CONTINUOUS_MONITORING: _toggle(
+        "enable_continuous_monitoring", "disable_continuous_monitoring"
+    ),
+    ATTR_FRONT_AIRFLOW: _toggle("enable_front_airflow", "disable_front_airflow"),
+    ATTR_FOCUS_MODE: _toggle("enable_focus_mode", "disable_focus_mode"),
+    ATTR_AIR_QUALITY_TARGET: _set_enum("set_air_quality_target", AirQualityTarget),
+    ATTR_HEAT_MODE: _toggle("enable_heat_mode", "disable_heat_mode"),
+    # The device takes the heat target in kelvin.
+    ATTR_HEAT_TARGET: _set("set_heat_target", lambda value: value + 273),
+    ATTR_HUMIDIFICATION: _toggle("enable_humidification", "disable_humidification"),
+    ATTR_TARGET_HUMIDITY: _set("set_target_humidity"),
+    ATTR_HUMIDIFICATION_AUTO_MODE: _toggle(
+        "enable_humidification_auto_mode", "disable_humidification_auto_mode"
+    ),
+    ATTR_WATER_HARDNESS: _set_enum("set_water_hardness", WaterHardness),
+    ATTR_SLEEP_TIMER: (("set_sleep_timer", "disable_sleep_timer"), _set_sleep_timer),
+}
+
+
+# How to read back each setting. The sleep timer counts down, so it is
+# not part of the state that can be restored.
+_GETTERS = {
+    ATTR_POWER: lambda device: device.is_on,
+    ATTR_SPEED: lambda device: device.speed,
+    ATTR_AUTO_MODE: lambda device: device.auto_mode,
+    ATTR_OSCILLATION: lambda device: device.oscillation,
+    ATTR_OSCILLATION_ANGLES: lambda device: [
+        device.oscillation_angle_low,
+        device.oscillation_angle_high,
+    ],
+    ATTR_OSCILLATION_MODE: lambda device: device.oscillation_mode.name.lower(),
+    ATTR_NIGHT_MODE: lambda device: device.night_mode,
+    ATTR_CONTINUOUS_MONITORING: lambda device: device.continuous_monitoring,
+    ATTR_FRONT_AIRFLOW: lambda device: device.front_airflow,
+    ATTR_FOCUS_MODE: lambda device: device.focus_mode,
+    ATTR_AIR_QUALITY_TARGET: lambda device: device.air_quality_target.name.lower(),
+    ATTR_HEAT_TARGET: lambda device: round(device.heat_target - 273, 1),
+    ATTR_HEAT_MODE: lambda device: device.heat_mode_is_on,
+    ATTR_TARGET_HUMIDITY: lambda device: device.target_humidity,
+    ATTR_HUMIDIFICATION_AUTO_MODE: lambda device: device.humidification_auto_mode,
+    ATTR_HUMIDIFICATION: lambda device: device.humidification,
+    ATTR_WATER_HARDNESS: lambda device: device.water_hardness.name.lower(),
+}
+
+
+class UnsupportedSetting(ValueError):
+    """Represents a setting the device does not have."""
+
+
+def is_supported(device: DysonDevice, setting: str) -> bool:
+    """Return whether a device has a setting."""
+    # On the class, as the properties fail before the first state.
+    return all(hasattr(type(device), name) for name in _SETTERS[setting][0])
+
+
+def read_settings(device: DysonDevice) -> dict:
+    """Return the current value of every setting the device has."""
+    settings = {}
+    for setting, getter in _GETTERS.items():
+        if not is_supported(device, setting):
+            continue
+        value = getter(device)
+        # Speed is None in auto mode.
+        if value is not None:
+            settings[setting] = value
+    return settings
+
+
+def apply_settings(
+    device: DysonDevice,
+    settings: dict,
+    on_send: Optional[Callable[[Dict[str, str]], None]] = None,
+) -> Dict[str, str]:
+    """Apply settings to a device as a single STATE-SET.
+
+    Returns the fields that were sent.
+    """
+    for setting in settings:
+        if not is_supported(device, setting):
+            raise UnsupportedSetting(f"{device.serial} does not support {setting}")
+
+    with DysonCommandBatch(device, on_send) as batch:
+        for setting in SETTINGS:
+            if setting not in settings:
+                continue
+            if setting in (ATTR_POWER, ATTR_OSCILLATION) and not settings[setting]:
+                continue
+            _SETTERS[setting][1](device, settings[setting])
+        if settings.get(ATTR_OSCILLATION) is False:
+            device.disable_oscillation()
+        if settings.get(ATTR_POWER) is False:
+            device.turn_off()
+        fields = dict(batch.data)
+    return fields
+
+
+def _status_matches(device: DysonDevice, status, fields: Dict[str, str]) -> bool:
+    # Some fields are sent along but never reported, like ancp on oscillation.
+    return all(
+        device._get_field_value(status, field) == value
+        for field, value in fields.items()
+        if field in status
+    )
+
+
+class _AckWaiter:
+    """Wait for a device to report the fields sent to it."""
+
+    def __init__(self, hass: HomeAssistant, device: DysonDevice):
+        self._hass = hass
+        self._device = device
+        self.fields: Optional[Dict[str, str]] = None
+        self.future = hass.loop.create_future()
+
+    def start(self) -> None:
+        self._device.add_message_listener(self._on_message)
+
+    def stop(self) -> None:
+        self._device.remove_message_listener(self._on_message)
+
+    def _on_message(self, message_type: MessageType) -> None:
+        status = getattr(self._device, "_status", None)
+        if (
+            message_type != MessageType.STATE
+            or self.fields is None
+            or not isinstance(status, dict)
+            or isinstance(status, OptimisticStatus)
+        ):
+            return
+        if _status_matches(self._device, status, self.fields):
+            self._hass.loop.call_soon_threadsafe(self._async_set_acked)
+
+    @callback
+    def _async_set_acked(self) -> None:
+        if not self.future.done():
+            self.future.set_result(time.monotonic())
+
+
+async def async_apply_settings_to_devices(
+    hass: HomeAssistant,
+    devices: Dict[str, Optional[DysonDevice]],
+    settings: Dict[str, dict],
+    timeout: float = ACK_TIMEOUT,
+) -> dict:
+    """Apply settings, keyed like devices, at once and wait for the echoes.
+
+    All messages are published back to back from a single executor job, then
+    the echoes are awaited concurrently. Returns the result of each device,
+    with the time it took to be acknowledged, and the total wall time.
+    """
+    start = time.monotonic()
+    results: Dict[str, dict] = {}
+    waiters: Dict[str, _AckWaiter] = {}
+    for key, device in devices.items():
+        if device is None:
+            results[key] = {"result": RESULT_NOT_FOUND}
+            continue
+        waiter = _AckWaiter(hass, device)
+        waiter.start()
+        waiters[key] = waiter
+
+    def _publish_all() -> Dict[str, float]:
+        sent_at = {}
+        for key, waiter in waiters.items():
+            device = devices[key]
+            status = getattr(device, "_status", None)
+
+            def _on_send(fields: Dict[str, str], waiter=waiter) -> None:
+                # Set before publishing, so a fast echo is not missed.
+                waiter.fields = fields
+
+            published_at = time.monotonic()
+            try:
+                fields = apply_settings(device, settings[key], _on_send)
+            except DysonNotConnected:
+                results[key] = {"result": RESULT_NOT_CONNECTED}
+            except UnsupportedSetting:
+                results[key] = {"result": RESULT_UNSUPPORTED}
+            except (DysonException, ValueError) as err:
+                _LOGGER.warning("Failed to apply settings to %s: %s", key, err)
+                results[key] = {"result": RESULT_FAILED}
+            else:
+                if (
+                    isinstance(status, dict)
+                    and not isinstance(status, OptimisticStatus)
+                    and _status_matches(device, status, fields)
+                ):
+                    results[key] = {"result": RESULT_UNCHANGED}
+                else:
+                    sent_at[key] = published_at
+        return sent_at
+
+    try:
+        sent_at = await hass.async_add_executor_job(_publish_all)
+
+        async def _async_wait(key: str) -> None:
+            try:
+                acked_at = await asyncio.wait_for(waiters[key].future, timeout)
+            except asyncio.TimeoutError:
+                results[key] = {"result": RESULT_TIMEOUT}
+            else:
+                results[key] = {
+                    "result": RESULT_ACKED,
+                    "latency_ms": round((acked_at - sent_at[key]) * 1000, 1),
+                }
+
+        await asyncio.gather(*[_async_wait(key) for key in sent_at])
+    finally:
+        for waiter in waiters.values():
+            waiter.stop()
+
+    return {
+        "results": {key: results[key] for key in devices},
+        "wall_time_ms": round((time.monotonic() - start) * 1000, 1),
+    }
@@ -0,0 +1,163 @@
+"""Local countdown of the sleep timer of Dyson fans."""
+
+from datetime import datetime, timedelta
+import logging
+import math
+from typing import Callable, Dict, List, Optional
+
+from libdyson import MessageType
+from libdyson.const import ENVIRONMENTAL_OFF
+from libdyson.dyson_device import DysonFanDevice
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .commands import get_command_queue
+
+_LOGGER = logging.getLogger(__name__)
+
+# Reported minutes are whole, so they may trail the countdown by one.
+RESYNC_TOLERANCE = 1
+
+
+def _parse_minutes(value: str) -> Optional[int]:
+    """Return the minutes of a sltm field, or None when the timer is off."""
+    if value == "OFF":
+        return None
+    return int(value)
+
+
+class DysonSleepTimer:
+    """Count down the sleep timer of a device without asking the device.
+
+    The off time is set from the sleep timer sent to the device or echoed
+    back in a state change, and corrected from the minutes left in the
+    environmental messages when they are more than RESYNC_TOLERANCE off.
+    Listeners run when the off time changes and each time the remaining
+    minutes go down, from a single timer.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: DysonFanDevice):
+        """Initialize the countdown."""
+        self._hass = hass
+        self._device = device
+        self._cancel_tick: Optional[Callable[[], None]] = None
+        self._listeners: List[Callable[[], None]] = []
+        self.off_time: Optional[datetime] = None
+
+    @property
+    def remaining(self) -> int:
+        """Return the minutes left, rounded up."""
+        return self._remaining_at(dt_util.utcnow())
+
+    def _remaining_at(self, now: datetime) -> int:
+        if self.off_time is None:
+            return 0
+        seconds = (self.off_time - now).total_seconds()
+        return max(math.ceil(seconds / 60), 0)
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the device."""
+        self._device.add_message_listener(self._on_message)
+        queue = get_command_queue(self._device)
+        if queue is not None:
+            queue.add_publish_listener(self._on_publish)
+        self._on_message(MessageType.ENVIRONMENTAL)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the device."""
+        self._device.remove_message_listener(self._on_message)
+        queue = get_command_queue(self._device)
+        if queue is not None:
+            queue.remove_publish_listener(self._on_publish)
+        self._async_cancel_tick()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Add a callback run when the countdown changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        """Remove a countdown callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _on_publish(self, fields: Dict[str, str]) -> None:
+        if "sltm" in fields:
+            self._hass.loop.call_soon_threadsafe(
+                self._async_sync, _parse_minutes(fields["sltm"]), True
+            )
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type == MessageType.STATE:
+            # Only a change echoed back, from here or the remote, is current.
+            value = (self._device._status or {}).get("sltm")
+            if not isinstance(value, list) or value[0] == value[1]:
+                return
+            minutes = _parse_minutes(value[1])
+        elif message_type == MessageType.ENVIRONMENTAL:
+            if "sltm" not in (self._device._environmental_data or {}):
+                return
+            value = self._device.sleep_timer
+            if not isinstance(value, int) or value < ENVIRONMENTAL_OFF:
+                # Still initializing or failed, nothing to go by.
+                return
+            minutes = None if value == ENVIRONMENTAL_OFF else value
+        else:
+            return
+        self._hass.loop.call_soon_threadsafe(self._async_sync, minutes, False)
+
+    @callback
+    def _async_sync(self, minutes: Optional[int], exact: bool) -> None:
+        now = dt_util.utcnow()
+        if minutes is None or minutes == 0:
+            off_time = None
+        elif (
+            exact
+            or self.off_time is None
+            or abs(self._remaining_at(now) - minutes) > RESYNC_TOLERANCE
+        ):
+            off_time = now + timedelta(minutes=minutes)
+        else:
+            return
+        if off_time == self.off_time:
+            return
+        _LOGGER.debug("Sleep timer of %s ends at %s", self._device.serial, off_time)
+        self.off_time = off_time
+        self._async_schedule_tick(now)
+        self._async_notify()
+
+    @callback
+    def _async_cancel_tick(self) -> None:
+        if self._cancel_tick is not None:
+            self._cancel_tick()
+            self._cancel_tick = None
+
+    @callback
+    def _async_schedule_tick(self, now: datetime) -> None:
+        self._async_cancel_tick()
+        remaining = self._remaining_at(now)
+        if remaining == 0:
+            return
+        # The moment the rounded up minutes drop by one.
+        self._cancel_tick = async_track_point_in_utc_time(
+            self._hass,
+            self._async_tick,
+            self.off_time - timedelta(minutes=remaining - 1),
+        )
+
+    @callback
+    def _async_tick(self, now: datetime) -> None:
+        self._cancel_tick = None
+        if self._remaining_at(now) == 0:
+            self.off_time = None
+        else:
+            self._async_schedule_tick(now)
+        self._async_notify()
+
+    @callback
+    def _async_notify(self) -> None:
+        for listener in list(self._listeners):
+            listener()
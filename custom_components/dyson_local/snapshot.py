@@ -0,0 +1,43 @@
+"""Stored snapshots of the settings of Dyson devices."""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.snapshots"
+STORAGE_VERSION = 1
+
+
+class DysonSnapshotStore:
+    """Named snapshots of device settings, keyed by serial."""
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the store."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._snapshots: Optional[Dict[str, Dict[str, dict]]] = None
+        self._lock = asyncio.Lock()
+
+    async def _async_load(self) -> Dict[str, Dict[str, dict]]:
+        if self._snapshots is None:
+            self._snapshots = await self._store.async_load() or {}
+        return self._snapshots
+
+    async def async_get(self, name: str) -> Optional[Dict[str, dict]]:
+        """Return the settings of each device in a snapshot."""
+        async with self._lock:
+            return (await self._async_load()).get(name)
+
+    async def async_save(self, name: str, settings: Dict[str, dict]) -> None:
+        """Store a snapshot, replacing any with the same name."""
+        async with self._lock:
+            snapshots = await self._async_load()
+            snapshots[name] = settings
+            await self._store.async_save(snapshots)
+        _LOGGER.debug("Saved snapshot %s of %d devices", name, len(settings))
@@ -0,0 +1,260 @@
+"""Rolling-window statistics of the environmental readings of Dyson fans."""
+
+from collections import deque
+from heapq import heapify, heappop, heappush
+import math
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+from libdyson import MessageType
+from libdyson.dyson_device import DysonFanDevice
+
+from homeassistant.core import callback
+
+# Metrics followed, with the device property each one is read from.
+METRICS = {
+    "pm25": "particulate_matter_2_5",
+    "pm10": "particulate_matter_10",
+    "voc": "volatile_organic_compounds",
+    "no2": "nitrogen_dioxide",
+    "hcho": "formaldehyde",
+}
+
+# Window lengths in seconds, by the suffix of their attributes.
+WINDOWS = {
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+    "24h": 24 * 60 * 60,
+}
+
+PERCENTILE = 95
+
+_Sample = Tuple[float, float]
+
+
+def _prune(heap: List[float], removed: Dict[float, int], sign: int) -> None:
+    """Pop the removed readings off the top of a heap."""
+    while heap and removed.get(sign * heap[0]):
+        removed[sign * heap[0]] -= 1
+        heappop(heap)
+
+
+def _compact(heap: List[float], removed: Dict[float, int], sign: int) -> List[float]:
+    """Return a heap without its removed readings."""
+    kept = []
+    for item in heap:
+        if removed.get(sign * item):
+            removed[sign * item] -= 1
+        else:
+            kept.append(item)
+    removed.clear()
+    heapify(kept)
+    return kept
+
+
+class RollingPercentile:
+    """A percentile of readings that come and go, in logarithmic time.
+
+    The readings up to the percentile are kept in a max-heap, as negated
+    values, and the rest in a min-heap, so the percentile is the top of the
+    first. A removed reading is only counted, and dropped once it reaches the
+    top of its heap; the heaps are compacted when most of them is removed.
+    """
+
+    def __init__(self, percent: float):
+        """Initialize the percentile."""
+        self._percent = percent
+        self._low: List[float] = []
+        self._high: List[float] = []
+        self._low_removed: Dict[float, int] = {}
+        self._high_removed: Dict[float, int] = {}
+        self._low_size = 0
+        self._high_size = 0
+
+    @property
+    def value(self) -> Optional[float]:
+        """Return the reading below which the percent of them fall."""
+        return -self._low[0] if self._low_size else None
+
+    def add(self, value: float) -> None:
+        """Add a reading."""
+        if self._low_size and value <= -self._low[0]:
+            heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heappush(self._high, value)
+            self._high_size += 1
+        self._balance()
+
+    def remove(self, value: float) -> None:
+        """Remove a reading added before."""
+        # A reading up to the top of the max-heap has a copy in it.
+        if value <= -self._low[0]:
+            self._low_removed[value] = self._low_removed.get(value, 0) + 1
+            self._low_size -= 1
+        else:
+            self._high_removed[value] = self._high_removed.get(value, 0) + 1
+            self._high_size -= 1
+        if len(self._low) + len(self._high) > 2 * (self._low_size + self._high_size):
+            self._low = _compact(self._low, self._low_removed, -1)
+            self._high = _compact(self._high, self._high_removed, 1)
+        self._balance()
+
+    def _balance(self) -> None:
+        _prune(self._low, self._low_removed, -1)
+        _prune(self._high, self._high_removed, 1)
+        count = self._low_size + self._high_size
+        rank = max(math.ceil(self._percent / 100 * count), 1) if count else 0
+        while self._low_size > rank:
+            heappush(self._high, -heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            _prune(self._low, self._low_removed, -1)
+        while self._low_size < rank:
+            heappush(self._low, -heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+            _prune(self._high, self._high_removed, 1)
+
+
+class RollingWindow:
+    """Mean, minimum, maximum and a percentile of the last readings.
+
+    Samples older than the duration drop out as new ones come in or the
+    window is read. The sum is kept running for the mean, and monotonic
+    queues give the minimum and maximum, all in amortized constant time.
+    The percentile is kept by a RollingPercentile.
+    """
+
+    def __init__(self, duration: float, percent: float = PERCENTILE):
+        """Initialize the window."""
+        self._duration = duration
+        self._samples: Deque[_Sample] = deque()
+        self._min: Deque[_Sample] = deque()
+        self._max: Deque[_Sample] = deque()
+        self._percentile = RollingPercentile(percent)
+        self._sum = 0.0
+
+    def add(self, now: float, value: float) -> None:
+        """Add a reading taken at a monotonic time."""
+        self.evict(now)
+        sample = (now, value)
+        self._samples.append(sample)
+        self._sum += value
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append(sample)
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append(sample)
+        self._percentile.add(value)
+
+    def evict(self, now: float) -> None:
+        """Drop the readings that are out of the window at a time."""
+        start = now - self._duration
+        while self._samples and self._samples[0][0] <= start:
+            sample = self._samples.popleft()
+            self._sum -= sample[1]
+            if self._min[0] is sample:
+                self._min.popleft()
+            if self._max[0] is sample:
+                self._max.popleft()
+            self._percentile.remove(sample[1])
+        if not self._samples:
+            # Start over to shed the rounding errors of the running sum.
+            self._sum = 0.0
+
+    @property
+    def count(self) -> int:
+        """Return the number of readings in the window."""
+        return len(self._samples)
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Return the mean reading."""
+        if not self._samples:
+            return None
+        return self._sum / len(self._samples)
+
+    @property
+    def minimum(self) -> Optional[float]:
+        """Return the lowest reading."""
+        return self._min[0][1] if self._min else None
+
+    @property
+    def maximum(self) -> Optional[float]:
+        """Return the highest reading."""
+        return self._max[0][1] if self._max else None
+
+    @property
+    def percentile(self) -> Optional[float]:
+        """Return the reading below which the window's percent of them fall."""
+        return self._percentile.value
+
+
+class DysonStatistics:
+    """Rolling windows of the environmental readings of a device.
+
+    Every environmental message adds the readings of each metric the
+    device has to all of its windows. Readings while a sensor is off,
+    initializing or failed are left out.
+    """
+
+    def __init__(self, device: DysonFanDevice):
+        """Initialize the statistics."""
+        self._device = device
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Dict[str, RollingWindow]] = {
+            metric: {
+                window: RollingWindow(duration) for window, duration in WINDOWS.items()
+            }
+            for metric, attribute in METRICS.items()
+            # On the class, as the properties fail before the first reading.
+            if hasattr(type(device), attribute)
+        }
+
+    @property
+    def metrics(self) -> List[str]:
+        """Return the metrics the device has."""
+        return list(self._windows)
+
+    @callback
+    def async_start(self) -> None:
+        """Start following the environmental readings."""
+        self._device.add_message_listener(self._on_message)
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the environmental readings."""
+        self._device.remove_message_listener(self._on_message)
+
+    def as_dict(self, metric: str) -> dict:
+        """Return the aggregates of a metric over every window."""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for window, rolling in self._windows.get(metric, {}).items():
+                rolling.evict(now)
+                mean = rolling.mean
+                result.update(
+                    {
+                        f"mean_{window}": None if mean is None else round(mean, 1),
+                        f"min_{window}": rolling.minimum,
+                        f"max_{window}": rolling.maximum,
+                        f"p{PERCENTILE}_{window}": rolling.percentile,
+                    }
+                )
+        return result
+
+    def _on_message(self, message_type: MessageType) -> None:
+        if message_type != MessageType.ENVIRONMENTAL:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for metric, windows in self._windows.items():
+                value = getattr(self._device, METRICS[metric])
+                if not isinstance(value, (int, float)) or value < 0:
+                    continue
+                for rolling in windows.values():
+                    rolling.add(now, value)
@@ -54,11 +54,11 @@ class DysonNightModeSwitchEntity(DysonEntity, SwitchEntity):
         """Return if night mode is on."""
         return self._device.night_mode
 
-    def turn_on(self):
+    async def async_turn_on(self):
         """Turn on night mode."""
         return self._device.enable_night_mode()
 
-    def turn_off(self):
+    async def async_turn_off(self):
         """Turn off night mode."""
         return self._device.disable_night_mode()
 
@@ -88,11 +88,11 @@ class DysonContinuousMonitoringSwitchEntity(DysonEntity, SwitchEntity):
         """Return if continuous monitoring is on."""
         return self._device.continuous_monitoring
 
-    def turn_on(self):
+    async def async_turn_on(self):
         """Turn on continuous monitoring."""
         return self._device.enable_continuous_monitoring()
 
-    def turn_off(self):
+    async def async_turn_off(self):
         """Turn off continuous monitoring."""
         return self._device.disable_continuous_monitoring()
 
@@ -118,10 +118,10 @@ class DysonFocusModeSwitchEntity(DysonEntity, SwitchEntity):
         """Return if switch is on."""
         return self._device.focus_mode
 
-    def turn_on(self):
+    async def async_turn_on(self):
         """Turn on switch."""
         return self._device.enable_focus_mode()
 
-    def turn_off(self):
+    async def async_turn_off(self):
         """Turn off switch."""
         return self._device.disable_focus_mode()
@@ -1,5 +1,6 @@
 """Utilities for Dyson Local."""
 
+from datetime import datetime, timedelta
 from typing import Any, Optional
 
 from libdyson.const import ENVIRONMENTAL_FAIL, ENVIRONMENTAL_INIT, ENVIRONMENTAL_OFF
@@ -9,6 +10,8 @@ from homeassistant.const import STATE_OFF
 STATE_INIT = "init"
 STATE_FAIL = "fail"
 
+DEFAULT_HEARTBEAT = timedelta(minutes=15)
+
 
 class environmental_property(property):
     """Environmental status property."""
@@ -23,3 +26,50 @@ class environmental_property(property):
         elif value == ENVIRONMENTAL_FAIL:
             return STATE_FAIL
         return value
+
+
+class DeadbandFilter:
+    """Tell which readings are worth writing to the state machine.
+
+    A reading is written when it moves more than the absolute deadband, or
+    the relative one in percent of the last written reading if that is
+    larger, away from the last written reading. Anything that is not a
+    number is written when it changes. The heartbeat writes a reading
+    however close it is once that long has passed since the last write.
+    """
+
+    def __init__(
+        self,
+        absolute: float = 0,
+        relative: float = 0,
+        heartbeat: timedelta = DEFAULT_HEARTBEAT,
+    ):
+        """Initialize the filter."""
+        self._absolute = absolute
+        self._relative = relative
+        self._heartbeat = heartbeat
+        self._value: Any = None
+        self._written_at: Optional[datetime] = None
+
+    def should_write(self, value: Any, now: datetime) -> bool:
+        """Return whether to write a reading, remembering it if so."""
+        if (
+            self._written_at is not None
+            and now - self._written_at < self._heartbeat
+            and self._is_close(value)
+        ):
+            return False
+        self._value = value
+        self._written_at = now
+        return True
+
+    def _is_close(self, value: Any) -> bool:
+        last = self._value
+        if not _is_number(value) or not _is_number(last):
+            return value == last
+        threshold = max(self._absolute, abs(last) * self._relative / 100)
+        return abs(value - last) <= threshold
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -179,11 +179,11 @@ class DysonVacuumEntity(DysonEntity, StateVacuumEntity):
             ATTR_STATUS: self.status,
         }
 
-    def pause(self) -> None:
+    async def async_pause(self) -> None:
         """Pause the device."""
         self._device.pause()
 
-    def return_to_base(self, **kwargs) -> None:
+    async def async_return_to_base(self, **kwargs) -> None:
         """Return the device to base."""
         self._device.abort()
 
@@ -201,14 +201,14 @@ class Dyson360EyeEntity(DysonVacuumEntity):
         """Get the list of available fan speed steps of the vacuum cleaner."""
         return list(EYE_POWER_MODE_STR_TO_ENUM.keys())
 
-    def start(self) -> None:
+    async def async_start(self) -> None:
         """Start the device."""
         if self.state == STATE_PAUSED:
             self._device.resume()
         else:
             self._device.start()
 
-    def set_fan_speed(self, fan_speed: str, **kwargs) -> None:
+    async def async_set_fan_speed(self, fan_speed: str, **kwargs) -> None:
         """Set fan speed."""
         self._device.set_power_mode(EYE_POWER_MODE_STR_TO_ENUM[fan_speed])
 
@@ -226,13 +226,13 @@ class Dyson360HeuristEntity(DysonVacuumEntity):
         """Get the list of available fan speed steps of the vacuum cleaner."""
         return list(HEURIST_POWER_MODE_STR_TO_ENUM.keys())
 
-    def start(self) -> None:
+    async def async_start(self) -> None:
         """Start the device."""
         if self.state == STATE_PAUSED:
             self._device.resume()
         else:
             self._device.start_all_zones()
 
-    def set_fan_speed(self, fan_speed: str, **kwargs) -> None:
+    async def async_set_fan_speed(self, fan_speed: str, **kwargs) -> None:
         """Set fan speed."""
         self._device.set_default_power_mode(HEURIST_POWER_MODE_STR_TO_ENUM[fan_speed])
@@ -0,0 +1,87 @@
+"""Benchmark the number of fan commands per second a device can be sent.
+
+Commands go through the fan entity to a libdyson device whose MQTT client
+drops every message, so the numbers measure the integration and the event
+loop rather than the network. Each command is awaited before the next one,
+like a series of service calls. The executor run reproduces the thread pool
+round trip Home Assistant makes for sync entity methods.
+
+Usage: python script/benchmark_commands.py [--commands N] [--devices N]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool  # noqa: E402
+
+from custom_components.dyson_local.commands import DysonCommandBatch  # noqa: E402
+from custom_components.dyson_local.fan import DysonPureCoolEntity  # noqa: E402
+
+PERCENTAGES = [10, 40, 70, 100]
+
+
+class _NullClient:
+    """MQTT client that drops every message."""
+
+    def publish(self, topic, payload, qos=0):
+        """Drop a message."""
+
+
+def _make_entity(index):
+    device = DysonPureCool(f"JH1-US-BNC{index:04d}A", "password", DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = _NullClient()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "fnsp": "0001", "auto": "OFF"}
+    return DysonPureCoolEntity(device, f"Device {index}")
+
+
+def _set_percentage(entity, percentage):
+    """Send the same message as async_set_percentage, from a worker thread."""
+    with DysonCommandBatch(entity._device):
+        entity._device.set_speed(max(percentage // 10, 1))
+        entity._device.disable_auto_mode()
+
+
+async def _async_drive(entity, commands, executor):
+    loop = asyncio.get_running_loop()
+    for index in range(commands):
+        percentage = PERCENTAGES[index % len(PERCENTAGES)]
+        if executor:
+            await loop.run_in_executor(None, _set_percentage, entity, percentage)
+        else:
+            await entity.async_set_percentage(percentage)
+
+
+async def _async_benchmark(label, devices, commands, executor):
+    entities = [_make_entity(index) for index in range(devices)]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[_async_drive(entity, commands, executor) for entity in entities]
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<12} {commands / elapsed:10.0f} commands/s per device  "
+        f"{commands * devices / elapsed:10.0f} commands/s total  "
+        f"{elapsed / commands * 1e6:8.1f} us per command"
+    )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=1)
+    args = parser.parse_args()
+
+    asyncio.run(_async_benchmark("executor", args.devices, args.commands, True))
+    asyncio.run(_async_benchmark("event loop", args.devices, args.commands, False))
+
+
+if __name__ == "__main__":
+    main()
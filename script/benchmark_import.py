@@ -0,0 +1,97 @@
+"""Benchmark the import time of the Dyson Local integration.
+
+Every run imports the integration in a fresh interpreter, so the numbers
+include libdyson and the Home Assistant modules pulled in at load time.
+
+Usage: python script/benchmark_import.py [--runs N] [--platforms]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLATFORMS = [
+    "binary_sensor",
+    "climate",
+    "fan",
+    "humidifier",
+    "select",
+    "sensor",
+    "switch",
+    "vacuum",
+]
+
+# Modules that should only be loaded when a device needs discovery.
+DEFERRED_MODULES = [
+    "custom_components.dyson_local.discovery",
+    "homeassistant.components.zeroconf",
+]
+
+RUNNER = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def _run_once(modules):
+    output = subprocess.run(
+        [sys.executable, "-c", RUNNER % DEFERRED_MODULES, *modules],
+        check=True,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def _benchmark(label, modules, runs):
+    results = [_run_once(modules) for _ in range(runs)]
+    timings = sorted(result["elapsed"] * 1000 for result in results)
+    print(
+        f"{label:<40} median {statistics.median(timings):8.1f} ms  "
+        f"min {timings[0]:8.1f} ms  max {timings[-1]:8.1f} ms"
+    )
+    loaded = results[-1]["loaded"]
+    if loaded:
+        print(f"{'':<40} deferred modules loaded: {', '.join(loaded)}")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--platforms", action="store_true", help="also benchmark each platform"
+    )
+    args = parser.parse_args()
+
+    _benchmark("libdyson", ["libdyson"], args.runs)
+    _benchmark(
+        "custom_components.dyson_local", ["custom_components.dyson_local"], args.runs
+    )
+    if args.platforms:
+        for platform in PLATFORMS:
+            _benchmark(
+                f"  + {platform}",
+                [f"custom_components.dyson_local.{platform}"],
+                args.runs,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
 """Tests for Dyson Local."""
 
-from typing import Type
-from unittest.mock import MagicMock
+from typing import Optional, Type
+from unittest.mock import MagicMock, patch
 
 from libdyson.const import MessageType
 from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonException
 
+from custom_components.dyson_local.const import (
+    CONF_CREDENTIAL,
+    CONF_DEVICE_TYPE,
+    CONF_SERIAL,
+    DOMAIN,
+)
+from homeassistant.config_entries import ConfigEntry, ConfigEntryState
+from homeassistant.const import CONF_HOST, CONF_NAME
 from homeassistant.core import HomeAssistant, callback
 
+from tests.common import MockConfigEntry
+
 HOST = "192.168.1.10"
 SERIAL = "JH1-US-HBB1111A"
 CREDENTIAL = "aoWJM1kpL79MN2dPMlL5ysQv/APG+HAv+x3HDk0yuT3gMfgA3mLuil4O3d+q6CcyU+D1Hoir38soKoZHshYFeQ=="
@@ -24,6 +35,79 @@ def get_base_device(spec: Type[DysonDevice], device_type: str) -> DysonDevice:
     return device
 
 
+def get_connected_device(
+    spec: Type[DysonDevice], device_type: str, status: dict, environmental: dict
+) -> DysonDevice:
+    """Get libdyson device with a mocked connection and its first messages."""
+    device = spec(SERIAL, CREDENTIAL, device_type)
+    device.connect = MagicMock()
+    device.disconnect = MagicMock()
+    device.request_environmental_data = MagicMock()
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._handle_message({"msg": "CURRENT-STATE", "product-state": status})
+    device._handle_message(
+        {"msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA", "data": environmental}
+    )
+    return device
+
+
+def _add_entry(
+    hass: HomeAssistant, device: DysonDevice, options: Optional[dict]
+) -> ConfigEntry:
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_SERIAL: SERIAL,
+            CONF_CREDENTIAL: CREDENTIAL,
+            CONF_HOST: HOST,
+            CONF_DEVICE_TYPE: device.device_type,
+            CONF_NAME: NAME,
+        },
+        options=options or {},
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+async def setup_sensor_entry(
+    hass: HomeAssistant, device: DysonDevice, options: Optional[dict] = None
+) -> ConfigEntry:
+    """Set up another entry of a device, with only the sensor platform."""
+    entry = _add_entry(hass, device, options)
+    with patch(f"{MODULE}.get_device", return_value=device), patch(
+        f"{MODULE}._async_get_platforms", return_value=["sensor"]
+    ):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+    return entry
+
+
+async def setup_unready_entry(
+    hass: HomeAssistant, device: DysonDevice, options: Optional[dict] = None
+) -> ConfigEntry:
+    """Set up an entry whose device fails to connect, leaving it to retry."""
+    device.connect.side_effect = DysonException
+    entry = _add_entry(hass, device, options)
+    with patch(f"{MODULE}.get_device", return_value=device):
+        assert not await hass.config_entries.async_setup(entry.entry_id)
+    assert entry.state is ConfigEntryState.SETUP_RETRY
+    return entry
+
+
+def get_listeners(device: DysonDevice, owner: type) -> list:
+    """Return the message listeners of a class still added to a mocked device."""
+    listeners = [call[0][0] for call in device.add_message_listener.call_args_list]
+    for call in device.remove_message_listener.call_args_list:
+        if call[0][0] in listeners:
+            listeners.remove(call[0][0])
+    return [
+        listener
+        for listener in listeners
+        if isinstance(getattr(listener, "__self__", None), owner)
+    ]
+
+
 async def update_device(
     hass: HomeAssistant, device: DysonDevice, message_type: MessageType
 ) -> None:
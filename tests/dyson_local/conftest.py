@@ -20,8 +20,10 @@ from tests.common import MockConfigEntry
 
 
 @pytest.fixture(autouse=True)
-async def setup_entry(hass: HomeAssistant, device: DysonDevice):
+async def setup_entry(hass: HomeAssistant, device: DysonDevice, tmp_path):
     """Set up mocked config entry."""
+    # Keep the files written by the integration out of the tree.
+    hass.config.config_dir = str(tmp_path)
     with patch(f"{MODULE}.get_device", return_value=device):
         config_entry = MockConfigEntry(
             domain=DOMAIN,
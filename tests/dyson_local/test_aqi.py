@@ -0,0 +1,127 @@
+"""Tests for the Dyson Local air quality index."""
+
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.aqi import (
+    POLLUTANT_HCHO,
+    POLLUTANT_NO2,
+    POLLUTANT_PM10,
+    POLLUTANT_PM25,
+    air_quality,
+    sub_index,
+)
+from homeassistant.const import STATE_UNKNOWN
+from homeassistant.core import HomeAssistant
+
+from . import (
+    MODULE,
+    NAME,
+    get_base_device,
+    get_connected_device,
+    setup_sensor_entry,
+)
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.mark.parametrize(
+    "pollutant,reading,index",
+    [
+        (POLLUTANT_PM25, 0, 0),
+        (POLLUTANT_PM25, 12.0, 50),
+        (POLLUTANT_PM25, 12.04, 50),
+        (POLLUTANT_PM25, 12.1, 51),
+        (POLLUTANT_PM25, 35.9, 102),
+        (POLLUTANT_PM25, 1000, 500),
+        (POLLUTANT_PM10, 54, 50),
+        (POLLUTANT_PM10, 155, 101),
+        (POLLUTANT_NO2, 45, 75),
+        (POLLUTANT_HCHO, 100, 100),
+    ],
+)
+def test_sub_index(pollutant: str, reading: float, index: int):
+    """Test the index of a single reading."""
+    assert sub_index(pollutant, reading) == index
+
+
+def test_air_quality():
+    """Test the worst pollutant sets the index."""
+    result = air_quality({POLLUTANT_PM25: 10, POLLUTANT_PM10: 160, POLLUTANT_NO2: -1})
+    assert result.index == 103
+    assert result.dominant_pollutant == POLLUTANT_PM10
+    assert result.sub_indices == {POLLUTANT_PM25: 42, POLLUTANT_PM10: 103}
+
+    assert air_quality({POLLUTANT_PM25: -2, POLLUTANT_NO2: None}).index is None
+
+
+def _environment(pm25: str, pm10: str, no2: str) -> dict:
+    return {
+        "hact": "0050",
+        "tact": "2950",
+        "va10": "0003",
+        "pm25": pm25,
+        "pm10": pm10,
+        "noxl": no2,
+        "sltm": "OFF",
+    }
+
+
+def _update(device: DysonPureCool, pm25: str, pm10: str, no2: str) -> None:
+    device._handle_message(
+        {
+            "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+            "data": _environment(pm25, pm10, no2),
+        }
+    )
+
+
+async def test_air_quality_sensor(hass: HomeAssistant):
+    """Test the index is worked out again on each environmental reading."""
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        {"fpwr": "ON", "hflr": "0100", "cflr": "INV", "sltm": "OFF"},
+        _environment("0010", "0160", "OFF"),
+    )
+    await setup_sensor_entry(hass, device)
+    entity_id = f"sensor.{NAME}_air_quality_index"
+    state = hass.states.get(entity_id)
+    assert state.state == "103"
+    assert state.attributes["dominant_pollutant"] == POLLUTANT_PM10
+    assert state.attributes[f"{POLLUTANT_PM25}_index"] == 42
+    assert state.attributes[f"{POLLUTANT_PM10}_index"] == 103
+    assert f"{POLLUTANT_NO2}_index" not in state.attributes
+
+    _update(device, "0012", "0054", "0045")
+    await hass.async_block_till_done()
+    state = hass.states.get(entity_id)
+    assert state.state == "75"
+    assert state.attributes["dominant_pollutant"] == POLLUTANT_NO2
+    assert state.attributes[f"{POLLUTANT_NO2}_index"] == 75
+
+    # State messages leave the index as it is.
+    device._environmental_data["pm10"] = "0500"
+    device._handle_message(
+        {
+            "msg": "CURRENT-STATE",
+            "product-state": {"fpwr": "OFF", "hflr": "0100", "cflr": "INV"},
+        }
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get(entity_id).state == "75"
+
+    _update(device, "OFF", "OFF", "OFF")
+    await hass.async_block_till_done()
+    state = hass.states.get(entity_id)
+    assert state.state == STATE_UNKNOWN
+    assert state.attributes["dominant_pollutant"] is None
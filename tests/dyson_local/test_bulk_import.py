@@ -0,0 +1,139 @@
+"""Tests for Dyson Local bulk import."""
+
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from libdyson import (
+    DEVICE_TYPE_PURE_COOL,
+    DEVICE_TYPE_PURE_COOL_LINK,
+    DysonPureCool,
+    DysonPureCoolLink,
+)
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonInvalidCredential
+import pytest
+
+from custom_components.dyson_local.bulk_import import NOTIFICATION_ID
+from custom_components.dyson_local.const import (
+    DATA_DEVICES,
+    DATA_PROBES,
+    DOMAIN,
+    SOURCE_BULK_IMPORT,
+)
+from custom_components.dyson_local.services import SERVICE_IMPORT_DEVICES
+from homeassistant.core import HomeAssistant
+
+from . import CREDENTIAL, HOST, MODULE, SERIAL, get_base_device
+
+BAD_SERIAL = "JH1-US-HBB3333A"
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def new_devices() -> dict:
+    """Patch device creation used while validating imported devices."""
+    devices = {}
+
+    def _get_device(serial: str, credential: str, device_type: str) -> DysonDevice:
+        spec = (
+            DysonPureCoolLink
+            if device_type == DEVICE_TYPE_PURE_COOL_LINK
+            else DysonPureCool
+        )
+        device = get_base_device(spec, device_type)
+        device.serial = serial
+        device.is_connected = True
+        if serial == BAD_SERIAL:
+            device.connect.side_effect = DysonInvalidCredential
+        devices[serial] = device
+        return device
+
+    with patch(f"{MODULE}.config_flow.get_device", side_effect=_get_device):
+        yield devices
+
+
+async def _async_import(hass: HomeAssistant, path: Path) -> None:
+    hass.config.allowlist_external_dirs = {str(path.parent)}
+    await hass.services.async_call(
+        DOMAIN, SERVICE_IMPORT_DEVICES, {"file": str(path)}, blocking=True
+    )
+    await hass.async_block_till_done()
+
+
+async def test_import_csv(hass: HomeAssistant, new_devices: dict, tmp_path: Path):
+    """Test importing devices from a CSV file."""
+    path = tmp_path / "devices.csv"
+    path.write_text(
+        "serial,credential,device_type,host,name\n"
+        f"JH1-US-HBB2222A,{CREDENTIAL},{DEVICE_TYPE_PURE_COOL_LINK},{HOST},Bedroom\n"
+        f"{BAD_SERIAL},{CREDENTIAL},{DEVICE_TYPE_PURE_COOL},{HOST},\n"
+        f"{SERIAL},{CREDENTIAL},{DEVICE_TYPE_PURE_COOL},{HOST},\n"
+        f"JH1-US-HBB4444A,{CREDENTIAL},999,{HOST},\n"
+    )
+    await _async_import(hass, path)
+
+    entries = {
+        entry.data["serial"]: entry
+        for entry in hass.config_entries.async_entries(DOMAIN)
+    }
+    assert set(entries) == {SERIAL, "JH1-US-HBB2222A"}
+    entry = entries["JH1-US-HBB2222A"]
+    assert entry.title == "Bedroom"
+    assert entry.source == SOURCE_BULK_IMPORT
+    assert (
+        hass.data[DOMAIN][DATA_DEVICES][entry.entry_id]
+        is new_devices["JH1-US-HBB2222A"]
+    )
+    assert hass.data[DOMAIN][DATA_PROBES] == {}
+    new_devices["JH1-US-HBB2222A"].connect.assert_called_once_with(HOST)
+    assert "JH1-US-HBB4444A" not in new_devices
+
+    message = hass.states.get(f"persistent_notification.{NOTIFICATION_ID}").attributes[
+        "message"
+    ]
+    assert "Imported 1 of 4 devices" in message
+    assert f"| {BAD_SERIAL} | invalid_auth |" in message
+    assert f"| {SERIAL} | already_configured |" in message
+    assert "| JH1-US-HBB4444A | invalid_device_type |" in message
+
+
+async def test_import_json(hass: HomeAssistant, new_devices: dict, tmp_path: Path):
+    """Test importing devices from a JSON file."""
+    path = tmp_path / "devices.json"
+    devices = [
+        {
+            "serial": f"JH1-US-HBB{index:04d}A",
+            "credential": CREDENTIAL,
+            "device_type": DEVICE_TYPE_PURE_COOL,
+            "host": f"192.168.1.{index}",
+        }
+        for index in range(20, 30)
+    ]
+    devices.append(dict(devices[0]))
+    path.write_text(json.dumps(devices))
+    await _async_import(hass, path)
+
+    assert len(hass.config_entries.async_entries(DOMAIN)) == 11
+    message = hass.states.get(f"persistent_notification.{NOTIFICATION_ID}").attributes[
+        "message"
+    ]
+    assert "Imported 10 of 11 devices" in message
+    assert "| JH1-US-HBB0020A | duplicate |" in message
+
+
+async def test_import_not_allowed(hass: HomeAssistant, tmp_path: Path):
+    """Test files outside the allowlist are rejected."""
+    path = tmp_path / "devices.json"
+    path.write_text("[]")
+    with pytest.raises(Exception):
+        await hass.services.async_call(
+            DOMAIN, SERVICE_IMPORT_DEVICES, {"file": str(path)}, blocking=True
+        )
@@ -0,0 +1,199 @@
+"""Tests for Dyson Local command batching."""
+
+from datetime import timedelta
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonNotConnected
+import pytest
+
+from custom_components.dyson_local.commands import (
+    DysonCommandBatch,
+    get_command_queue,
+    install_command_queue,
+)
+from custom_components.dyson_local.const import (
+    CONF_OPTIMISTIC,
+    DATA_LATENCY,
+    DATA_OPTIMISTIC,
+    DOMAIN,
+)
+from custom_components.dyson_local.fan import PRESET_MODE_AUTO, DysonPureCoolEntity
+from custom_components.dyson_local.latency import DysonLatencyTracker
+from custom_components.dyson_local.optimistic import DysonOptimisticState
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    NAME,
+    SERIAL,
+    get_base_device,
+    get_listeners,
+    setup_unready_entry,
+)
+
+from tests.common import async_fire_time_changed
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def connected_device() -> DysonPureCool:
+    """Return a libdyson device with a mocked MQTT client."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    return device
+
+
+def _published(device: DysonPureCool) -> list:
+    return [
+        json.loads(call[0][1])["data"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+async def test_fan_turn_on_single_message(connected_device: DysonPureCool):
+    """Test turn_on sends a single STATE-SET."""
+    entity = DysonPureCoolEntity(connected_device, NAME)
+    await entity.async_turn_on(percentage=50)
+    assert _published(connected_device) == [
+        {"fpwr": "ON", "fnsp": "0005", "auto": "OFF"}
+    ]
+
+    connected_device._mqtt_client.publish.reset_mock()
+    await entity.async_turn_on(preset_mode=PRESET_MODE_AUTO)
+    assert _published(connected_device) == [{"auto": "ON", "fpwr": "ON"}]
+
+
+def test_batch_last_write_wins(connected_device: DysonPureCool):
+    """Test later fields replace earlier ones and nested batches merge."""
+    with DysonCommandBatch(connected_device) as batch:
+        connected_device.enable_auto_mode()
+        with DysonCommandBatch(connected_device):
+            connected_device.set_speed(3)
+        connected_device.disable_auto_mode()
+        assert batch.data == {"auto": "OFF", "fpwr": "ON", "fnsp": "0003"}
+        connected_device._mqtt_client.publish.assert_not_called()
+    assert _published(connected_device) == [
+        {"auto": "OFF", "fpwr": "ON", "fnsp": "0003"}
+    ]
+
+    # Commands outside a batch are sent right away.
+    connected_device._mqtt_client.publish.reset_mock()
+    connected_device.turn_off()
+    assert _published(connected_device) == [{"fpwr": "OFF"}]
+
+
+def test_batch_discarded_on_error(connected_device: DysonPureCool):
+    """Test nothing is sent if the batch raises."""
+    with pytest.raises(ValueError):
+        with DysonCommandBatch(connected_device):
+            connected_device.turn_on()
+            connected_device.set_speed(11)
+    connected_device._mqtt_client.publish.assert_not_called()
+
+    connected_device._connected.clear()
+    with pytest.raises(DysonNotConnected):
+        with DysonCommandBatch(connected_device):
+            connected_device.turn_on()
+
+
+def test_batch_is_per_thread(connected_device: DysonPureCool):
+    """Test commands from other threads are not pulled into a batch."""
+    with DysonCommandBatch(connected_device):
+        connected_device.turn_on()
+        thread = threading.Thread(target=connected_device.enable_night_mode)
+        thread.start()
+        thread.join()
+        assert _published(connected_device) == [{"nmod": "ON"}]
+    assert _published(connected_device) == [{"nmod": "ON"}, {"fpwr": "ON"}]
+
+
+async def test_queue_coalesces_burst(
+    hass: HomeAssistant, connected_device: DysonPureCool
+):
+    """Test a burst of commands is sent as the first and the merged rest."""
+    queue = install_command_queue(hass, connected_device)
+    assert get_command_queue(connected_device) is queue
+
+    def _drag():
+        for speed in range(1, 6):
+            connected_device.set_speed(speed)
+        connected_device.enable_night_mode()
+
+    await hass.async_add_executor_job(_drag)
+    assert _published(connected_device) == [{"fpwr": "ON", "fnsp": "0001"}]
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=1))
+    await hass.async_block_till_done()
+    assert _published(connected_device) == [
+        {"fpwr": "ON", "fnsp": "0001"},
+        {"fpwr": "ON", "fnsp": "0005", "nmod": "ON"},
+    ]
+    assert (queue.commands, queue.published, queue.merged) == (6, 2, 4)
+
+
+async def test_queue_stopped(hass: HomeAssistant, connected_device: DysonPureCool):
+    """Test a stopped queue sets no flush timer for late commands."""
+    queue = install_command_queue(hass, connected_device)
+    connected_device.turn_on()
+    queue.async_stop()
+    await hass.async_add_executor_job(connected_device.set_speed, 5)
+    await hass.async_block_till_done()
+    assert queue._cancel_flush is None
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=1))
+    await hass.async_block_till_done()
+    assert _published(connected_device) == [{"fpwr": "ON"}]
+
+    # Left for the flush on unload.
+    queue.flush()
+    assert _published(connected_device)[-1] == {"fpwr": "ON", "fnsp": "0005"}
+
+    # Installing again starts the timer again.
+    assert install_command_queue(hass, connected_device) is queue
+    await hass.async_add_executor_job(connected_device.set_speed, 6)
+    await hass.async_block_till_done()
+    assert queue._cancel_flush is not None
+    queue.async_stop()
+
+
+async def test_queue_with_batch(hass: HomeAssistant, connected_device: DysonPureCool):
+    """Test a batch is queued as a single command."""
+    queue = install_command_queue(hass, connected_device)
+    entity = DysonPureCoolEntity(connected_device, NAME)
+    await entity.async_turn_on(50)
+    await entity.async_turn_off()
+    queue.flush()
+    assert _published(connected_device) == [
+        {"fpwr": "ON", "fnsp": "0005", "auto": "OFF"},
+        {"fpwr": "OFF"},
+    ]
+    assert (queue.commands, queue.merged) == (2, 0)
+
+    connected_device._connected.clear()
+    with pytest.raises(DysonNotConnected):
+        connected_device.turn_on()
+
+
+async def test_setup_retry_stops_queue(hass: HomeAssistant):
+    """Test a retried setup leaves no command listeners behind."""
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        entry = await setup_unready_entry(hass, new_device, {CONF_OPTIMISTIC: True})
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_LATENCY]
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_OPTIMISTIC]
+    assert get_listeners(new_device, DysonLatencyTracker) == []
+    assert get_listeners(new_device, DysonOptimisticState) == []
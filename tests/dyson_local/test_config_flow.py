@@ -0,0 +1,113 @@
+"""Tests for Dyson Local config flow."""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonConnectTimeout, DysonInvalidCredential
+import pytest
+
+from custom_components.dyson_local import PROBE_HANDOVER_TIMEOUT, async_store_probe
+from custom_components.dyson_local.config_flow import CONF_METHOD
+from custom_components.dyson_local.const import (
+    CONF_CREDENTIAL,
+    CONF_DEVICE_TYPE,
+    CONF_SERIAL,
+    DATA_DEVICES,
+    DATA_PROBES,
+    DOMAIN,
+)
+from homeassistant.config_entries import SOURCE_USER
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import RESULT_TYPE_CREATE_ENTRY, RESULT_TYPE_FORM
+from homeassistant.util import dt as dt_util
+
+from . import CREDENTIAL, HOST, MODULE, get_base_device
+
+from tests.common import async_fire_time_changed
+
+NEW_SERIAL = "JH1-US-HBB2222A"
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def new_device() -> DysonDevice:
+    """Return mocked device to be added by the flow."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    device.serial = NEW_SERIAL
+    device.is_connected = True
+    with patch(f"{MODULE}.config_flow.get_device", return_value=device):
+        yield device
+
+
+async def _async_start_manual_flow(hass: HomeAssistant) -> dict:
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": SOURCE_USER}
+    )
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], {CONF_METHOD: "manual"}
+    )
+    assert result["type"] == RESULT_TYPE_FORM
+    return await hass.config_entries.flow.async_configure(
+        result["flow_id"],
+        {
+            CONF_SERIAL: NEW_SERIAL,
+            CONF_CREDENTIAL: CREDENTIAL,
+            CONF_DEVICE_TYPE: DEVICE_TYPE_PURE_COOL,
+            CONF_HOST: HOST,
+        },
+    )
+
+
+async def test_manual_hands_over_session(hass: HomeAssistant, new_device: DysonDevice):
+    """Test the validated session is reused by the new entry."""
+    with patch(f"{MODULE}.get_device") as get_device:
+        result = await _async_start_manual_flow(hass)
+        await hass.async_block_till_done()
+    assert result["type"] == RESULT_TYPE_CREATE_ENTRY
+    new_device.connect.assert_called_once_with(HOST)
+    new_device.disconnect.assert_not_called()
+    get_device.assert_not_called()
+    entry_id = result["result"].entry_id
+    assert hass.data[DOMAIN][DATA_DEVICES][entry_id] is new_device
+    assert hass.data[DOMAIN][DATA_PROBES] == {}
+
+
+@pytest.mark.parametrize(
+    "error,reason",
+    [
+        (DysonInvalidCredential, "invalid_auth"),
+        (DysonConnectTimeout, "cannot_connect"),
+    ],
+)
+async def test_manual_connect_error(
+    hass: HomeAssistant, new_device: DysonDevice, error: Exception, reason: str
+):
+    """Test connection failures are reported on the form."""
+    new_device.connect.side_effect = error
+    result = await _async_start_manual_flow(hass)
+    assert result["type"] == RESULT_TYPE_FORM
+    assert result["errors"] == {"base": reason}
+    assert hass.data[DOMAIN][DATA_PROBES] == {}
+
+
+async def test_unclaimed_session_disconnected(
+    hass: HomeAssistant, new_device: DysonDevice
+):
+    """Test a session no entry takes over is closed."""
+    async_store_probe(hass, new_device)
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + timedelta(seconds=PROBE_HANDOVER_TIMEOUT + 1)
+    )
+    await hass.async_block_till_done()
+    new_device.disconnect.assert_called_once_with()
+    assert hass.data[DOMAIN][DATA_PROBES] == {}
@@ -0,0 +1,396 @@
+"""Tests for Dyson Local controllers."""
+
+from datetime import timedelta
+import json
+from unittest.mock import MagicMock, patch
+
+from libdyson import (
+    DEVICE_TYPE_PURE_COOL,
+    DEVICE_TYPE_PURE_HOT_COOL,
+    DEVICE_TYPE_PURE_HUMIDIFY_COOL,
+    DysonPureCool,
+    DysonPureHotCool,
+    DysonPureHumidifyCool,
+)
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.climate import DysonPureHotCoolEntity
+from custom_components.dyson_local.const import (
+    CONF_AIR_QUALITY_CONTROL,
+    CONF_AIR_QUALITY_HIGH,
+    CONF_AIR_QUALITY_LOW,
+    CONF_HUMIDITY_SENSOR,
+    CONTROLLER_AIR_QUALITY,
+    CONTROLLER_HUMIDITY,
+    CONTROLLER_THERMOSTAT,
+    DATA_CONTROLLERS,
+    DOMAIN,
+)
+from custom_components.dyson_local.control import (
+    ACTION_DECREASE,
+    ACTION_HOLD,
+    ACTION_HUMIDIFY,
+    ACTION_IDLE,
+    ACTION_INACTIVE,
+    ACTION_INCREASE,
+    ACTION_NO_DATA,
+    ACTION_RATE_LIMITED,
+    ACTION_WAITING,
+    DysonAirQualityController,
+    DysonControllerStore,
+    DysonHumidityController,
+    DysonThermostatController,
+)
+from custom_components.dyson_local.humidifier import DysonHumidifierEntity
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import RESULT_TYPE_CREATE_ENTRY, RESULT_TYPE_FORM
+from homeassistant.helpers.event import TRACK_STATE_CHANGE_CALLBACKS
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    NAME,
+    SERIAL,
+    get_base_device,
+    get_listeners,
+    setup_unready_entry,
+)
+
+from tests.common import async_fire_time_changed
+
+HUMIDITY_SENSOR = "sensor.bedroom_humidity"
+TEMPERATURE_SENSOR = "sensor.bedroom_temperature"
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def connected_device() -> DysonPureCool:
+    """Return a libdyson device with a mocked MQTT client."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "fnsp": "0002", "auto": "OFF"}
+    return device
+
+
+def _environment(device: DysonPureCool, pm25: int, voc: int = 0) -> None:
+    device._handle_message(
+        {
+            "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+            "data": {"pm25": f"{pm25:04d}", "va10": f"{voc:04d}"},
+        }
+    )
+
+
+def _speeds(device: DysonPureCool) -> list:
+    return [
+        json.loads(call[0][1])["data"]["fnsp"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+def test_demand():
+    """Test mapping readings onto the speed range."""
+    controller = DysonAirQualityController(MagicMock(), 10, 50, 2, 8)
+    assert controller.demand(None, None) == 2
+    assert controller.demand(5, None) == 2
+    assert controller.demand(11, None) == 3
+    assert controller.demand(30, None) == 5
+    assert controller.demand(80, None) == 8
+    assert controller.demand(5, 90) == 8
+
+
+def test_air_quality_controller(connected_device: DysonPureCool):
+    """Test the controller steps the speed with hysteresis and rate limits."""
+    controller = DysonAirQualityController(connected_device, 10, 50, interval=60)
+    controller.async_start()
+    updates = MagicMock()
+    controller.add_listener(updates)
+
+    with patch("custom_components.dyson_local.control.time.monotonic") as monotonic:
+        monotonic.return_value = 1000
+        _environment(connected_device, 45)
+        # At most two speeds at a time.
+        assert _speeds(connected_device) == ["0004"]
+        assert controller.speed == 9
+        assert controller.action == ACTION_INCREASE
+        connected_device._status["fnsp"] = "0004"
+
+        monotonic.return_value = 1030
+        _environment(connected_device, 45)
+        assert controller.action == ACTION_RATE_LIMITED
+        assert len(_speeds(connected_device)) == 1
+
+        # 14 asks for speed 2, but stays within half a step of speed 3.
+        monotonic.return_value = 1100
+        connected_device._status["fnsp"] = "0003"
+        _environment(connected_device, 14)
+        assert controller.action == ACTION_HOLD
+        _environment(connected_device, 12)
+        assert controller.action == ACTION_DECREASE
+        assert _speeds(connected_device)[-1] == "0002"
+
+        connected_device._status["auto"] = "ON"
+        _environment(connected_device, 50)
+        assert controller.action == ACTION_INACTIVE
+        assert len(_speeds(connected_device)) == 2
+
+    assert updates.call_count == 5
+    assert controller.as_dict()["air_quality_control_pm25"] == 50
+    controller.async_stop()
+    assert connected_device._callbacks == []
+
+
+async def test_options_flow(hass: HomeAssistant, device: DysonDevice):
+    """Test enabling the air quality controller in the options."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    assert result["type"] == RESULT_TYPE_FORM
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {
+            CONF_AIR_QUALITY_CONTROL: True,
+            CONF_AIR_QUALITY_LOW: 50,
+            CONF_AIR_QUALITY_HIGH: 20,
+        },
+    )
+    assert result["type"] == RESULT_TYPE_FORM
+    assert result["errors"] == {"base": "invalid_air_quality_range"}
+
+    with patch(f"{MODULE}.get_device", return_value=device):
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            {
+                CONF_AIR_QUALITY_CONTROL: True,
+                CONF_AIR_QUALITY_LOW: 5,
+                CONF_AIR_QUALITY_HIGH: 20,
+            },
+        )
+        await hass.async_block_till_done()
+    assert result["type"] == RESULT_TYPE_CREATE_ENTRY
+    controller = hass.data[DOMAIN][DATA_CONTROLLERS][entry.entry_id][
+        CONTROLLER_AIR_QUALITY
+    ]
+    assert controller.demand(20, None) == 10
+
+
+async def test_humidity_controller(hass: HomeAssistant):
+    """Test switching humidification from an external sensor."""
+    device = DysonPureHumidifyCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HUMIDIFY_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "hume": "OFF", "humt": "0050", "haut": "OFF"}
+    store = DysonControllerStore(hass)
+    await store.async_load()
+    controller = DysonHumidityController(hass, device, HUMIDITY_SENSOR, store)
+    controller.async_start()
+    assert controller.action == ACTION_NO_DATA
+
+    hass.states.async_set(HUMIDITY_SENSOR, "49")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_IDLE
+    assert device._mqtt_client.publish.call_count == 0
+
+    hass.states.async_set(HUMIDITY_SENSOR, "45")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_HUMIDIFY
+    assert json.loads(device._mqtt_client.publish.call_args[0][1])["data"] == {
+        "hume": "HUMD",
+        "humt": "0070",
+        "haut": "OFF",
+    }
+    device._status.update(hume="HUMD", humt="0070")
+
+    # Turning off again has to wait for the minimum run time.
+    controller.async_set_target(40)
+    assert controller.action == ACTION_WAITING
+    assert store.get(SERIAL, CONTROLLER_HUMIDITY) == {"target": 40, "enabled": True}
+    later = dt_util.utcnow() + timedelta(minutes=6)
+    with patch("custom_components.dyson_local.control.dt_util.utcnow") as utcnow:
+        utcnow.return_value = later
+        async_fire_time_changed(hass, later)
+        await hass.async_block_till_done()
+    assert controller.action == ACTION_IDLE
+    assert json.loads(device._mqtt_client.publish.call_args[0][1])["data"] == {
+        "hume": "OFF"
+    }
+    assert device._mqtt_client.publish.call_count == 2
+
+    controller.async_stop()
+    hass.states.async_set(HUMIDITY_SENSOR, "20")
+    await hass.async_block_till_done()
+    assert device._mqtt_client.publish.call_count == 2
+
+
+def _humidify_cool(status: dict) -> DysonPureHumidifyCool:
+    device = DysonPureHumidifyCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HUMIDIFY_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = status
+    return device
+
+
+def _state(device: DysonDevice, **status: str) -> None:
+    device._handle_message({"msg": "STATE-CHANGE", "product-state": status})
+
+
+def _published(device: DysonDevice) -> dict:
+    return json.loads(device._mqtt_client.publish.call_args[0][1])["data"]
+
+
+async def test_humidity_controller_turn_off(hass: HomeAssistant):
+    """Test turning the humidifier off keeps the controller from turning it on."""
+    device = _humidify_cool(
+        {"fpwr": "ON", "hume": "HUMD", "humt": "0070", "haut": "OFF"}
+    )
+    store = DysonControllerStore(hass)
+    await store.async_load()
+    controller = DysonHumidityController(hass, device, HUMIDITY_SENSOR, store)
+    entity = DysonHumidifierEntity(device, NAME, controller)
+    hass.states.async_set(HUMIDITY_SENSOR, "40")
+    controller.async_start()
+    assert controller.action == ACTION_HUMIDIFY
+    assert entity.is_on
+
+    await entity.async_turn_off()
+    assert not entity.is_on
+    assert _published(device) == {"hume": "OFF"}
+    assert store.get(SERIAL, CONTROLLER_HUMIDITY) == {"target": 50, "enabled": False}
+    _state(device, fpwr="ON", hume="OFF", humt="0070", haut="OFF")
+    hass.states.async_set(HUMIDITY_SENSOR, "35")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_INACTIVE
+    assert device._mqtt_client.publish.call_count == 1
+
+    await entity.async_turn_on()
+    assert entity.is_on
+    assert controller.action == ACTION_HUMIDIFY
+    assert _published(device) == {"hume": "HUMD", "humt": "0070", "haut": "OFF"}
+    controller.async_stop()
+
+
+async def test_humidity_controller_power_on(hass: HomeAssistant):
+    """Test the controller decides again when the device powers on."""
+    device = _humidify_cool(
+        {"fpwr": "OFF", "hume": "OFF", "humt": "0050", "haut": "OFF"}
+    )
+    store = DysonControllerStore(hass)
+    await store.async_load()
+    controller = DysonHumidityController(hass, device, HUMIDITY_SENSOR, store)
+    hass.states.async_set(HUMIDITY_SENSOR, "40")
+    controller.async_start()
+    assert controller.action == ACTION_INACTIVE
+
+    _state(device, fpwr="ON", hume="OFF", humt="0050", haut="OFF")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_HUMIDIFY
+    assert _published(device) == {"hume": "HUMD", "humt": "0070", "haut": "OFF"}
+
+    _state(device, fpwr="ON", hume="HUMD", humt="0070", haut="OFF")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_HUMIDIFY
+
+    # Humidification switched off on the device holds for the minimum run time.
+    _state(device, fpwr="ON", hume="OFF", humt="0070", haut="OFF")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_WAITING
+    assert device._mqtt_client.publish.call_count == 1
+    controller.async_stop()
+    assert device._callbacks == []
+
+
+def _heat_targets(device: DysonPureHotCool) -> list:
+    return [
+        json.loads(call[0][1])["data"]["hmax"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+async def test_thermostat_controller(hass: HomeAssistant):
+    """Test driving the heat target from an external sensor."""
+    device = DysonPureHotCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HOT_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "hmod": "HEAT", "hmax": "2930"}
+    store = DysonControllerStore(hass)
+    await store.async_load()
+    store.async_set(SERIAL, CONTROLLER_THERMOSTAT, {"target": 20, "integral": 0})
+    controller = DysonThermostatController(hass, device, TEMPERATURE_SENSOR, store)
+    controller.async_start()
+    assert controller.output(10, 0) == 25
+    assert controller.output(-0.1, 0) == 20
+
+    hass.states.async_set(TEMPERATURE_SENSOR, "18")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_INCREASE
+    assert _heat_targets(device) == ["2970"]
+    device._status["hmax"] = "2970"
+
+    # The next change waits for the command interval.
+    hass.states.async_set(TEMPERATURE_SENSOR, "19")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_RATE_LIMITED
+    later = dt_util.utcnow() + timedelta(minutes=3)
+    with patch("custom_components.dyson_local.control.dt_util.utcnow") as utcnow:
+        utcnow.return_value = later
+        async_fire_time_changed(hass, later)
+        await hass.async_block_till_done()
+    assert controller.action == ACTION_DECREASE
+    assert _heat_targets(device) == ["2970", "2950"]
+    assert store.get(SERIAL, CONTROLLER_THERMOSTAT)["integral"] > 0
+
+    device._status["hmod"] = "OFF"
+    hass.states.async_set(TEMPERATURE_SENSOR, "15")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_INACTIVE
+    assert len(_heat_targets(device)) == 2
+    controller.async_stop()
+
+
+async def test_thermostat_target_enables_heat(hass: HomeAssistant):
+    """Test setting a thermostat target on a cooling device turns on heat mode."""
+    device = DysonPureHotCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HOT_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "hmod": "OFF", "hmax": "2930"}
+    store = DysonControllerStore(hass)
+    await store.async_load()
+    controller = DysonThermostatController(hass, device, TEMPERATURE_SENSOR, store)
+    entity = DysonPureHotCoolEntity(device, NAME, controller)
+    hass.states.async_set(TEMPERATURE_SENSOR, "18")
+    controller.async_start()
+    assert controller.action == ACTION_INACTIVE
+
+    await entity.async_set_temperature(temperature=22)
+    assert controller.target == 22
+    assert _published(device) == {"hmod": "HEAT"}
+    _state(device, fpwr="ON", hmod="HEAT", hmax="2930")
+    await hass.async_block_till_done()
+    assert controller.action == ACTION_INCREASE
+    assert _published(device) == {"hmod": "HEAT", "hmax": "3000"}
+    controller.async_stop()
+
+
+async def test_setup_retry_stops_controllers(hass: HomeAssistant):
+    """Test a retried setup leaves no controllers running."""
+    new_device = get_base_device(DysonPureHumidifyCool, DEVICE_TYPE_PURE_HUMIDIFY_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        entry = await setup_unready_entry(
+            hass,
+            new_device,
+            {CONF_AIR_QUALITY_CONTROL: True, CONF_HUMIDITY_SENSOR: HUMIDITY_SENSOR},
+        )
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_CONTROLLERS]
+    assert get_listeners(new_device, DysonAirQualityController) == []
+    assert get_listeners(new_device, DysonHumidityController) == []
+    assert not hass.data[TRACK_STATE_CHANGE_CALLBACKS].get(HUMIDITY_SENSOR)
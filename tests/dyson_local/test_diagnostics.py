@@ -0,0 +1,35 @@
+"""Tests for Dyson Local diagnostics."""
+
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import CONF_CREDENTIAL, DOMAIN
+from custom_components.dyson_local.diagnostics import (
+    REDACTED,
+    async_get_config_entry_diagnostics,
+)
+from homeassistant.core import HomeAssistant
+
+from . import MODULE, get_base_device
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    device.is_connected = True
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+async def test_diagnostics(hass: HomeAssistant, device: DysonDevice):
+    """Test config entry diagnostics."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device._set_configuration(fpwr="ON")
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["entry"][CONF_CREDENTIAL] == REDACTED
+    assert diagnostics["connected"] is True
+    assert diagnostics["commands"] == {"received": 1, "published": 1, "merged": 0}
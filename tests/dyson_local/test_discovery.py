@@ -0,0 +1,116 @@
+"""Tests for Dyson Local discovery."""
+
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.discovery import TYPE_DYSON_FAN
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import (
+    CONF_CREDENTIAL,
+    CONF_DEVICE_TYPE,
+    CONF_SERIAL,
+    DATA_DEVICES,
+    DATA_DISCOVERY,
+    DOMAIN,
+)
+from custom_components.dyson_local.discovery import (
+    DysonDiscoveryIndex,
+    async_discover_host,
+)
+from homeassistant.const import CONF_NAME
+from homeassistant.core import HomeAssistant
+
+from . import CREDENTIAL, HOST, MODULE, NAME, SERIAL, get_base_device
+
+from tests.common import MockConfigEntry
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def discovery(hass: HomeAssistant) -> DysonDiscoveryIndex:
+    """Return a shared discovery index that is not browsing."""
+    discovery = DysonDiscoveryIndex()
+    hass.data[DOMAIN][DATA_DISCOVERY] = discovery
+    return discovery
+
+
+def _service_info() -> MagicMock:
+    info = MagicMock()
+    info.type = TYPE_DYSON_FAN
+    info.name = f"{DEVICE_TYPE_PURE_COOL}_{SERIAL}.{TYPE_DYSON_FAN}"
+    info.addresses = [socket.inet_aton(HOST)]
+    return info
+
+
+async def test_discover_known_device(
+    hass: HomeAssistant, device: DysonDevice, discovery: DysonDiscoveryIndex
+):
+    """Test an already discovered device is returned without waiting."""
+    discovery.device_discovered(_service_info())
+    assert discovery.get_address(SERIAL) == HOST
+    assert await async_discover_host(hass, device, 0.1) == HOST
+    # The address stays in the index for later lookups.
+    assert await async_discover_host(hass, device, 0.1) == HOST
+
+
+async def test_discover_from_thread(
+    hass: HomeAssistant, device: DysonDevice, discovery: DysonDiscoveryIndex
+):
+    """Test a device announced by the zeroconf thread is returned."""
+    hass.loop.call_soon(
+        threading.Thread(
+            target=discovery.device_discovered, args=(_service_info(),)
+        ).start
+    )
+    assert await async_discover_host(hass, device, 5) == HOST
+
+
+async def test_discover_timeout(
+    hass: HomeAssistant, device: DysonDevice, discovery: DysonDiscoveryIndex
+):
+    """Test discovery timing out."""
+    assert await async_discover_host(hass, device, 0.01) is None
+    assert discovery._registered[SERIAL] == []
+
+
+async def test_unload_waiting_entry(
+    hass: HomeAssistant, device: DysonDevice, discovery: DysonDiscoveryIndex
+):
+    """Test reloading an entry waiting for discovery leaves one callback."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_SERIAL: SERIAL,
+            CONF_CREDENTIAL: CREDENTIAL,
+            CONF_DEVICE_TYPE: DEVICE_TYPE_PURE_COOL,
+            CONF_NAME: NAME,
+        },
+    )
+    entry.add_to_hass(hass)
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}.get_device", return_value=new_device):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        assert len(discovery._registered[SERIAL]) == 1
+        assert await hass.config_entries.async_reload(entry.entry_id)
+        await hass.async_block_till_done()
+    assert len(discovery._registered[SERIAL]) == 1
+
+    # A callback already handed the address after unloading does nothing.
+    callback = discovery._registered[SERIAL][0]
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    assert discovery._registered[SERIAL] == []
+    assert not await hass.async_add_executor_job(callback, HOST)
+    new_device.connect.assert_not_called()
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_DEVICES]
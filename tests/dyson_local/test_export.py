@@ -0,0 +1,143 @@
+"""Tests for the Dyson Local history export."""
+
+import csv
+from pathlib import Path
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import DATA_HISTORY, DOMAIN
+from custom_components.dyson_local.export import (
+    EVENT_EXPORT_FAILED,
+    EVENT_EXPORT_PROGRESS,
+    EVENT_HISTORY_EXPORTED,
+    async_export_history,
+)
+from custom_components.dyson_local.services import SERVICE_EXPORT_HISTORY
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import device_registry as dr
+
+from . import MODULE, SERIAL, get_base_device
+
+from tests.common import async_capture_events
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+async def test_export_csv(hass: HomeAssistant, tmp_path: Path):
+    """Test exporting a range as CSV in batches."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device_entry = dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry.entry_id, identifiers={(DOMAIN, SERIAL)}
+    )
+    history = hass.data[DOMAIN][DATA_HISTORY][entry.entry_id]
+    for timestamp in range(0, 50, 10):
+        history.append(timestamp, [timestamp, 5, float("nan"), 0, 0])
+    progress = async_capture_events(hass, EVENT_EXPORT_PROGRESS)
+    exported = async_capture_events(hass, EVENT_HISTORY_EXPORTED)
+
+    hass.config.allowlist_external_dirs = {str(tmp_path)}
+    path = tmp_path / "history.csv"
+    with patch("custom_components.dyson_local.history.BATCH_SIZE", 2), patch(
+        "custom_components.dyson_local.export.PROGRESS_INTERVAL", 0
+    ):
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_EXPORT_HISTORY,
+            {
+                "device_id": device_entry.id,
+                "file": str(path),
+                "start_time": "1970-01-01T00:00:10+00:00",
+            },
+            blocking=True,
+        )
+        await hass.async_block_till_done()
+
+    with open(path, encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["time", "pm25", "pm10", "voc", "no2", "hcho"]
+    assert rows[1] == ["1970-01-01T00:00:10+00:00", "10.0", "5.0", "", "0.0", "0.0"]
+    assert len(rows) == 5
+    assert [
+        (event.data["records"], event.data["total"], event.data["percent"])
+        for event in progress
+    ] == [(2, 4, 50)]
+    assert exported[0].data["records"] == 4
+    assert exported[0].data["format"] == "csv"
+    assert exported[0].data["bytes"] == path.stat().st_size
+
+    with pytest.raises(HomeAssistantError):
+        await async_export_history(hass, history, "/etc/history.csv", 0, 100)
+
+
+async def test_export_failed(hass: HomeAssistant, tmp_path: Path):
+    """Test a failed export removes its partial file."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    history = hass.data[DOMAIN][DATA_HISTORY][entry.entry_id]
+    for timestamp in range(0, 50, 10):
+        history.append(timestamp, [timestamp, 5, float("nan"), 0, 0])
+    failed = async_capture_events(hass, EVENT_EXPORT_FAILED)
+    exported = async_capture_events(hass, EVENT_HISTORY_EXPORTED)
+
+    hass.config.allowlist_external_dirs = {str(tmp_path)}
+    path = tmp_path / "history.csv"
+    read = history.read
+    with patch("custom_components.dyson_local.history.BATCH_SIZE", 2), patch.object(
+        history, "read", side_effect=[read(0, 100), OSError("disk failed")]
+    ), pytest.raises(OSError):
+        await async_export_history(hass, history, str(path), 0, 100)
+    await hass.async_block_till_done()
+
+    assert not path.exists()
+    assert failed[0].data["records"] == 2
+    assert failed[0].data["error"] == "disk failed"
+    assert exported == []
+
+
+async def test_export_close_failed(hass: HomeAssistant, tmp_path: Path):
+    """Test an export failing to close removes its partial file."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    history = hass.data[DOMAIN][DATA_HISTORY][entry.entry_id]
+    history.append(0, [0, 5, float("nan"), 0, 0])
+    failed = async_capture_events(hass, EVENT_EXPORT_FAILED)
+    exported = async_capture_events(hass, EVENT_HISTORY_EXPORTED)
+
+    hass.config.allowlist_external_dirs = {str(tmp_path)}
+    path = tmp_path / "history.csv"
+    with patch(
+        "custom_components.dyson_local.export._CsvWriter.close",
+        side_effect=OSError("disk full"),
+    ), pytest.raises(OSError):
+        await async_export_history(hass, history, str(path), 0, 100)
+    await hass.async_block_till_done()
+
+    assert not path.exists()
+    assert failed[0].data["records"] == 1
+    assert failed[0].data["error"] == "disk full"
+    assert exported == []
+
+
+async def test_export_parquet(hass: HomeAssistant, tmp_path: Path):
+    """Test exporting a range as Parquet."""
+    parquet = pytest.importorskip("pyarrow.parquet")
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    history = hass.data[DOMAIN][DATA_HISTORY][entry.entry_id]
+    for timestamp in range(0, 50, 10):
+        history.append(timestamp, [timestamp, 5, float("nan"), 0, 0])
+
+    hass.config.allowlist_external_dirs = {str(tmp_path)}
+    path = str(tmp_path / "history.parquet")
+    report = await async_export_history(hass, history, path, 0, 30, "parquet")
+    assert report["records"] == 4
+    table = parquet.read_table(path)
+    assert table.column("pm25").to_pylist() == [0, 10, 20, 30]
+    assert table.column("voc").null_count == 4
@@ -0,0 +1,180 @@
+"""Tests for the Dyson Local filter replacement forecast."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import DATA_FILTER_FORECASTS, DOMAIN
+from custom_components.dyson_local.forecast import (
+    FILTER_CARBON,
+    FILTER_HEPA,
+    DysonFilterForecast,
+    DysonForecastStore,
+    FilterLifeModel,
+)
+from homeassistant.const import EVENT_STATE_CHANGED, STATE_UNKNOWN
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    NAME,
+    SERIAL,
+    get_base_device,
+    get_connected_device,
+    get_listeners,
+    setup_sensor_entry,
+    setup_unready_entry,
+)
+
+from tests.common import async_capture_events
+
+START = datetime(2021, 6, 1, tzinfo=dt_util.UTC)
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def test_filter_life_model():
+    """Test the fitted rate and its stored state."""
+    model = FilterLifeModel()
+    model.add(10, 99)
+    assert model.rate is None
+    model.add(20, 98)
+    model.add(30, 96)
+    assert model.rate == pytest.approx(0.15)
+    assert FilterLifeModel(model.as_dict()).rate == model.rate
+
+    # Filter life does not go up with use.
+    model = FilterLifeModel()
+    model.add(10, 50)
+    model.add(20, 60)
+    assert model.rate is None
+
+
+def _state(device: DysonPureCool, on: bool, life: int) -> None:
+    device._handle_message(
+        {
+            "msg": "CURRENT-STATE",
+            "product-state": {
+                "fpwr": "ON" if on else "OFF",
+                "hflr": f"{life:04d}",
+                "cflr": "INV",
+            },
+        }
+    )
+
+
+async def test_filter_forecast(hass: HomeAssistant):
+    """Test the replacement date follows the depletion rate and usage."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    store = DysonForecastStore(hass)
+    await store.async_load()
+    forecast = DysonFilterForecast(hass, device, store)
+    updates = MagicMock()
+    forecast.add_listener(updates)
+    forecast.async_start()
+
+    # On for the first 12 hours of each day, using a percent every 10 hours.
+    running = 0.0
+    was_on = False
+    with patch("custom_components.dyson_local.forecast.dt_util.utcnow") as utcnow:
+        for step in range(5 * 24 * 12 + 1):
+            if was_on:
+                running += 5 / 60
+            on = step % (24 * 12) < 12 * 12
+            utcnow.return_value = START + timedelta(minutes=5 * step)
+            _state(device, on, 100 - int(running / 10 + 1e-6))
+            await hass.async_block_till_done()
+            was_on = on
+        forecast.async_stop()
+
+    # The first reading and each of the six percents used.
+    assert updates.call_count == 7
+    assert forecast.usage_per_day == pytest.approx(12, rel=0.01)
+    assert forecast.rate(FILTER_HEPA) == pytest.approx(0.1, rel=0.01)
+    assert forecast.rate(FILTER_CARBON) is None
+    replacement = forecast.replacement(FILTER_HEPA)
+    # Worked out when the last percent went, 60 running hours of 108.
+    expected = START + timedelta(hours=108, days=94 / 0.1 / (24 * 60 / 108))
+    assert abs(replacement - expected) < timedelta(days=1)
+
+    # Carried over a restart.
+    forecast = DysonFilterForecast(hass, device, store)
+    assert forecast.replacement(FILTER_HEPA) == replacement
+    assert forecast.rate(FILTER_HEPA) == pytest.approx(0.1, rel=0.01)
+    forecast.async_start()
+
+    # A new filter starts over.
+    _state(device, True, 100)
+    await hass.async_block_till_done()
+    assert forecast.replacement(FILTER_HEPA) is None
+    assert forecast.rate(FILTER_HEPA) is None
+    forecast.async_stop()
+
+    # Removing a listener twice is harmless.
+    forecast.remove_listener(updates)
+    forecast.remove_listener(updates)
+
+
+async def test_filter_replacement_sensor(hass: HomeAssistant):
+    """Test the sensor is written only when the forecast changes."""
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        {"fpwr": "ON", "hflr": "0100", "cflr": "INV"},
+        {
+            "hact": "0050",
+            "tact": "2950",
+            "va10": "0003",
+            "pm25": "0010",
+            "pm10": "0005",
+            "noxl": "0004",
+            "sltm": "OFF",
+        },
+    )
+    entity_id = f"sensor.{NAME}_filter_replacement"
+    with patch("custom_components.dyson_local.forecast.dt_util.utcnow") as utcnow:
+        utcnow.return_value = START
+        await setup_sensor_entry(hass, device)
+        state = hass.states.get(entity_id)
+        assert state.state == STATE_UNKNOWN
+        assert state.attributes["depletion_per_running_hour"] is None
+        writes = async_capture_events(hass, EVENT_STATE_CHANGED)
+
+        # A percent used each running hour for two hours, then turned off.
+        for step in range(3 * 12 + 1):
+            hours = step / 12
+            utcnow.return_value = START + timedelta(hours=hours)
+            _state(device, hours <= 2, 100 - int(min(hours, 2) + 1e-6))
+            await hass.async_block_till_done()
+
+    # The reading of 99 and of 98, not the messages in between.
+    assert [
+        event.data["new_state"].attributes["running_hours_per_day"]
+        for event in writes
+        if event.data["entity_id"] == entity_id
+    ] == [24, 24]
+    state = hass.states.get(entity_id)
+    assert state.attributes["depletion_per_running_hour"] == 1
+    expected = START + timedelta(hours=2, days=98 / 24)
+    replacement = dt_util.parse_datetime(state.state)
+    assert abs(replacement - expected) < timedelta(minutes=10)
+
+
+async def test_setup_retry_stops_forecast(hass: HomeAssistant):
+    """Test a retried setup stops following the device."""
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        entry = await setup_unready_entry(hass, new_device)
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_FILTER_FORECASTS]
+    assert get_listeners(new_device, DysonFilterForecast) == []
@@ -0,0 +1,174 @@
+"""Tests for the Dyson Local environmental history."""
+
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import DATA_HISTORY, DOMAIN
+from custom_components.dyson_local.history import DysonHistory, history_capacity
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    SERIAL,
+    get_base_device,
+    get_listeners,
+    setup_unready_entry,
+)
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _environment(device: DysonPureCool, pm25: int) -> None:
+    device._handle_message(
+        {
+            "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+            "data": {
+                "pm25": f"{pm25:04d}",
+                "pm10": "0005",
+                "va10": "INIT",
+                "noxl": "OFF",
+            },
+        }
+    )
+
+
+def test_history(tmp_path):
+    """Test the ring keeps the latest records across reopening."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    path = str(tmp_path / "history" / f"{SERIAL}.bin")
+    history = DysonHistory(device, path, capacity=4)
+    history.open()
+    history.async_start()
+    assert history.read(0, 100) == ([], None)
+
+    with patch("custom_components.dyson_local.history.time.time") as now, patch(
+        "custom_components.dyson_local.history.INTERVAL", 10
+    ):
+        for timestamp in range(10, 70, 10):
+            now.return_value = timestamp
+            _environment(device, timestamp)
+            # Later readings of the same interval are left out.
+            now.return_value = timestamp + 5
+            _environment(device, 0)
+    history.async_stop()
+    history.close()
+
+    history = DysonHistory(device, path, capacity=4)
+    history.open()
+    rows, position = history.read(0, 1000)
+    assert position is None
+    # The two oldest records were overwritten.
+    assert [row[:3] for row in rows] == [
+        [30, 30, 5],
+        [40, 40, 5],
+        [50, 50, 5],
+        [60, 60, 5],
+    ]
+    # No VOC reading while it warms up, and no formaldehyde sensor.
+    assert rows[0][3:] == [None, None, None]
+    assert [row[0] for row in history.read(35, 50)[0]] == [40, 50]
+    assert history.count(35, 50) == 2
+    assert history.count(0, float("inf")) == 4
+    assert history.count(70, 100) == 0
+
+    with patch("custom_components.dyson_local.history.BATCH_SIZE", 3):
+        rows, position = history.read(0, 1000)
+        assert len(rows) == 3
+        assert history.read(0, 1000, position)[0] == [[60, 60, 5, None, None, None]]
+
+    # The clock going back does not break the order.
+    history.append(55, [1, 2, 3, 4, 5])
+    assert history.read(60, 60)[0][-1] == [60, 1, 2, 3, 4, 5]
+    history.close()
+
+    # A file of another capacity keeps its latest records.
+    history = DysonHistory(device, path, capacity=8)
+    history.open()
+    assert [row[0] for row in history.read(0, 1000)[0]] == [40, 50, 60, 60]
+    history.append(70, [1, 2, 3, 4, 5])
+    history.close()
+    history = DysonHistory(device, path, capacity=2)
+    history.open()
+    assert [row[0] for row in history.read(0, 1000)[0]] == [60, 70]
+    history.close()
+
+    # A file that is not a history starts over.
+    with open(path, "r+b") as file:
+        file.write(b"JUNK")
+    history = DysonHistory(device, path, capacity=2)
+    history.open()
+    assert history.read(0, 1000) == ([], None)
+    history.close()
+
+
+def test_history_capacity():
+    """Test the capacity covers the retention at one record per interval."""
+    assert history_capacity(1) == 2880
+    assert history_capacity(90) == 259200
+
+
+async def test_websocket(hass: HomeAssistant, hass_ws_client):
+    """Test streaming a range over the websocket."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device_entry = dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry.entry_id, identifiers={(DOMAIN, SERIAL)}
+    )
+    history = hass.data[DOMAIN][DATA_HISTORY][entry.entry_id]
+    for timestamp in range(1000, 1005):
+        history.append(timestamp, [timestamp - 1000, 0, 0, 0, 0])
+
+    client = await hass_ws_client(hass)
+    with patch("custom_components.dyson_local.history.BATCH_SIZE", 2):
+        await client.send_json(
+            {
+                "id": 1,
+                "type": f"{DOMAIN}/history",
+                "device_id": device_entry.id,
+                "start_time": dt_util.utc_from_timestamp(1001).isoformat(),
+                "end_time": dt_util.utc_from_timestamp(1003).isoformat(),
+            }
+        )
+        response = await client.receive_json()
+        assert response["success"]
+        events = [(await client.receive_json())["event"] for _ in range(2)]
+    assert events[0]["metrics"] == ["pm25", "pm10", "voc", "no2", "hcho"]
+    assert [row[:2] for row in events[0]["records"]] == [[1001, 1], [1002, 2]]
+    assert not events[0]["done"]
+    assert events[1]["records"] == [[1003, 3, 0, 0, 0, 0]]
+    assert events[1]["done"]
+
+    await client.send_json(
+        {
+            "id": 2,
+            "type": f"{DOMAIN}/history",
+            "device_id": "unknown",
+            "start_time": "2021-01-01T00:00:00",
+        }
+    )
+    response = await client.receive_json()
+    assert response["error"]["code"] == "not_found"
+
+
+async def test_setup_retry_closes_history(hass: HomeAssistant):
+    """Test a retried setup stops the history and closes its file."""
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]), patch.object(
+        DysonHistory, "close", autospec=True, side_effect=DysonHistory.close
+    ) as close:
+        entry = await setup_unready_entry(hass, new_device)
+        await hass.async_block_till_done()
+        close.assert_called_once()
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_HISTORY]
+    assert get_listeners(new_device, DysonHistory) == []
@@ -0,0 +1,111 @@
+"""Tests for Dyson Local command latency tracking."""
+
+from unittest.mock import MagicMock, patch
+
+from libdyson import (
+    DEVICE_TYPE_PURE_COOL,
+    DEVICE_TYPE_PURE_HOT_COOL,
+    DysonPureCool,
+    DysonPureHotCool,
+)
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.commands import install_command_queue
+from custom_components.dyson_local.latency import DysonLatencyTracker
+from custom_components.dyson_local.optimistic import DysonOptimisticState
+from homeassistant.core import HomeAssistant
+
+from . import CREDENTIAL, MODULE, SERIAL, get_base_device
+
+STATUS = {"fpwr": "OFF", "fnsp": "0001", "auto": "OFF", "hmod": "OFF"}
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def connected_device() -> DysonPureCool:
+    """Return a libdyson device with a mocked MQTT client."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = dict(STATUS)
+    return device
+
+
+def _state_change(device: DysonPureCool, **fields) -> None:
+    status = {field: [value, value] for field, value in STATUS.items()}
+    status.update({field: [STATUS[field], value] for field, value in fields.items()})
+    device._handle_message({"msg": "STATE-CHANGE", "product-state": status})
+
+
+def _tracker(hass: HomeAssistant, device: DysonPureCool) -> DysonLatencyTracker:
+    queue = install_command_queue(hass, device)
+    tracker = DysonLatencyTracker(device)
+    tracker.start()
+    queue.add_publish_listener(tracker.published)
+    return tracker
+
+
+async def test_confirmed(hass: HomeAssistant, connected_device: DysonPureCool):
+    """Test a command is matched to the state change confirming it."""
+    tracker = _tracker(hass, connected_device)
+    connected_device.set_speed(5)
+
+    # A state change that does not confirm every field is not the echo.
+    _state_change(connected_device, fpwr="ON")
+    assert tracker.confirmed == 0
+    _state_change(connected_device, fpwr="ON", fnsp="0005")
+    stats = tracker.as_dict()
+    assert stats["confirmed"] == 1
+    assert stats["outstanding"] == 0
+    assert 0 <= stats["p50_ms"] == stats["p99_ms"] == stats["max_ms"] <= 100
+    assert stats["histogram_ms"]["<=100"] == 1
+
+
+async def test_timeout_and_superseded(
+    hass: HomeAssistant, connected_device: DysonPureCool
+):
+    """Test unconfirmed and overwritten commands are counted."""
+    tracker = _tracker(hass, connected_device)
+    queue = connected_device._set_configuration.send
+
+    connected_device.enable_auto_mode()
+    connected_device.set_speed(3)
+    queue.flush()
+    connected_device.set_speed(4)
+    queue.flush()
+    stats = tracker.as_dict()
+    assert stats["superseded"] == 1
+    assert stats["outstanding"] == 2
+
+    tracker._timeout = 0
+    stats = tracker.as_dict()
+    assert stats["timeouts"] == 2
+    assert stats["outstanding"] == 0
+    assert stats["p50_ms"] is None
+
+
+async def test_ignores_optimistic_overlay(hass: HomeAssistant):
+    """Test commanded values shown optimistically do not confirm commands."""
+    connected_device = DysonPureHotCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HOT_COOL)
+    connected_device._mqtt_client = MagicMock()
+    connected_device._connected.set()
+    connected_device._status = dict(STATUS)
+    tracker = _tracker(hass, connected_device)
+    optimistic = DysonOptimisticState(hass, connected_device)
+    optimistic.start()
+    connected_device._set_configuration.send.add_listener(optimistic.command)
+
+    await hass.async_add_executor_job(connected_device.enable_heat_mode)
+    assert connected_device.heat_mode_is_on
+    assert tracker.confirmed == 0
+    _state_change(connected_device, hmod="HEAT")
+    assert tracker.confirmed == 1
+    optimistic.async_stop()
@@ -0,0 +1,129 @@
+"""Tests for the Dyson Local long-term statistics."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import CONF_LONG_TERM_STATISTICS
+from custom_components.dyson_local.long_term_statistics import DysonLongTermStatistics
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    NAME,
+    SERIAL,
+    get_base_device,
+    get_connected_device,
+    setup_sensor_entry,
+)
+
+from tests.common import async_fire_time_changed
+
+STATISTICS = "custom_components.dyson_local.long_term_statistics"
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _environment(device: DysonPureCool, pm25: int, temperature: str) -> None:
+    device._handle_message(
+        {
+            "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+            "data": {
+                "pm25": f"{pm25:04d}",
+                "pm10": "0005",
+                "va10": "INIT",
+                "noxl": "OFF",
+                "tact": temperature,
+                "hact": "0050",
+            },
+        }
+    )
+
+
+async def test_long_term_statistics(hass: HomeAssistant):
+    """Test each completed hour is imported once per metric."""
+    hass.config.components.add("recorder")
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    statistics = DysonLongTermStatistics(hass, device, NAME)
+    statistics.async_start()
+    next_hour = dt_util.utcnow().replace(minute=0, second=6) + timedelta(hours=1)
+
+    with patch(f"{STATISTICS}.async_add_external_statistics") as add, patch(
+        f"{STATISTICS}.dt_util.utcnow"
+    ) as utcnow:
+        for minute, pm25, temperature in [(10, 10, "2950"), (40, 30, "2960")]:
+            utcnow.return_value = datetime(2021, 6, 1, 10, minute, tzinfo=dt_util.UTC)
+            _environment(device, pm25, temperature)
+        await hass.async_block_till_done()
+        add.assert_not_called()
+
+        utcnow.return_value = datetime(2021, 6, 1, 11, 5, tzinfo=dt_util.UTC)
+        _environment(device, 50, "OFF")
+        await hass.async_block_till_done()
+        imported = {
+            call[0][1]["statistic_id"]: (call[0][1], call[0][2][0])
+            for call in add.call_args_list
+        }
+        # Off and warming up sensors have no readings to import.
+        assert set(imported) == {
+            "dyson_local:jh1_us_hbb1111a_pm25",
+            "dyson_local:jh1_us_hbb1111a_pm10",
+            "dyson_local:jh1_us_hbb1111a_humidity",
+            "dyson_local:jh1_us_hbb1111a_temperature",
+        }
+        metadata, data = imported["dyson_local:jh1_us_hbb1111a_pm25"]
+        assert metadata["source"] == "dyson_local"
+        assert metadata["name"] == f"{NAME} PM 2.5"
+        assert data == {
+            "start": datetime(2021, 6, 1, 10, tzinfo=dt_util.UTC),
+            "mean": 20,
+            "min": 10,
+            "max": 30,
+        }
+        data = imported["dyson_local:jh1_us_hbb1111a_temperature"][1]
+        assert round(data["mean"], 2) == 22.35
+        assert round(data["min"], 2) == 21.85
+
+        # A device gone quiet is flushed by the timer.
+        add.reset_mock()
+        async_fire_time_changed(hass, next_hour)
+        await hass.async_block_till_done()
+        assert add.call_count == 3
+        assert add.call_args[0][2][0]["start"] == datetime(
+            2021, 6, 1, 11, tzinfo=dt_util.UTC
+        )
+
+    statistics.async_stop()
+    assert device._callbacks == []
+
+
+async def test_long_term_statistics_option(hass: HomeAssistant):
+    """Test the statistics follow the device only when the option is on."""
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        {"fpwr": "ON", "hflr": "0100", "cflr": "INV"},
+        {"pm25": "0010", "pm10": "0005", "va10": "INIT", "noxl": "OFF"},
+    )
+    entry = await setup_sensor_entry(hass, device, {CONF_LONG_TERM_STATISTICS: True})
+    owners = [
+        type(getattr(listener, "__self__", None)) for listener in device._callbacks
+    ]
+    assert DysonLongTermStatistics in owners
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    owners = [
+        type(getattr(listener, "__self__", None)) for listener in device._callbacks
+    ]
+    assert DysonLongTermStatistics not in owners
@@ -0,0 +1,133 @@
+"""Tests for Dyson Local optimistic state."""
+
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool, MessageType
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.commands import install_command_queue
+from custom_components.dyson_local.const import CONF_OPTIMISTIC, DATA_OPTIMISTIC, DOMAIN
+from custom_components.dyson_local.optimistic import (
+    OPTIMISTIC_TIMEOUT,
+    DysonOptimisticState,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import RESULT_TYPE_CREATE_ENTRY, RESULT_TYPE_FORM
+from homeassistant.util import dt as dt_util
+
+from . import CREDENTIAL, MODULE, SERIAL, get_base_device
+
+from tests.common import async_fire_time_changed
+
+STATUS = {"fpwr": "OFF", "fnsp": "0001", "auto": "OFF", "sltm": "OFF"}
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+@pytest.fixture
+def connected_device() -> DysonPureCool:
+    """Return a libdyson device with a mocked MQTT client."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = dict(STATUS)
+    return device
+
+
+@pytest.fixture
+def optimistic(hass: HomeAssistant, connected_device: DysonPureCool):
+    """Return optimistic state following the device."""
+    optimistic = DysonOptimisticState(hass, connected_device)
+    optimistic.start()
+    install_command_queue(hass, connected_device).add_listener(optimistic.command)
+    yield optimistic
+    optimistic.async_stop()
+
+
+def _state_change(**fields) -> dict:
+    status = {field: [value, value] for field, value in STATUS.items()}
+    for field, (old, new) in fields.items():
+        status[field] = [old, new]
+    return {"msg": "STATE-CHANGE", "product-state": status}
+
+
+async def test_confirmed_by_echo(
+    hass: HomeAssistant,
+    connected_device: DysonPureCool,
+    optimistic: DysonOptimisticState,
+):
+    """Test commanded values show at once and are confirmed by the echo."""
+    seen = []
+    connected_device.add_message_listener(
+        lambda message_type: seen.append(connected_device.is_on)
+    )
+    await hass.async_add_executor_job(connected_device.turn_on)
+    assert connected_device.is_on
+    assert seen == [True]
+
+    connected_device._handle_message(_state_change(fpwr=["OFF", "ON"]))
+    assert connected_device.is_on
+    assert seen == [True, True]
+    assert (optimistic.confirmed, optimistic.rolled_back) == (1, 0)
+
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + OPTIMISTIC_TIMEOUT + timedelta(seconds=1)
+    )
+    await hass.async_block_till_done()
+    assert connected_device.is_on
+    assert optimistic.rolled_back == 0
+
+
+async def test_rolled_back_on_timeout(
+    hass: HomeAssistant,
+    connected_device: DysonPureCool,
+    optimistic: DysonOptimisticState,
+):
+    """Test an unconfirmed value is kept until it times out."""
+    listener = MagicMock()
+    connected_device.add_message_listener(listener)
+    await hass.async_add_executor_job(connected_device.set_speed, 5)
+    # The sleep timer counts down, so it is never shown optimistically.
+    await hass.async_add_executor_job(connected_device.set_sleep_timer, 30)
+    assert connected_device.speed == 5
+    assert connected_device._status["sltm"] == "OFF"
+
+    # A message that does not confirm the speed keeps the overlay.
+    connected_device._handle_message(_state_change(fpwr=["OFF", "ON"]))
+    assert connected_device.speed == 5
+    assert optimistic.confirmed == 1
+
+    listener.reset_mock()
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + OPTIMISTIC_TIMEOUT + timedelta(seconds=1)
+    )
+    await hass.async_block_till_done()
+    assert connected_device.speed == 1
+    assert connected_device.is_on
+    assert optimistic.rolled_back == 1
+    listener.assert_called_once_with(MessageType.STATE)
+
+
+async def test_options_flow(hass: HomeAssistant, device: DysonDevice):
+    """Test enabling optimistic state in the options."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    assert hass.data[DOMAIN][DATA_OPTIMISTIC] == {}
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    assert result["type"] == RESULT_TYPE_FORM
+    with patch(f"{MODULE}.get_device", return_value=device):
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"], {CONF_OPTIMISTIC: True}
+        )
+        await hass.async_block_till_done()
+    assert result["type"] == RESULT_TYPE_CREATE_ENTRY
+    assert entry.options[CONF_OPTIMISTIC] is True
+    assert entry.entry_id in hass.data[DOMAIN][DATA_OPTIMISTIC]
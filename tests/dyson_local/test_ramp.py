@@ -0,0 +1,110 @@
+"""Tests for Dyson Local ramps."""
+
+from datetime import timedelta
+import json
+from unittest.mock import MagicMock, patch
+
+from libdyson import (
+    DEVICE_TYPE_PURE_COOL,
+    DEVICE_TYPE_PURE_HOT_COOL,
+    DysonPureCool,
+    DysonPureHotCool,
+)
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.climate import DysonPureHotCoolEntity
+from custom_components.dyson_local.commands import install_command_queue
+from custom_components.dyson_local.fan import DysonPureCoolEntity
+from custom_components.dyson_local.ramp import ramp_values
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import CREDENTIAL, MODULE, NAME, SERIAL, get_base_device
+
+from tests.common import async_fire_time_changed
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _connect(device: DysonDevice, status: dict) -> DysonDevice:
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = status
+    return device
+
+
+def _published(device: DysonDevice) -> list:
+    return [
+        json.loads(call[0][1])["data"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+async def _async_advance(hass: HomeAssistant, seconds: float, queue) -> None:
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=seconds))
+    await hass.async_block_till_done()
+    # Steps fire faster than the coalescing window in the test.
+    queue.flush()
+
+
+def test_ramp_values():
+    """Test the values of a ramp."""
+    assert ramp_values(1, 4, 1) == [1, 2, 3, 4]
+    assert ramp_values(6, 4, 1) == [6, 5, 4]
+    assert ramp_values(20, 21.2, 0.5) == [20, 20.5, 21, 21.2]
+    assert ramp_values(3, 3, 1) == [3]
+
+
+async def test_ramp_speed(hass: HomeAssistant):
+    """Test ramping the fan speed and taking over with a manual command."""
+    device = _connect(
+        DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL),
+        {"fpwr": "OFF", "fnsp": "0001", "auto": "OFF"},
+    )
+    queue = install_command_queue(hass, device)
+    entity = DysonPureCoolEntity(device, NAME)
+    entity.hass = hass
+
+    await entity.async_ramp_speed(4, timedelta(seconds=30))
+    assert _published(device) == [{"fpwr": "ON", "fnsp": "0001", "auto": "OFF"}]
+
+    await _async_advance(hass, 5, queue)
+    assert len(_published(device)) == 1
+    await _async_advance(hass, 11, queue)
+    assert _published(device)[1:] == [{"fpwr": "ON", "fnsp": "0002", "auto": "OFF"}]
+    await _async_advance(hass, 21, queue)
+    assert _published(device)[2]["fnsp"] == "0003"
+
+    await hass.async_add_executor_job(device.turn_off)
+    queue.flush()
+    assert _published(device)[-1] == {"fpwr": "OFF"}
+    await _async_advance(hass, 31, queue)
+    assert len(_published(device)) == 4
+    assert not entity._ramp.is_running
+
+
+async def test_ramp_temperature(hass: HomeAssistant):
+    """Test ramping the target temperature down until cancelled."""
+    device = _connect(
+        DysonPureHotCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_HOT_COOL),
+        {"fpwr": "ON", "hmod": "HEAT", "hmax": "2930"},
+    )
+    queue = install_command_queue(hass, device)
+    entity = DysonPureHotCoolEntity(device, NAME)
+    entity.hass = hass
+
+    await entity.async_ramp_temperature(19, timedelta(minutes=2))
+    await _async_advance(hass, 31, queue)
+    await _async_advance(hass, 61, queue)
+    assert [data["hmax"] for data in _published(device)] == ["2930", "2925"]
+
+    await entity.async_cancel_temperature_ramp()
+    await _async_advance(hass, 121, queue)
+    assert len(_published(device)) == 2
@@ -0,0 +1,263 @@
+"""Tests for Dyson Local subnet scan."""
+
+import asyncio
+import socket
+import struct
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+from libdyson.exceptions import DysonException
+import pytest
+import voluptuous as vol
+
+from custom_components.dyson_local import CONFIG_SCHEMA, async_setup
+from custom_components.dyson_local.config_flow import async_connect_device
+from custom_components.dyson_local.const import (
+    CONF_CREDENTIAL,
+    CONF_DEVICE_TYPE,
+    CONF_SCAN_NETWORKS,
+    CONF_SERIAL,
+    DATA_DEVICES,
+    DATA_DISCOVERY,
+    DATA_SCANNER,
+    DOMAIN,
+)
+from custom_components.dyson_local.discovery import DysonDiscoveryIndex
+from custom_components.dyson_local.scanner import DysonSubnetScanner
+from homeassistant.const import CONF_NAME
+from homeassistant.core import HomeAssistant
+
+from . import CREDENTIAL, MODULE, NAME, SERIAL, get_base_device
+
+from tests.common import MockConfigEntry
+
+NETWORK = "127.0.0.0/29"
+DEVICE_HOST = "127.0.0.3"
+OTHER_HOST = "127.0.0.2"
+BROKER_HOST = "127.0.0.5"
+OTHER_SERIAL = "JH1-US-HBB2222A"
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _read_string(data: bytes, offset: int):
+    (length,) = struct.unpack_from("!H", data, offset)
+    offset += 2
+    return data[offset : offset + length].decode(), offset + length
+
+
+class FakeMQTTServer:
+    """MQTT listener that only answers the CONNECT handshake."""
+
+    def __init__(self, host: str, port: int, credentials: Optional[Dict[str, str]]):
+        """Initialize the server, accepting anything if credentials is None."""
+        self.host = host
+        self.port = port
+        self.credentials = credentials
+        self.logins: List[str] = []
+        self.server = None
+
+    async def start(self) -> None:
+        """Start listening."""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    def close(self) -> None:
+        """Stop listening."""
+        self.server.close()
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            assert (await reader.readexactly(1)) == b"\x10"
+            length, multiplier = 0, 1
+            while True:
+                byte = (await reader.readexactly(1))[0]
+                length += (byte & 0x7F) * multiplier
+                multiplier *= 128
+                if not byte & 0x80:
+                    break
+            packet = await reader.readexactly(length)
+            protocol, offset = _read_string(packet, 0)
+            assert protocol == "MQIsdp"
+            _, offset = _read_string(packet, offset + 4)
+            username, offset = _read_string(packet, offset)
+            password, offset = _read_string(packet, offset)
+            self.logins.append(username)
+            accepted = (
+                self.credentials is None or self.credentials.get(username) == password
+            )
+            writer.write(bytes([0x20, 0x02, 0x00, 0x00 if accepted else 0x04]))
+            await writer.drain()
+            await reader.read()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Port probes close without sending anything.
+            pass
+        finally:
+            writer.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def servers():
+    """Start a fake device, another device and an open broker."""
+    port = _free_port()
+    servers = {
+        DEVICE_HOST: FakeMQTTServer(DEVICE_HOST, port, {SERIAL: CREDENTIAL}),
+        OTHER_HOST: FakeMQTTServer(OTHER_HOST, port, {OTHER_SERIAL: "other"}),
+        BROKER_HOST: FakeMQTTServer(BROKER_HOST, port, None),
+    }
+    for server in servers.values():
+        await server.start()
+    yield servers
+    for server in servers.values():
+        server.close()
+
+
+@pytest.fixture
+def scanner(servers: Dict[str, FakeMQTTServer]) -> DysonSubnetScanner:
+    """Return a scanner for the fake listeners."""
+    return DysonSubnetScanner(
+        [NETWORK],
+        port=servers[DEVICE_HOST].port,
+        probe_timeout=0.5,
+        handshake_timeout=0.5,
+    )
+
+
+async def test_locate(scanner: DysonSubnetScanner, servers: Dict[str, FakeMQTTServer]):
+    """Test matching hosts to serials by handshake."""
+    assert await scanner.async_locate(SERIAL, CREDENTIAL) == DEVICE_HOST
+    assert await scanner.async_locate(OTHER_SERIAL, "other") == OTHER_HOST
+    assert scanner._open_hosts == [OTHER_HOST, DEVICE_HOST, BROKER_HOST]
+
+    # Known devices are only confirmed.
+    servers[DEVICE_HOST].logins.clear()
+    assert await scanner.async_locate(SERIAL, CREDENTIAL) == DEVICE_HOST
+    assert servers[DEVICE_HOST].logins == [SERIAL]
+
+    # A broker accepting any login is never taken for a device.
+    assert await scanner.async_locate("unknown", "credential") is None
+    servers[BROKER_HOST].logins.clear()
+    assert await scanner.async_locate("unknown", "credential") is None
+    assert servers[BROKER_HOST].logins == []
+
+
+async def test_locate_wrong_credential(scanner: DysonSubnetScanner):
+    """Test a device is not matched with a wrong credential."""
+    assert await scanner.async_locate(SERIAL, "wrong") is None
+    assert scanner.get_address(SERIAL) is None
+
+
+async def test_locate_moved_device(
+    scanner: DysonSubnetScanner, servers: Dict[str, FakeMQTTServer]
+):
+    """Test a cached address is dropped when the device moves."""
+    assert await scanner.async_locate(SERIAL, CREDENTIAL) == DEVICE_HOST
+    servers[DEVICE_HOST].credentials = {}
+    servers[OTHER_HOST].credentials = {SERIAL: CREDENTIAL}
+    assert await scanner.async_locate(SERIAL, CREDENTIAL) == OTHER_HOST
+
+
+async def test_config_flow_uses_scan(hass: HomeAssistant, scanner: DysonSubnetScanner):
+    """Test the config flow falls back to the scan when zeroconf is silent."""
+    hass.data[DOMAIN][DATA_DISCOVERY] = DysonDiscoveryIndex()
+    hass.data[DOMAIN][DATA_SCANNER] = scanner
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}.config_flow.get_device", return_value=new_device):
+        assert (
+            await async_connect_device(hass, SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+            is new_device
+        )
+    new_device.connect.assert_called_once_with(DEVICE_HOST)
+    await hass.async_block_till_done()
+    assert hass.data[DOMAIN][DATA_DISCOVERY]._registered[SERIAL] == []
+
+
+async def test_setup_after_failed_host(
+    hass: HomeAssistant, scanner: DysonSubnetScanner
+):
+    """Test a host that fails to connect does not block the other source."""
+    discovery = DysonDiscoveryIndex()
+    hass.data[DOMAIN][DATA_DISCOVERY] = discovery
+    hass.data[DOMAIN][DATA_SCANNER] = scanner
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    new_device.connect.side_effect = [DysonException, None]
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_SERIAL: SERIAL,
+            CONF_CREDENTIAL: CREDENTIAL,
+            CONF_DEVICE_TYPE: DEVICE_TYPE_PURE_COOL,
+            CONF_NAME: NAME,
+        },
+    )
+    entry.add_to_hass(hass)
+    with patch(f"{MODULE}.get_device", return_value=new_device):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+    new_device.connect.assert_called_once_with(DEVICE_HOST)
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_DEVICES]
+
+    # Discovery still waits for the device and is not turned away.
+    await hass.async_add_executor_job(discovery._registered[SERIAL][0], OTHER_HOST)
+    new_device.connect.assert_called_with(OTHER_HOST)
+    assert hass.data[DOMAIN][DATA_DEVICES][entry.entry_id] is new_device
+
+
+async def test_unload_cancels_scan(hass: HomeAssistant, scanner: DysonSubnetScanner):
+    """Test unloading an entry stops its subnet scan."""
+    hass.data[DOMAIN][DATA_DISCOVERY] = DysonDiscoveryIndex()
+    hass.data[DOMAIN][DATA_SCANNER] = scanner
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_SERIAL: SERIAL,
+            CONF_CREDENTIAL: CREDENTIAL,
+            CONF_DEVICE_TYPE: DEVICE_TYPE_PURE_COOL,
+            CONF_NAME: NAME,
+        },
+    )
+    entry.add_to_hass(hass)
+    cancelled = asyncio.Event()
+
+    async def _async_locate(serial: str, credential: str) -> Optional[str]:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch.object(scanner, "async_locate", _async_locate), patch(
+        f"{MODULE}.get_device", return_value=new_device
+    ):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await asyncio.sleep(0)
+        assert await hass.config_entries.async_unload(entry.entry_id)
+        await asyncio.wait_for(cancelled.wait(), 1)
+    new_device.connect.assert_not_called()
+
+
+async def test_config_schema(hass: HomeAssistant):
+    """Test the scan is optional in configuration.yaml."""
+    config = CONFIG_SCHEMA({DOMAIN: None})
+    assert await async_setup(hass, config)
+    assert DATA_SCANNER not in hass.data[DOMAIN]
+
+    config = CONFIG_SCHEMA({DOMAIN: {CONF_SCAN_NETWORKS: "192.168.1.0/30"}})
+    assert config[DOMAIN][CONF_SCAN_NETWORKS] == ["192.168.1.0/30"]
+    assert CONFIG_SCHEMA({DOMAIN: {}})[DOMAIN][CONF_SCAN_NETWORKS] == []
+    with pytest.raises(vol.Invalid):
+        CONFIG_SCHEMA({DOMAIN: {CONF_SCAN_NETWORKS: "10.0.0.0/8"}})
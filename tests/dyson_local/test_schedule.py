@@ -0,0 +1,166 @@
+"""Tests for Dyson Local schedules."""
+
+from datetime import datetime, time, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import CONF_SCHEDULE, DATA_SCHEDULER, DOMAIN
+from custom_components.dyson_local.schedule import (
+    EVENT_SCHEDULE_APPLIED,
+    DysonScheduler,
+    next_occurrence,
+)
+from custom_components.dyson_local.services import SERVICE_SET_SCHEDULE
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.util import dt as dt_util
+
+from . import MODULE, SERIAL, get_base_device
+
+from tests.common import async_capture_events, async_fire_time_changed
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _local(*args) -> datetime:
+    return dt_util.as_utc(datetime(*args, tzinfo=dt_util.DEFAULT_TIME_ZONE))
+
+
+async def test_next_occurrence(hass: HomeAssistant):
+    """Test finding the next local time of day."""
+    now = _local(2021, 6, 1, 21, 0)
+    assert next_occurrence(now, time(22)) == _local(2021, 6, 1, 22, 0)
+    assert next_occurrence(now, time(7)) == _local(2021, 6, 2, 7, 0)
+    assert next_occurrence(now, time(21)) == _local(2021, 6, 2, 21, 0)
+
+
+async def test_scheduler(hass: HomeAssistant):
+    """Test entries due together go out in one fan-out."""
+    scheduler = DysonScheduler(hass)
+    bedroom = MagicMock(serial="JH1-US-HBB0222A")
+    office = MagicMock(serial="JH1-US-HBB1222A")
+    scheduler.async_set_schedule(
+        "bedroom",
+        bedroom,
+        [
+            {"time": time(22), "night_mode": True},
+            {"time": time(22), "speed": 2},
+        ],
+    )
+    scheduler.async_set_schedule(
+        "office",
+        office,
+        [
+            {"time": time(7), "night_mode": False},
+            {"time": time(22), "night_mode": True},
+        ],
+    )
+    night = next_occurrence(dt_util.utcnow(), time(22))
+    morning = next_occurrence(dt_util.utcnow(), time(7))
+    assert scheduler.next_run == min(night, morning)
+
+    events = async_capture_events(hass, EVENT_SCHEDULE_APPLIED)
+
+    async def _async_apply(hass, devices, settings):
+        return {
+            "results": {key: {"result": "acked"} for key in devices},
+            "wall_time_ms": 12.5,
+        }
+
+    with patch(
+        "custom_components.dyson_local.schedule.async_apply_settings_to_devices",
+        AsyncMock(side_effect=_async_apply),
+    ) as apply:
+        for when in sorted([morning, night]):
+            async_fire_time_changed(hass, when + timedelta(seconds=1))
+            await hass.async_block_till_done()
+
+    assert apply.call_count == 2
+    assert apply.call_args_list[night > morning][0][1:] == (
+        {"bedroom": bedroom, "office": office},
+        {"bedroom": {"night_mode": True, "speed": 2}, "office": {"night_mode": True}},
+    )
+    assert events[night > morning].data["results"] == {
+        "JH1-US-HBB0222A": {"result": "acked"},
+        "JH1-US-HBB1222A": {"result": "acked"},
+    }
+    assert scheduler.next_run == min(
+        next_occurrence(night, time(22)), next_occurrence(morning, time(7))
+    )
+
+    scheduler.async_remove("office")
+    assert scheduler.next_run == next_occurrence(night, time(22))
+    scheduler.async_remove("bedroom")
+    assert scheduler.next_run is None
+
+
+async def test_set_schedule(hass: HomeAssistant, device: DysonDevice):
+    """Test the schedule service stores the schedule and applies it."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device_id = (
+        dr.async_get(hass)
+        .async_get_or_create(
+            config_entry_id=entry.entry_id, identifiers={(DOMAIN, SERIAL)}
+        )
+        .id
+    )
+    with patch(f"{MODULE}.get_device", return_value=device):
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_SET_SCHEDULE,
+            {
+                ATTR_DEVICE_ID: device_id,
+                "schedule": [
+                    {"time": "22:00", "night_mode": True},
+                    {"time": "07:30", "night_mode": False},
+                ],
+            },
+            blocking=True,
+        )
+        await hass.async_block_till_done()
+
+    assert entry.options[CONF_SCHEDULE] == [
+        {"time": "07:30:00", "night_mode": False},
+        {"time": "22:00:00", "night_mode": True},
+    ]
+    scheduler = hass.data[DOMAIN][DATA_SCHEDULER]
+    assert scheduler.next_run == min(
+        next_occurrence(dt_util.utcnow(), time(7, 30)),
+        next_occurrence(dt_util.utcnow(), time(22)),
+    )
+    # Applied without reconnecting the device.
+    device.disconnect.assert_not_called()
+    device.connect.assert_called_once()
+
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_SET_SCHEDULE,
+        {ATTR_DEVICE_ID: device_id, "schedule": []},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert entry.options[CONF_SCHEDULE] == []
+    assert scheduler.next_run is None
+    device.disconnect.assert_not_called()
+
+
+async def test_set_schedule_unknown_device(hass: HomeAssistant):
+    """Test the schedule service ignores devices that are not set up."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_SET_SCHEDULE,
+        {ATTR_DEVICE_ID: "unknown", "schedule": []},
+        blocking=True,
+    )
+    assert CONF_SCHEDULE not in entry.options
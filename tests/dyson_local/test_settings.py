@@ -0,0 +1,124 @@
+"""Tests for Dyson Local multi-device settings."""
+
+import json
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import DATA_DEVICES, DOMAIN
+from custom_components.dyson_local.services import (
+    EVENT_SETTINGS_APPLIED,
+    SERVICE_APPLY_SETTINGS,
+)
+from custom_components.dyson_local.settings import UnsupportedSetting, apply_settings
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+
+from . import CREDENTIAL, MODULE, get_base_device
+
+from tests.common import async_capture_events
+
+STATUS = {"fpwr": "OFF", "fnsp": "0001", "auto": "OFF", "nmod": "OFF", "oson": "OFF"}
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _connected_device(serial: str, echo: bool = True, status: Optional[dict] = None):
+    """Return a libdyson device whose MQTT client echoes every STATE-SET."""
+    device = DysonPureCool(serial, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._status = dict(status or STATUS)
+    device._connected.set()
+
+    def _publish(topic: str, payload: str, qos: int = 0) -> None:
+        if not echo:
+            return
+        data = json.loads(payload)["data"]
+        device._handle_message(
+            {
+                "msg": "STATE-CHANGE",
+                "product-state": {
+                    field: [value, data.get(field, value)]
+                    for field, value in device._status.items()
+                },
+            }
+        )
+
+    device._mqtt_client = MagicMock()
+    device._mqtt_client.publish.side_effect = _publish
+    return device
+
+
+def _published(device: DysonPureCool) -> list:
+    return [
+        json.loads(call[0][1])["data"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+def test_apply_settings():
+    """Test settings are applied as a single message."""
+    device = _connected_device("JH1-US-HBB2222A")
+    fields = apply_settings(device, {"night_mode": True, "speed": 4, "power": False})
+    assert fields == {"fnsp": "0004", "fpwr": "OFF", "nmod": "ON"}
+    assert _published(device) == [fields]
+
+    with pytest.raises(UnsupportedSetting):
+        apply_settings(device, {"night_mode": True, "heat_mode": True})
+    assert len(_published(device)) == 1
+
+
+async def test_apply_settings_service(hass: HomeAssistant):
+    """Test fanning settings out to several devices."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device_registry = dr.async_get(hass)
+    devices = {
+        "acked": _connected_device("JH1-US-HBB2222A"),
+        "silent": _connected_device("JH1-US-HBB3333A", echo=False),
+        "unchanged": _connected_device(
+            "JH1-US-HBB4444A", status={**STATUS, "fpwr": "ON", "nmod": "ON"}
+        ),
+    }
+    device_ids = {}
+    for key, device in devices.items():
+        hass.data[DOMAIN][DATA_DEVICES][key] = device
+        device_ids[key] = device_registry.async_get_or_create(
+            config_entry_id=entry.entry_id, identifiers={(DOMAIN, device.serial)}
+        ).id
+    device_ids["missing"] = "unknown-device-id"
+
+    events = async_capture_events(hass, EVENT_SETTINGS_APPLIED)
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_APPLY_SETTINGS,
+        {
+            ATTR_DEVICE_ID: list(device_ids.values()),
+            "power": True,
+            "night_mode": True,
+            "timeout": 0.2,
+        },
+        blocking=True,
+    )
+
+    assert len(events) == 1
+    data = events[0].data
+    assert data["settings"] == {"power": True, "night_mode": True}
+    results = {key: data["results"][device_id] for key, device_id in device_ids.items()}
+    assert results["acked"]["result"] == "acked"
+    assert results["acked"]["latency_ms"] >= 0
+    assert results["silent"] == {"result": "timeout"}
+    assert results["unchanged"] == {"result": "unchanged"}
+    assert results["missing"] == {"result": "not_found"}
+    assert data["wall_time_ms"] >= 200
+    for device in devices.values():
+        assert _published(device) == [{"fpwr": "ON", "nmod": "ON"}]
+        assert len(device._callbacks) == 0
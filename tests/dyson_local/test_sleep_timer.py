@@ -0,0 +1,154 @@
+"""Tests for the Dyson Local sleep timer countdown."""
+
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.commands import install_command_queue
+from custom_components.dyson_local.sleep_timer import DysonSleepTimer
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    NAME,
+    SERIAL,
+    get_base_device,
+    get_connected_device,
+    setup_sensor_entry,
+)
+
+from tests.common import async_capture_events, async_fire_time_changed
+
+STATUS = {"fpwr": "ON", "hflr": "0100", "cflr": "INV", "sltm": "OFF"}
+ENVIRONMENT = {
+    "hact": "0050",
+    "tact": "2950",
+    "va10": "0003",
+    "pm25": "0010",
+    "pm10": "0005",
+    "noxl": "0004",
+    "sltm": "OFF",
+}
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _environment(device: DysonPureCool, sleep_timer: str) -> None:
+    device._handle_message(
+        {
+            "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+            "data": {**ENVIRONMENT, "sltm": sleep_timer},
+        }
+    )
+
+
+async def test_sleep_timer(hass: HomeAssistant):
+    """Test counting down from the timer set and the reported minutes."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    device._mqtt_client = MagicMock()
+    device._connected.set()
+    device._status = {"fpwr": "ON", "sltm": "OFF"}
+    install_command_queue(hass, device)
+    timer = DysonSleepTimer(hass, device)
+    updates = MagicMock()
+    timer.add_listener(updates)
+    timer.async_start()
+    await hass.async_block_till_done()
+    assert timer.off_time is None
+    assert timer.remaining == 0
+
+    device.set_sleep_timer(30)
+    await hass.async_block_till_done()
+    assert timer.remaining == 30
+    off_time = timer.off_time
+    assert updates.call_count == 1
+
+    # Reported minutes trailing by one are taken as they are.
+    _environment(device, "0029")
+    await hass.async_block_till_done()
+    assert timer.off_time == off_time
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=61))
+    await hass.async_block_till_done()
+    assert updates.call_count == 2
+
+    _environment(device, "0010")
+    await hass.async_block_till_done()
+    assert timer.remaining == 10
+    assert updates.call_count == 3
+
+    # A change made on the device is echoed back.
+    device._handle_message(
+        {
+            "msg": "STATE-CHANGE",
+            "product-state": {"fpwr": ["ON", "ON"], "sltm": ["0010", "0045"]},
+        }
+    )
+    await hass.async_block_till_done()
+    assert timer.remaining == 45
+
+    _environment(device, "OFF")
+    await hass.async_block_till_done()
+    assert timer.off_time is None
+    assert updates.call_count == 5
+
+    timer.async_stop()
+    device.set_sleep_timer(20)
+    await hass.async_block_till_done()
+    assert timer.off_time is None
+
+
+async def test_sleep_timer_sensor(hass: HomeAssistant):
+    """Test the sensor is written by the countdown, once a minute."""
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        STATUS,
+        ENVIRONMENT,
+    )
+    await setup_sensor_entry(hass, device)
+    entity_id = f"sensor.{NAME}_sleep_timer"
+    state = hass.states.get(entity_id)
+    assert state.state == "0"
+    assert state.attributes["off_time"] is None
+    writes = async_capture_events(hass, EVENT_STATE_CHANGED)
+
+    _environment(device, "0030")
+    await hass.async_block_till_done()
+    state = hass.states.get(entity_id)
+    assert state.state == "30"
+    off_time = dt_util.parse_datetime(state.attributes["off_time"])
+    assert abs(off_time - dt_util.utcnow() - timedelta(minutes=30)) < timedelta(
+        seconds=5
+    )
+
+    # Neither state messages nor a reading trailing by a minute write it.
+    device._handle_message(
+        {"msg": "CURRENT-STATE", "product-state": {**STATUS, "sltm": "0030"}}
+    )
+    _environment(device, "0029")
+    await hass.async_block_till_done()
+    assert len(_writes(writes, entity_id)) == 1
+
+    later = dt_util.utcnow() + timedelta(seconds=61)
+    with patch(f"{MODULE}.sleep_timer.dt_util.utcnow", return_value=later):
+        async_fire_time_changed(hass, later)
+        await hass.async_block_till_done()
+    assert hass.states.get(entity_id).state == "29"
+    assert len(_writes(writes, entity_id)) == 2
+
+
+def _writes(events: list, entity_id: str) -> list:
+    return [event for event in events if event.data["entity_id"] == entity_id]
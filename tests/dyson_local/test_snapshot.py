@@ -0,0 +1,246 @@
+"""Tests for Dyson Local snapshots."""
+
+import json
+from typing import Type
+from unittest.mock import MagicMock, patch
+
+from libdyson import (
+    DEVICE_TYPE_PURE_COOL,
+    DEVICE_TYPE_PURE_HOT_COOL,
+    DEVICE_TYPE_PURE_HOT_COOL_LINK,
+    DEVICE_TYPE_PURE_HUMIDIFY_COOL,
+    DysonPureCool,
+    DysonPureHotCool,
+    DysonPureHotCoolLink,
+    DysonPureHumidifyCool,
+)
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import DATA_DEVICES, DOMAIN
+from custom_components.dyson_local.services import (
+    EVENT_SNAPSHOT_RESTORED,
+    SERVICE_RESTORE,
+    SERVICE_SNAPSHOT,
+)
+from custom_components.dyson_local.settings import apply_settings, read_settings
+from homeassistant.const import ATTR_DEVICE_ID, ATTR_NAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+
+from . import CREDENTIAL, MODULE, get_base_device
+
+from tests.common import async_capture_events
+
+STATUS = {
+    "fpwr": "ON",
+    "fnsp": "0007",
+    "auto": "OFF",
+    "nmod": "ON",
+    "oson": "ON",
+    "osal": "0045",
+    "osau": "0315",
+    "rhtm": "ON",
+    "fdir": "OFF",
+    "sltm": "0030",
+}
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def _connected_device(
+    serial: str,
+    spec: Type[DysonDevice] = DysonPureCool,
+    device_type: str = DEVICE_TYPE_PURE_COOL,
+    status: dict = STATUS,
+) -> DysonDevice:
+    """Return a libdyson device whose MQTT client echoes every STATE-SET."""
+    device = spec(serial, CREDENTIAL, device_type)
+    device._status = dict(status)
+    device._connected.set()
+
+    def _publish(topic: str, payload: str, qos: int = 0) -> None:
+        data = json.loads(payload)["data"]
+        device._handle_message(
+            {
+                "msg": "STATE-CHANGE",
+                "product-state": {
+                    field: [value, data.get(field, value)]
+                    for field, value in device._status.items()
+                },
+            }
+        )
+
+    device._mqtt_client = MagicMock()
+    device._mqtt_client.publish.side_effect = _publish
+    return device
+
+
+def _published(device: DysonPureCool) -> list:
+    return [
+        json.loads(call[0][1])["data"]
+        for call in device._mqtt_client.publish.call_args_list
+    ]
+
+
+def test_read_settings():
+    """Test reading back the settings of a device."""
+    assert read_settings(_connected_device("JH1-US-HBB2222A")) == {
+        "power": True,
+        "speed": 7,
+        "auto_mode": False,
+        "oscillation": True,
+        "night_mode": True,
+        "continuous_monitoring": True,
+        "front_airflow": False,
+        "oscillation_angles": [45, 315],
+    }
+
+    device = DysonPureHumidifyCool(
+        "JH1-US-HBB2222A", CREDENTIAL, DEVICE_TYPE_PURE_HUMIDIFY_COOL
+    )
+    device._status = {
+        **STATUS,
+        "fnsp": "AUTO",
+        "auto": "ON",
+        "hume": "HUMD",
+        "haut": "ON",
+        "humt": "0050",
+        "ancp": "BRZE",
+        "wath": "1350",
+    }
+    settings = read_settings(device)
+    assert "speed" not in settings
+    assert "oscillation_angles" not in settings
+    assert settings["humidification"] is True
+    assert settings["humidification_auto_mode"] is True
+    assert settings["target_humidity"] == 50
+    assert settings["oscillation_mode"] == "breeze"
+    assert settings["water_hardness"] == "medium"
+
+
+@pytest.mark.parametrize(
+    "spec,device_type,status,changes",
+    [
+        (
+            DysonPureCool,
+            DEVICE_TYPE_PURE_COOL,
+            STATUS,
+            {"fnsp": "0002", "oson": "OFF", "osal": "0090", "osau": "0200"},
+        ),
+        (
+            DysonPureHumidifyCool,
+            DEVICE_TYPE_PURE_HUMIDIFY_COOL,
+            {
+                **STATUS,
+                "ancp": "BRZE",
+                "hume": "HUMD",
+                "haut": "OFF",
+                "humt": "0050",
+                "wath": "1350",
+            },
+            {"oson": "OFF", "ancp": "0045", "humt": "0040", "wath": "2025"},
+        ),
+        (
+            DysonPureHotCool,
+            DEVICE_TYPE_PURE_HOT_COOL,
+            {**STATUS, "oson": "OFF", "hmod": "HEAT", "hmax": "2950"},
+            {"oson": "ON", "osal": "0100", "osau": "0200", "hmax": "2930"},
+        ),
+        (
+            DysonPureHotCoolLink,
+            DEVICE_TYPE_PURE_HOT_COOL_LINK,
+            {
+                "fmod": "FAN",
+                "fnsp": "0004",
+                "oson": "ON",
+                "nmod": "OFF",
+                "rhtm": "ON",
+                "qtar": "0003",
+                "ffoc": "ON",
+                "hmod": "HEAT",
+                "hmax": "2950",
+                "sltm": "OFF",
+            },
+            {"fnsp": "0009", "qtar": "0001", "ffoc": "OFF", "hmod": "OFF"},
+        ),
+    ],
+)
+def test_settings_round_trip(
+    spec: Type[DysonDevice], device_type: str, status: dict, changes: dict
+):
+    """Test applying the settings read from a device brings them back."""
+    device = _connected_device("JH1-US-HBB2222A", spec, device_type, status)
+    settings = read_settings(device)
+    device._status.update(changes)
+    assert read_settings(device) != settings
+
+    apply_settings(device, json.loads(json.dumps(settings)))
+    assert len(_published(device)) == 1
+    assert read_settings(device) == settings
+    assert {
+        field: device._get_field_value(device._status, field) for field in status
+    } == status
+
+
+async def test_snapshot_restore(hass: HomeAssistant):
+    """Test restoring a snapshot sends a single message to each device."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    device_registry = dr.async_get(hass)
+    devices = [_connected_device(f"JH1-US-HBB{index}222A") for index in range(3)]
+    device_ids = []
+    for index, device in enumerate(devices):
+        hass.data[DOMAIN][DATA_DEVICES][f"entry{index}"] = device
+        device_ids.append(
+            device_registry.async_get_or_create(
+                config_entry_id=entry.entry_id, identifiers={(DOMAIN, device.serial)}
+            ).id
+        )
+
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_SNAPSHOT,
+        {ATTR_NAME: "evening", ATTR_DEVICE_ID: device_ids},
+        blocking=True,
+    )
+    for device in devices:
+        device._status.update(
+            {"fpwr": "OFF", "fnsp": "0002", "nmod": "OFF", "oson": "OFF"}
+        )
+
+    events = async_capture_events(hass, EVENT_SNAPSHOT_RESTORED)
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_RESTORE,
+        {ATTR_NAME: "evening", ATTR_DEVICE_ID: device_ids[:2], "timeout": 1},
+        blocking=True,
+    )
+
+    assert len(events) == 1
+    assert events[0].data[ATTR_NAME] == "evening"
+    results = events[0].data["results"]
+    assert set(results) == {devices[0].serial, devices[1].serial}
+    assert all(result["result"] == "acked" for result in results.values())
+    for device in devices[:2]:
+        published = _published(device)
+        assert len(published) == 1
+        assert {
+            field: published[0][field] for field in ("fpwr", "fnsp", "nmod", "oson")
+        } == {"fpwr": "ON", "fnsp": "0007", "nmod": "ON", "oson": "ON"}
+        assert device.speed == 7
+    assert _published(devices[2]) == []
+
+
+async def test_restore_unknown_snapshot(hass: HomeAssistant):
+    """Test restoring a snapshot that does not exist."""
+    events = async_capture_events(hass, EVENT_SNAPSHOT_RESTORED)
+    await hass.services.async_call(
+        DOMAIN, SERVICE_RESTORE, {ATTR_NAME: "missing"}, blocking=True
+    )
+    assert events == []
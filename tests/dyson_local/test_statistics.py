@@ -0,0 +1,159 @@
+"""Tests for Dyson Local rolling-window statistics."""
+
+import random
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import (
+    CONF_ROLLING_STATISTICS,
+    DATA_STATISTICS,
+    DOMAIN,
+)
+from custom_components.dyson_local.statistics import (
+    DysonStatistics,
+    RollingPercentile,
+    RollingWindow,
+)
+from homeassistant.core import HomeAssistant
+
+from . import (
+    CREDENTIAL,
+    MODULE,
+    SERIAL,
+    get_base_device,
+    get_connected_device,
+    get_listeners,
+    setup_sensor_entry,
+    setup_unready_entry,
+)
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def test_rolling_window():
+    """Test the aggregates follow readings in and out of the window."""
+    window = RollingWindow(60)
+    median = RollingWindow(60, 50)
+    assert window.mean is None
+    assert window.percentile is None
+
+    for now, value in enumerate([5, 3, 8, 1, 9, 2]):
+        window.add(now * 20, value)
+        median.add(now * 20, value)
+    # Only the readings at 60, 80 and 100 are left.
+    assert window.count == 3
+    assert window.mean == 4
+    assert window.minimum == 1
+    assert window.maximum == 9
+    assert median.percentile == 2
+    assert window.percentile == 9
+
+    window.evict(150)
+    assert (window.minimum, window.maximum, window.count) == (2, 2, 1)
+    assert window.percentile == 2
+    window.evict(200)
+    assert window.count == 0
+    assert window.maximum is None
+    assert window.percentile is None
+
+
+@pytest.mark.parametrize("percent", [5, 50, 95, 100])
+def test_rolling_percentile(percent: int):
+    """Test the heaps agree with sorting as readings come and go."""
+    rng = random.Random(percent)
+    percentile = RollingPercentile(percent)
+    values = []
+    for _ in range(2000):
+        if values and rng.random() < 0.45:
+            value = values.pop(rng.randrange(len(values)))
+            percentile.remove(value)
+        else:
+            # Few distinct values, so ties across the heaps come up.
+            value = rng.randrange(20)
+            values.append(value)
+            percentile.add(value)
+        if not values:
+            assert percentile.value is None
+            continue
+        ordered = sorted(values)
+        rank = max(-(-percent * len(ordered) // 100), 1)
+        assert percentile.value == ordered[rank - 1]
+
+
+def test_statistics():
+    """Test environmental readings feed every window of each metric."""
+    device = DysonPureCool(SERIAL, CREDENTIAL, DEVICE_TYPE_PURE_COOL)
+    statistics = DysonStatistics(device)
+    assert statistics.metrics == ["pm25", "pm10", "voc", "no2"]
+    statistics.async_start()
+
+    with patch("custom_components.dyson_local.statistics.time.monotonic") as monotonic:
+        for now, pm25, voc in [(0, 10, "INIT"), (600, 20, "0030"), (1200, 30, "0050")]:
+            monotonic.return_value = now
+            device._handle_message(
+                {
+                    "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+                    "data": {
+                        "pm25": f"{pm25:04d}",
+                        "pm10": "0005",
+                        "va10": voc,
+                        "noxl": "OFF",
+                    },
+                }
+            )
+        # Evicted against the same clock as the readings.
+        attributes = statistics.as_dict("pm25")
+        assert attributes["mean_15m"] == 25
+        assert attributes["min_15m"] == 20
+        assert attributes["max_1h"] == 30
+        assert attributes["mean_24h"] == 20
+        assert attributes["p95_24h"] == 30
+        assert statistics.as_dict("voc")["mean_1h"] == 40
+        assert statistics.as_dict("no2")["mean_1h"] is None
+
+    statistics.async_stop()
+    assert device._callbacks == []
+
+
+async def test_setup_retry_stops_statistics(hass: HomeAssistant):
+    """Test a retried setup stops following the readings."""
+    new_device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        entry = await setup_unready_entry(
+            hass, new_device, {CONF_ROLLING_STATISTICS: True}
+        )
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_STATISTICS]
+    assert get_listeners(new_device, DysonStatistics) == []
+
+
+async def test_statistics_option(hass: HomeAssistant):
+    """Test the sensors only carry the statistics with the option on."""
+    entry = hass.config_entries.async_entries(DOMAIN)[0]
+    assert entry.entry_id not in hass.data[DOMAIN][DATA_STATISTICS]
+
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        {"fpwr": "ON", "hflr": "0100", "cflr": "INV"},
+        {
+            "pm25": "0010",
+            "pm10": "0005",
+            "va10": "INIT",
+            "noxl": "OFF",
+            "hact": "0040",
+            "tact": "2950",
+        },
+    )
+    entry = await setup_sensor_entry(hass, device, {CONF_ROLLING_STATISTICS: True})
+    assert entry.entry_id in hass.data[DOMAIN][DATA_STATISTICS]
+    assert "mean_1h" in hass.states.get("sensor.name_pm_2_5").attributes
+    assert await hass.config_entries.async_unload(entry.entry_id)
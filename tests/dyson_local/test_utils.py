@@ -0,0 +1,123 @@
+"""Tests for Dyson Local utilities."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from libdyson import DEVICE_TYPE_PURE_COOL, DysonPureCool
+from libdyson.dyson_device import DysonDevice
+import pytest
+
+from custom_components.dyson_local.const import CONF_DEADBAND_ABSOLUTE
+from custom_components.dyson_local.utils import (
+    DEFAULT_HEARTBEAT,
+    STATE_INIT,
+    DeadbandFilter,
+)
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import (
+    MODULE,
+    NAME,
+    get_base_device,
+    get_connected_device,
+    setup_sensor_entry,
+)
+
+from tests.common import async_capture_events
+
+START = datetime(2021, 1, 1)
+
+
+@pytest.fixture
+def device() -> DysonDevice:
+    """Return mocked device."""
+    device = get_base_device(DysonPureCool, DEVICE_TYPE_PURE_COOL)
+    with patch(f"{MODULE}._async_get_platforms", return_value=[]):
+        yield device
+
+
+def test_deadband_filter():
+    """Test only significant changes and heartbeats are written."""
+    deadband = DeadbandFilter(absolute=1, relative=10)
+
+    def write(minutes: int, value) -> bool:
+        return deadband.should_write(value, START + timedelta(minutes=minutes))
+
+    assert write(0, STATE_INIT)
+    assert not write(1, STATE_INIT)
+    assert write(2, 5)
+    # Jitter within the absolute deadband is dropped.
+    assert not write(3, 6)
+    assert not write(4, 4)
+    assert write(5, 7)
+    assert write(6, 30)
+    # Above 10, the relative deadband is wider.
+    assert not write(7, 33)
+    assert write(8, 34)
+    # Compared with the last reading written, so slow drifts get through.
+    assert not write(9, 37)
+    assert write(10, 38)
+    assert write(11, None)
+    assert write(12, 38)
+    assert not write(26, 38)
+    assert write(27, 38)
+
+
+def test_deadband_filter_absolute():
+    """Test the absolute deadband alone."""
+    deadband = DeadbandFilter(absolute=2, heartbeat=timedelta(minutes=1))
+    assert deadband.should_write(100, START)
+    assert not deadband.should_write(102, START + timedelta(seconds=30))
+    assert deadband.should_write(102, START + timedelta(minutes=1))
+
+
+def _environment(pm25: str, temperature: str) -> dict:
+    return {
+        "hact": "0050",
+        "tact": temperature,
+        "va10": "0003",
+        "pm25": pm25,
+        "pm10": "0005",
+        "noxl": "0004",
+        "sltm": "OFF",
+    }
+
+
+async def test_deadband_sensors(hass: HomeAssistant):
+    """Test the deadband holds back pollutant readings until the heartbeat."""
+    device = get_connected_device(
+        DysonPureCool,
+        DEVICE_TYPE_PURE_COOL,
+        {"fpwr": "ON", "hflr": "0100", "cflr": "INV"},
+        _environment("0010", "2950"),
+    )
+    await setup_sensor_entry(hass, device, {CONF_DEADBAND_ABSOLUTE: 3})
+    pm25 = f"sensor.{NAME}_pm_2_5"
+    temperature = f"sensor.{NAME}_temperature"
+    assert hass.states.get(pm25).state == "10"
+    assert float(hass.states.get(temperature).state) == pytest.approx(21.85)
+
+    # The first reading sets where the filter stands.
+    await _update(hass, device, _environment("0012", "2950"))
+    assert hass.states.get(pm25).state == "12"
+    writes = async_capture_events(hass, EVENT_STATE_CHANGED)
+
+    # Temperature is not a concentration and is written as it changes.
+    await _update(hass, device, _environment("0014", "2980"))
+    assert hass.states.get(pm25).state == "12"
+    assert float(hass.states.get(temperature).state) == pytest.approx(24.85)
+    written = [event.data["entity_id"] for event in writes]
+    assert temperature in written
+    assert pm25 not in written
+
+    later = dt_util.utcnow() + DEFAULT_HEARTBEAT + timedelta(seconds=1)
+    with patch(f"{MODULE}.sensor.dt_util.utcnow", return_value=later):
+        await _update(hass, device, _environment("0014", "2980"))
+    assert hass.states.get(pm25).state == "14"
+
+
+async def _update(hass: HomeAssistant, device: DysonPureCool, data: dict) -> None:
+    device._handle_message({"msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA", "data": data})
+    await hass.async_block_till_done()